@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+from utils import utils
+
+"""
+Benchmarks of the filtering of loaded projects' data for the plots - as done by /api/data/{project}/{viz} requests
+(c.f. main.get_viz_data_dict()).
+"""
+
+def get_first_gene_family(project_data: dict) -> str:
+    # E.g. ABC* - c.f. utils.get_gene_families()
+    genes = project_data['cell_cell_interaction_search']['all_genes']
+    return utils.get_gene_families(genes, range(len(genes)))[0]
+
+def get_first_microenvironment(project_data: dict) -> (str, list):
+    dict_cci_search = project_data['cell_cell_interaction_search']
+    me = dict_cci_search['microenvironments'][0]
+    return (me, dict_cci_search['microenvironment2cell_types'][me])
+
+# Scenario -> function returning the keyword arguments of filter_interactions_for_cci_search() other than
+# result_dict and file_name2df
+CCI_SEARCH_SCENARIO2KWARGS = {
+    # The plot on page load - with pre-selected cell type pairs and interacting pairs
+    'preselected': lambda project_data: {},
+    # The plot refreshed for a gene family and five cell types
+    'genes_and_cell_types': lambda project_data: {
+        'genes': [get_first_gene_family(project_data)], 'refresh_plot': True,
+        'cell_types': project_data['cell_cell_interaction_search']['all_cell_types'][0:5]},
+    # The plot refreshed for the top 10 interacting pairs in (all cell types of) a microenvironment, showing z-scores
+    'microenvironment_top10_zscores': lambda project_data: {
+        'microenvironments': [get_first_microenvironment(project_data)[0]],
+        'cell_types': get_first_microenvironment(project_data)[1], 'refresh_plot': True,
+        'interacting_pairs_selection_logic': '10', 'values_to_show': 'zscores'}}
+
+def filter_interactions_for_cci_search(project_data: dict, file_name2df: dict, **kwargs) -> dict:
+    ret = dict(project_data['cell_cell_interaction_search'])
+    args = {'genes': [], 'interacting_pairs': [], 'classes': [], 'cell_types': [], 'cell_type_pairs': [],
+            'microenvironments': [], 'refresh_plot': False, 'values_to_show': 'means',
+            'interacting_pairs_selection_logic': None, 'sort_interacting_pairs_alphabetically': False}
+    args.update(kwargs)
+    utils.filter_interactions_for_cci_search(ret, file_name2df, **args)
+    return ret
+
+@pytest.mark.benchmark(group='filter_interactions_for_cci_search')
+@pytest.mark.parametrize('scenario', CCI_SEARCH_SCENARIO2KWARGS.keys())
+def bench_filter_interactions_for_cci_search(benchmark, atlas_project, scenario):
+    (project_data, file_name2df) = atlas_project
+    kwargs = CCI_SEARCH_SCENARIO2KWARGS[scenario](project_data)
+    ret = benchmark(filter_interactions_for_cci_search, project_data, file_name2df, **kwargs)
+    assert ret['interacting_pairs_means']
+
+def preselect_interacting_pairs_by_apply(dict_cci_search: dict, selected_cell_type_pairs,
+                                         interacting_pairs_selection_logic: str) -> list:
+    # utils.preselect_interacting_pairs() as it was before it was vectorised - a per-row apply() over the means, and
+    # the relevant interacting pairs collected into a set (N.B. from the sparse relevant_interactions matrix, rather
+    # than from the dict of dicts that it replaced)
+    relevant_interactions_set = set(np.array(dict_cci_search['index2interacting_pair'])[
+        utils.get_all_relevant_interactions_mask(dict_cci_search, selected_cell_type_pairs)].tolist())
+    df_ips = dict_cci_search['analysis_means'][selected_cell_type_pairs]
+    selected_interacting_pairs_sorted = \
+        df_ips[df_ips[selected_cell_type_pairs].apply(lambda row: row.sum() > 0, axis=1)].max(axis=1) \
+            .sort_values(ascending=False).index.tolist()
+    selected_interacting_pairs_sorted = [ip for ip in selected_interacting_pairs_sorted if ip in relevant_interactions_set]
+    if interacting_pairs_selection_logic == "all":
+        return selected_interacting_pairs_sorted
+    else:
+        return selected_interacting_pairs_sorted[0:int(interacting_pairs_selection_logic)]
+
+# Implementation -> function pre-selecting the interacting pairs shown in cell_cell_interaction_search plot
+PRESELECTION_IMPLEMENTATION2FUNCTION = {'vectorised': utils.preselect_interacting_pairs,
+                                        'apply': preselect_interacting_pairs_by_apply}
+
+@pytest.mark.benchmark(group='preselect_interacting_pairs')
+@pytest.mark.parametrize('interacting_pairs_selection_logic', ['10', 'all'])
+@pytest.mark.parametrize('implementation', PRESELECTION_IMPLEMENTATION2FUNCTION.keys())
+def bench_preselect_interacting_pairs(benchmark, atlas_project, implementation, interacting_pairs_selection_logic):
+    # The interacting pairs pre-selected for all cell type pairs - by the current implementation and by the one
+    # it replaced, which are checked to pre-select the same interacting pairs
+    dict_cci_search = atlas_project[0]['cell_cell_interaction_search']
+    cell_type_pairs = list(dict_cci_search['analysis_means'].columns)
+    # N.B. The replaced implementation sorts the means as they were before compact_project_data()
+    analysis_means = utils.restore_dtypes(dict_cci_search['analysis_means'], dict_cci_search.get('compact_values_table'))
+    restored_dict_cci_search = dict(dict_cci_search, analysis_means=analysis_means)
+    expected = utils.preselect_interacting_pairs(dict_cci_search, cell_type_pairs, interacting_pairs_selection_logic)
+    assert expected == preselect_interacting_pairs_by_apply(restored_dict_cci_search, cell_type_pairs,
+                                                            interacting_pairs_selection_logic)
+    args = dict_cci_search if implementation == 'vectorised' else restored_dict_cci_search
+    ret = benchmark(PRESELECTION_IMPLEMENTATION2FUNCTION[implementation], args, cell_type_pairs,
+                    interacting_pairs_selection_logic)
+    assert ret and ret == expected
+
+@pytest.mark.benchmark(group='filter_interactions_for_cci_summary')
+@pytest.mark.parametrize('scenario', ['all_interactions', 'class_min_score_50'])
+def bench_filter_interactions_for_cci_summary(benchmark, atlas_project, scenario):
+    (project_data, file_name2df) = atlas_project
+    dict_cci_summary = project_data['cell_cell_interaction_summary']
+    (classes, min_score) = ([], 0) if scenario == 'all_interactions' else (dict_cci_summary['all_classes'][0:1], 50)
+    def filter_interactions():
+        ret = dict(dict_cci_summary)
+        utils.filter_interactions_for_cci_summary(ret, file_name2df, classes, [], min_score, True)
+        return ret
+    assert 'num_ints' in benchmark(filter_interactions)
+
+@pytest.mark.benchmark(group='populate_deconvoluted_data')
+@pytest.mark.parametrize('scenario', ['preselected', 'gene_family_all_cell_types'])
+def bench_populate_deconvoluted_data(benchmark, atlas_project, scenario):
+    # Single gene expression plot - z-scores of the means and percents of the selected genes' expression
+    (project_data, _) = atlas_project
+    (selected_genes, selected_cell_types, refresh_plot) = ([], [], False)
+    if scenario == 'gene_family_all_cell_types':
+        selected_genes = [get_first_gene_family(project_data)]
+        selected_cell_types = project_data['single_gene_expression']['all_cell_types']
+        refresh_plot = True
+    def populate_deconvoluted_data():
+        ret = {'single_gene_expression': dict(project_data['single_gene_expression']),
+               'cell_cell_interaction_search': dict(project_data['cell_cell_interaction_search'])}
+        utils.populate_deconvoluted_data(ret, None, selected_genes=selected_genes,
+                                         selected_cell_types=selected_cell_types, refresh_plot=refresh_plot)
+        dict_sge = ret['single_gene_expression']
+        utils.populate_deconvoluted_data(ret, None, selected_genes=dict_sge['genes'],
+                                         selected_cell_types=dict_sge['cell_types'], refresh_plot=refresh_plot,
+                                         percents=True)
+        return dict_sge
+    assert benchmark(populate_deconvoluted_data)['mean_zscores']
@@ -0,0 +1,59 @@
+import pytest
+from conftest import BENCHMARK_ROUNDS
+from utils import utils
+
+"""
+Benchmarks of the loading of projects - as a whole (get_projects()) and by each of the populate_* functions
+that parse_project() calls.
+"""
+# The keys of the project files in the order in which parse_project() populates them -> the functions populating them
+# (via populate_data4viz())
+CONFIG_KEY2POPULATE_FUNCTION = {
+    'celltype_composition': 'populate_celltype_composition_data',
+    'microenvironments': 'populate_microenvironments_data',
+    'analysis_means': 'populate_analysis_means_data',
+    'relevant_interactions': 'populate_relevant_interactions_data',
+    'interaction_scores': 'populate_interaction_scores_data',
+    'deconvoluted_result': 'populate_deconvoluted_data',
+    'deconvoluted_percents': 'populate_deconvoluted_data[percents]',
+    'degs': 'populate_degs_data',
+    'pvalues': 'populate_pvalues_data',
+    'cellsign_active_interactions_deconvoluted': 'populate_cellsign_active_interactions_deconvoluted'}
+
+def populate(dfs: dict, config: dict, config_keys: list) -> (dict, dict):
+    # Populates (result_dict, file_name2df) from dfs of config_keys - as parse_project() does
+    result_dict = {}
+    file_name2df = {}
+    for key in config_keys:
+        if key in dfs:
+            utils.populate_data4viz(key, result_dict, dfs[key], config['separator'], file_name2df)
+    return (result_dict, file_name2df)
+
+@pytest.mark.benchmark(group='get_projects')
+def bench_get_projects(benchmark, atlas_data_root):
+    (dir_name2project_data, _) = \
+        benchmark.pedantic(utils.get_projects, kwargs={'num_processes': 1}, rounds=BENCHMARK_ROUNDS)
+    assert list(dir_name2project_data.keys()) == [atlas_data_root[1]]
+
+@pytest.mark.parametrize('config_key', CONFIG_KEY2POPULATE_FUNCTION.keys(),
+                         ids=CONFIG_KEY2POPULATE_FUNCTION.values())
+def bench_populate(benchmark, atlas_dfs, atlas_config, config_key):
+    benchmark.group = CONFIG_KEY2POPULATE_FUNCTION[config_key]
+    config_keys = list(CONFIG_KEY2POPULATE_FUNCTION.keys())
+    def setup():
+        # The data populated from the files preceding config_key - on which config_key's populate_* function depends
+        (result_dict, file_name2df) = populate(atlas_dfs, atlas_config, config_keys[0:config_keys.index(config_key)])
+        return ((config_key, result_dict, atlas_dfs[config_key], atlas_config['separator'], file_name2df), {})
+    benchmark.pedantic(utils.populate_data4viz, setup=setup, rounds=BENCHMARK_ROUNDS)
+
+@pytest.mark.parametrize('function', ['populate_cci_summary_index', 'populate_autocomplete_index'])
+def bench_populate_index(benchmark, atlas_dfs, atlas_config, function):
+    benchmark.group = function
+    def setup():
+        (result_dict, file_name2df) = populate(atlas_dfs, atlas_config, CONFIG_KEY2POPULATE_FUNCTION.keys())
+        result_dict['cell_cell_interaction_summary']['separator'] = atlas_config['separator']
+        result_dict['cell_cell_interaction_search']['separator'] = atlas_config['separator']
+        if function == 'populate_cci_summary_index':
+            return ((result_dict, file_name2df, atlas_config), {})
+        return ((result_dict,), {})
+    benchmark.pedantic(getattr(utils, function), setup=setup, rounds=BENCHMARK_ROUNDS)
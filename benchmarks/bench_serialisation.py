@@ -0,0 +1,30 @@
+import json
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from utils import utils
+from utils.fast_json import FastJSONResponse
+import main
+
+"""
+Benchmarks of the serialisation of /api/data/{project}/{viz} responses (of each viz, as requested on page load) - by
+FastJSONResponse, and by FastAPI's jsonable_encoder() and JSONResponse that it replaced (c.f. main.get_viz_data_body()).
+"""
+# Encoder -> function returning the body of the response
+ENCODER2SERIALISE = {'orjson': lambda ret: FastJSONResponse(ret).body,
+                     'jsonable_encoder': lambda ret: JSONResponse(jsonable_encoder(ret)).body}
+
+@pytest.fixture(scope='module')
+def viz2data(atlas_project) -> dict:
+    # viz -> the data returned for the project's viz on page load, i.e. without any selections
+    (project_data, file_name2df) = atlas_project
+    return dict([(viz, main.get_viz_data_dict(project_data, file_name2df, viz, [], [], [], [], 0, [], [], [], False,
+                                              'means', None, False)) for viz in utils.VIZZES])
+
+@pytest.mark.benchmark(group='serialise')
+@pytest.mark.parametrize('encoder', ENCODER2SERIALISE.keys())
+@pytest.mark.parametrize('viz', utils.VIZZES)
+def bench_serialise(benchmark, viz2data, viz, encoder):
+    body = benchmark(ENCODER2SERIALISE[encoder], viz2data[viz])
+    # Both encoders serialise the data to the same JSON
+    assert json.loads(body) == json.loads(ENCODER2SERIALISE['jsonable_encoder'](viz2data[viz]))
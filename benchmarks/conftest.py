@@ -0,0 +1,76 @@
+import os
+import sys
+from contextlib import contextmanager
+import pytest
+
+base_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, f"{base_path}/..")
+from utils import utils, project_cache
+import generate_atlas
+
+"""
+Fixtures shared by the benchmarks - synthetic projects (c.f. generate_atlas.py) of the sizes in BENCHMARK_SIZES
+(environment variable; comma-separated keys of generate_atlas.SIZES, 'small,medium' by default). The projects are
+generated into BENCHMARK_ATLAS_ROOT (environment variable; a temporary directory by default) - set it to re-use the
+projects across runs, as the larger ones take a while to generate. N.B. Loading the large_* projects takes several GB
+of memory.
+"""
+BENCHMARK_SIZES = os.environ.get('BENCHMARK_SIZES', 'small,medium').split(',')
+BENCHMARK_ATLAS_ROOT = os.environ.get('BENCHMARK_ATLAS_ROOT')
+# The number of rounds of the benchmarks that take too long for pytest-benchmark's calibration, e.g. loading a project
+BENCHMARK_ROUNDS = int(os.environ.get('BENCHMARK_ROUNDS', 3))
+
+@pytest.fixture(scope='session')
+def atlas_root(tmp_path_factory) -> str:
+    if BENCHMARK_ATLAS_ROOT:
+        return BENCHMARK_ATLAS_ROOT
+    return str(tmp_path_factory.mktemp('atlases'))
+
+@pytest.fixture(scope='session', params=BENCHMARK_SIZES)
+def atlas(request, atlas_root) -> (str, str):
+    # Returns (data_root, dir_name) of the project of size request.param - each project is in a data root of its own,
+    # so that get_projects() loads just that project
+    size = request.param
+    data_root = os.path.join(atlas_root, size)
+    project_dir = os.path.join(data_root, size)
+    if not os.path.exists(os.path.join(project_dir, 'config.yml')):
+        (num_cell_types, num_interactions) = generate_atlas.SIZES[size]
+        generate_atlas.generate_atlas(project_dir, num_cell_types, num_interactions)
+    return (data_root, size)
+
+@contextmanager
+def data_root(root: str):
+    # Points utils at the projects in root - with the projects' caches disabled, so that the projects are parsed
+    (prev_data_root, prev_cache_root) = (utils.DATA_ROOT, project_cache.CACHE_ROOT)
+    (utils.DATA_ROOT, project_cache.CACHE_ROOT) = (root, '')
+    try:
+        yield
+    finally:
+        (utils.DATA_ROOT, project_cache.CACHE_ROOT) = (prev_data_root, prev_cache_root)
+
+@pytest.fixture
+def atlas_data_root(atlas):
+    with data_root(atlas[0]):
+        yield atlas
+
+@pytest.fixture(scope='session')
+def atlas_config(atlas) -> dict:
+    with data_root(atlas[0]):
+        return utils.get_project_config(atlas[1])
+
+@pytest.fixture(scope='module')
+def atlas_dfs(atlas, atlas_config) -> dict:
+    # The project's files, read as in utils.parse_project() - keyed by their config keys
+    ret = {}
+    for key in utils.CONFIG_KEYS[3:]:
+        if key in atlas_config and key not in ['hash', 'cellphonedb']:
+            fpath = os.path.join(atlas[0], atlas[1], atlas_config[key])
+            ret[key] = utils.read_project_file(fpath, key, atlas_config['separator'])
+    return ret
+
+@pytest.fixture(scope='module')
+def atlas_project(atlas, atlas_config) -> (dict, dict):
+    # (project_data, file_name2df) of the parsed project - shared by the filtering benchmarks, which do not modify it.
+    # N.B. This and atlas_dfs are module-scoped - so that the larger projects' data is not kept in memory twice
+    with data_root(atlas[0]):
+        return utils.parse_project(atlas[1], atlas_config)
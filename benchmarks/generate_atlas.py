@@ -0,0 +1,221 @@
+import os
+import argparse
+import numpy as np
+import yaml
+
+"""
+Generates a synthetic project in the shape of CellphoneDB's statistical analysis output (means, pvalues,
+significant_means, deconvoluted, deconvoluted_percents and interaction_scores files, plus CellSign active interactions,
+microenvironments, celltype_composition and DEGs files and config.yml) - of a configurable size, so that the loading and
+the filtering of projects can be benchmarked at the scale of cell atlases, e.g.
+    python benchmarks/generate_atlas.py --num_cell_types 320 --num_interactions 1000 /tmp/atlas/data/large
+(N.B. the number of cell type pairs is the square of the number of cell types). The values are random, but their
+sparsity and the relationships between the files (e.g. significant means are the means with pvalue < 0.05) mimic those
+of CellphoneDB's output.
+"""
+SEPARATOR = '|'
+# Preset sizes (c.f. benchmarks/conftest.py) - as (num_cell_types, num_interactions)
+SIZES = {'small': (10, 500),
+         'medium': (60, 3000),
+         # ~10^5 cell type pairs
+         'large_cell_types': (320, 1000),
+         # Tens of thousands of interactions
+         'large_interactions': (40, 20000)}
+# The fraction of (interaction, cell type pair) means that are non-zero, and of those the fraction that are significant
+MEANS_DENSITY = 0.3
+SIGNIFICANT_FRACTION = 0.2
+# The fraction of (gene, cell type) mean expressions that are non-zero
+EXPRESSION_DENSITY = 0.4
+NUM_CLASSES = 20
+NUM_DEGS_PER_CELL_TYPE = 20
+# The maximum number of values generated at a time - to bound memory use for large matrices
+CHUNK_SIZE = 2 ** 22
+# Text of the values written into the files - looked up by integer codes (rather than formatting each value separately)
+MEAN_STRS = np.array(['0.0'] + ['{:.3f}'.format(i / 1000) for i in range(1, 1000)], dtype=object)
+SIGNIFICANT_MEAN_STRS = np.array([''] + MEAN_STRS[1:].tolist(), dtype=object)
+PVALUE_STRS = np.array(['0.0'] + ['{:.3f}'.format(i / 1000) for i in range(1, 1000)] + ['1.0'], dtype=object)
+SCORE_STRS = np.array(['0.0'] + ['{:.1f}'.format(i / 10) for i in range(1, 1001)], dtype=object)
+INTERACTION_COLUMNS = ['id_cp_interaction', 'interacting_pair', 'partner_a', 'partner_b', 'gene_a', 'gene_b', 'secreted',
+                       'receptor_a', 'receptor_b', 'annotation_strategy', 'is_integrin', 'directionality',
+                       'classification']
+DECONVOLUTED_COLUMNS = ['gene_name', 'uniprot', 'is_complex', 'protein_name', 'complex_name', 'id_cp_interaction', 'gene']
+
+def generate_atlas(project_dir: str, num_cell_types: int, num_interactions: int, num_genes: int = None,
+                   num_microenvironments: int = 5, seed: int = 0) -> dict:
+    """
+    Writes a synthetic project into project_dir and returns its config. config.yml is written last - so that a project
+    whose generation was interrupted is not mistaken for a complete one.
+    """
+    rng = np.random.default_rng(seed)
+    if num_genes is None:
+        num_genes = max(100, num_interactions // 2)
+    os.makedirs(project_dir, exist_ok=True)
+    print("\nGenerating project: {} ({} cell types, {} interactions, {} genes)".format(
+        project_dir, num_cell_types, num_interactions, num_genes), flush=True, end="")
+    cell_types = ["celltype_{:04d}".format(i) for i in range(num_cell_types)]
+    microenvironments = ["Env{}".format(i + 1) for i in range(min(num_microenvironments, num_cell_types))]
+    cell_type2microenvironment = dict([(ct, microenvironments[i % len(microenvironments)]) \
+                                       for (i, ct) in enumerate(cell_types)])
+    cell_type_pairs = ["{}{}{}".format(ct1, SEPARATOR, ct2) for ct1 in cell_types for ct2 in cell_types]
+    genes = get_gene_names(num_genes)
+    complexes = get_complexes(rng, num_genes)
+    interactions = get_interactions(rng, genes, complexes, num_interactions)
+    config = {'separator': SEPARATOR,
+              'title': "Synthetic atlas - {} cell types, {} interactions".format(num_cell_types, num_interactions),
+              'microenvironments': 'microenvironments.tsv',
+              'celltype_composition': 'celltype_composition.tsv',
+              'analysis_means': 'statistical_analysis_means.txt',
+              'pvalues': 'statistical_analysis_pvalues.txt',
+              'relevant_interactions': 'statistical_analysis_significant_means.txt',
+              'interaction_scores': 'statistical_analysis_interaction_scores.txt',
+              'deconvoluted_result': 'statistical_analysis_deconvoluted.txt',
+              'deconvoluted_percents': 'statistical_analysis_deconvoluted_percents.txt',
+              'cellsign_active_interactions_deconvoluted':
+                  'statistical_analysis_CellSign_active_interactions_deconvoluted.txt',
+              'degs': 'DEGs.tsv'}
+    fpath = lambda key: os.path.join(project_dir, config[key])
+    write_rows(fpath('microenvironments'), ['cell_type', 'microenvironment'],
+               [[ct, me] for (ct, me) in cell_type2microenvironment.items()])
+    write_rows(fpath('celltype_composition'), ['lineage', 'cell_type', 'microenvironment'],
+               [["lineage_{}".format(i % 3), ct, cell_type2microenvironment[ct]] for (i, ct) in enumerate(cell_types)])
+    write_interaction_matrices(rng, config, fpath, interactions, cell_type_pairs)
+    write_deconvoluted(rng, fpath, interactions, genes, cell_types)
+    cellsign_rows = []
+    for interaction in interactions[::20]:
+        for j in rng.choice(len(cell_type_pairs), size=min(2, len(cell_type_pairs)), replace=False).tolist():
+            (active_tf, ctp) = (genes[rng.integers(num_genes)], cell_type_pairs[j])
+            cellsign_rows.append(interaction[:6] + [active_tf, ctp, ctp.split(SEPARATOR)[1]])
+    write_rows(fpath('cellsign_active_interactions_deconvoluted'),
+               ['id_cp_interaction', 'interacting_pair', 'partner_a', 'partner_b', 'gene_a', 'gene_b', 'active_TF',
+                'celltype_pairs', 'active_celltype'], cellsign_rows)
+    degs_rows = []
+    for ct in cell_types:
+        for i in rng.choice(num_genes, size=min(NUM_DEGS_PER_CELL_TYPE, num_genes), replace=False).tolist():
+            (p_val, avg_log_fc, pct1, pct2) = rng.random(4)
+            degs_rows.append([ct, genes[i], '{:.3g}'.format(p_val / 1000), '{:.3f}'.format(avg_log_fc * 2),
+                              '{:.3f}'.format(pct1), '{:.3f}'.format(pct2 / 2), '{:.3g}'.format(p_val / 100)])
+    write_rows(fpath('degs'), ['cluster', 'gene', 'p_val', 'avg_logFC', 'pct.1', 'pct.2', 'p_val_adj'], degs_rows)
+    with open(os.path.join(project_dir, 'config.yml'), 'w') as file:
+        file.write("# CellphoneDB results visualisation config - synthetic atlas (c.f. benchmarks/generate_atlas.py)\n")
+        yaml.safe_dump(config, file, sort_keys=False)
+    return config
+
+def get_gene_names(num_genes: int) -> list:
+    # Genes are named in families of ten sharing a three-letter prefix (e.g. ABC0-ABC9) - so that simplified regular
+    # expression terms (e.g. ABC*) match multiple genes, as they do in real data
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    ret = []
+    for i in range(num_genes):
+        family = i // 10
+        prefix = letters[family // 676 % 26] + letters[family // 26 % 26] + letters[family % 26]
+        ret.append("{}{}{}".format(prefix, family // 17576 or '', i % 10))
+    return ret
+
+def get_complexes(rng, num_genes: int) -> list:
+    # Returns (complex name, positions of its member genes) for num_genes / 10 complexes of 2-3 genes each
+    return [("complex_{}".format(i), rng.choice(num_genes, size=rng.integers(2, 4), replace=False).tolist()) \
+            for i in range(num_genes // 10)]
+
+def get_interactions(rng, genes: list, complexes: list, num_interactions: int) -> list:
+    """
+    Returns num_interactions distinct interactions between randomly chosen partners (genes or complexes), each as
+    the values of INTERACTION_COLUMNS followed by the positions of the genes of each partner.
+    """
+    partners = [(gene, [i], "simple:P{:05d}".format(i), gene) for (i, gene) in enumerate(genes)]
+    partners += [(name, members, "complex:{}".format(name), '') for (name, members) in complexes]
+    if len(partners) * (len(partners) - 1) < num_interactions:
+        raise ValueError("Too few genes ({}) for {} interactions".format(len(genes), num_interactions))
+    pairs = set()
+    ret = []
+    while len(ret) < num_interactions:
+        (a, b) = rng.choice(len(partners), size=2, replace=False).tolist()
+        if (a, b) in pairs:
+            continue
+        pairs.add((a, b))
+        (name_a, members_a, partner_a, gene_a) = partners[a]
+        (name_b, members_b, partner_b, gene_b) = partners[b]
+        is_integrin = len(ret) % 10 == 0
+        ret.append(["CPI-SY{:09X}".format(len(ret)), "{}_{}".format(name_a, name_b), partner_a, partner_b, gene_a,
+                    gene_b, str(bool(rng.integers(2))), 'False', 'True', 'curated', str(is_integrin),
+                    'Adhesion-Adhesion' if is_integrin else 'Ligand-Receptor',
+                    "Signaling by Class{}".format(rng.integers(NUM_CLASSES)), members_a, members_b])
+    return ret
+
+def write_interaction_matrices(rng, config: dict, fpath, interactions: list, cell_type_pairs: list):
+    # Writes the (interactions x cell type pairs) means, pvalues, significant_means and interaction_scores files -
+    # num_rows interactions at a time
+    num_rows = max(1, CHUNK_SIZE // len(cell_type_pairs))
+    keys = ['analysis_means', 'pvalues', 'relevant_interactions', 'interaction_scores']
+    files = dict([(key, open(fpath(key), 'w')) for key in keys])
+    try:
+        for key in keys:
+            extra_columns = ['rank'] if key == 'relevant_interactions' else []
+            files[key].write("\t".join(INTERACTION_COLUMNS + extra_columns + cell_type_pairs) + "\n")
+        for start in range(0, len(interactions), num_rows):
+            rows = [interaction[:len(INTERACTION_COLUMNS)] for interaction in interactions[start:start + num_rows]]
+            shape = (len(rows), len(cell_type_pairs))
+            is_expressed = rng.random(shape, dtype=np.float32) < MEANS_DENSITY
+            is_significant = is_expressed & (rng.random(shape, dtype=np.float32) < SIGNIFICANT_FRACTION)
+            means = np.where(is_expressed, rng.integers(1, 1000, shape, dtype=np.uint16), 0)
+            pvalues = np.where(is_significant, rng.integers(0, 50, shape, dtype=np.uint16),
+                               np.where(is_expressed, rng.integers(50, 1001, shape, dtype=np.uint16), 1000))
+            scores = np.where(is_significant, rng.integers(1, 1001, shape, dtype=np.uint16), 0)
+            ranks = ['{:.3f}'.format(rank) for rank in 1 - is_significant.mean(axis=1)]
+            write_values(files['analysis_means'], rows, means, MEAN_STRS)
+            write_values(files['pvalues'], rows, pvalues, PVALUE_STRS)
+            write_values(files['relevant_interactions'], [row + [rank] for (row, rank) in zip(rows, ranks)],
+                         np.where(is_significant, means, 0), SIGNIFICANT_MEAN_STRS)
+            write_values(files['interaction_scores'], rows, scores, SCORE_STRS)
+    finally:
+        for file in files.values():
+            file.close()
+
+def write_deconvoluted(rng, fpath, interactions: list, genes: list, cell_types: list):
+    # Writes deconvoluted and deconvoluted_percents files - a row for each gene of each partner of each interaction;
+    # (as in CellphoneDB's output) a gene's values are the same in all its rows
+    shape = (len(genes), len(cell_types))
+    is_expressed = rng.random(shape) < EXPRESSION_DENSITY
+    gene_means = np.where(is_expressed, rng.integers(1, 1000, shape, dtype=np.uint16), 0)
+    gene_percents = np.where(is_expressed, rng.integers(1, 1000, shape, dtype=np.uint16), 0)
+    rows = []
+    gene_positions = []
+    for interaction in interactions:
+        for (partner_col, members) in [(2, interaction[-2]), (3, interaction[-1])]:
+            (partner_type, partner) = interaction[partner_col].split(':')
+            complex_name = partner if partner_type == 'complex' else ''
+            for i in members:
+                rows.append([genes[i], "P{:05d}".format(i), str(partner_type == 'complex'), "{}_HUMAN".format(genes[i]),
+                             complex_name, interaction[0], genes[i]])
+                gene_positions.append(i)
+    for (key, values) in [('deconvoluted_result', gene_means), ('deconvoluted_percents', gene_percents)]:
+        with open(fpath(key), 'w') as file:
+            file.write("\t".join(DECONVOLUTED_COLUMNS + cell_types) + "\n")
+            write_values(file, rows, values[gene_positions], MEAN_STRS)
+
+def write_values(file, rows: list, codes: np.ndarray, strs: np.ndarray):
+    # Writes each row of text values followed by the text of the corresponding row of codes
+    for (row, row_codes) in zip(rows, codes):
+        file.write("\t".join(row + strs[row_codes].tolist()) + "\n")
+
+def write_rows(fpath: str, columns: list, rows: list):
+    with open(fpath, 'w') as file:
+        file.write("\t".join(columns) + "\n")
+        for row in rows:
+            file.write("\t".join(row) + "\n")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates a synthetic CellphoneDB Viz project of a given size')
+    parser.add_argument('project_dir', help='e.g. data/synthetic_atlas')
+    parser.add_argument('--size', choices=list(SIZES.keys()),
+                        help='A preset size - overrides --num_cell_types and --num_interactions')
+    parser.add_argument('--num_cell_types', type=int, default=50)
+    parser.add_argument('--num_interactions', type=int, default=2000)
+    parser.add_argument('--num_genes', type=int, default=None,
+                        help='By default, half the number of interactions (but at least 100)')
+    parser.add_argument('--num_microenvironments', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    (num_cell_types, num_interactions) = SIZES[args.size] if args.size else (args.num_cell_types, args.num_interactions)
+    generate_atlas(args.project_dir, num_cell_types, num_interactions, args.num_genes, args.num_microenvironments,
+                   args.seed)
+    print("", flush=True)
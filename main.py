@@ -1,21 +1,56 @@
-from fastapi import FastAPI, Request
-from utils import utils
+import time
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import HTMLResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from utils import utils, binary_format, metrics
+from utils.fast_json import FastJSONResponse
+from utils.project_registry import ProjectRegistry
+from utils.response_cache import ResponseCache, SelectionCache, HtmlCache, is_not_modified
+from utils.request_executor import RequestExecutor
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.encoders import jsonable_encoder
-import copy
 
-# Note: dir_name2dd_df itself is not returned by the API, but is used for filtering by genes and cell types
+# Only the projects' config files are read at start-up - each project's data is loaded on its first /data/{project}/{viz} request
+# Note: file_name2df of each project is not returned by the API, but is used for filtering by genes and cell types
 # c.f. /data/{project}/{viz} below
-(dir_name2project_data, dir_name2file_name2df) = utils.get_projects()
+projects = ProjectRegistry()
+# Serialised /data/{project}/{viz} responses - a project's responses are dropped whenever it is (re-)loaded or unloaded
+response_cache = ResponseCache()
+projects.add_listener(response_cache.invalidate)
+# The selections made for the tiles of cell_cell_interaction_search matrices - c.f. tile in /data/{project}/{viz} below
+tile_selection_cache = SelectionCache()
+projects.add_listener(tile_selection_cache.invalidate)
+properties_html_cache = HtmlCache()
+projects.add_listener(properties_html_cache.invalidate)
+# Filters /data/{project}/{viz} requests in a bounded pool of threads - superseding earlier requests from the same
+# X-Request-Group (e.g. a browser page's plot) that are still in progress
+request_executor = RequestExecutor()
 api = FastAPI()
 
+# Records the duration of each API request (c.f. /metrics) - and logs the requests that take longer than
+# metrics.SLOW_REQUEST_SECONDS, with the durations of their stages
+@api.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    start = time.perf_counter()
+    with metrics.request_stages() as stages:
+        response = await call_next(request)
+    seconds = time.perf_counter() - start
+    endpoint = request.scope.get('endpoint')
+    path_params = request.scope.get('path_params', {})
+    # N.B. Only the values of project and viz that exist are used as labels - so that the number of histograms is bounded
+    project = path_params.get('project', '')
+    viz = path_params.get('viz', '')
+    metrics.observe(metrics.REQUEST_HISTOGRAM, seconds, endpoint=endpoint.__name__ if endpoint else '',
+                    project=project if project in projects else '', viz=viz if viz in utils.VIZZES else '')
+    metrics.log_if_slow(str(request.url), seconds, stages)
+    return response
+
 # List projects
 @api.get("/list")
 def list_projects(request: Request):
     case_examples = ['CaseExample3_specificityScoring', 'CaseExample2_spatialNiches', 'CaseExample1_differentiation']
-    projectName2Title = dict(zip(dir_name2project_data.keys(),
-                                 [x['title'] for x in dir_name2project_data.values()]))
+    projectName2Title = projects.get_titles()
     #If request url is our main cpdbviz site, only list exemplar data. Otherwise list everything available.
     if "www.cellphonedb.org" in str(request.url):
         projectName2Title = {case_example: projectName2Title[case_example] for case_example in case_examples if case_example in projectName2Title}
@@ -24,80 +59,183 @@ def list_projects(request: Request):
 #Get title for project
 @api.get("/title/{project}")
 def get_title(project: str):
-    return dir_name2project_data[project]['title']
+    return projects.get_config(project)['title']
 
 @api.get("/data/{project}/{viz}")
-def get_viz_data(project: str,
-                 viz: str,
-                 genes: str = None,
-                 interacting_pairs: str = None,
-                 classes: str = None,
-                 modalities: str = None,
-                 min_score: str = 0,
-                 cell_types: str = None,
-                 cell_type_pairs: str = None,
-                 microenvironments: str = None,
-                 refresh_plot: bool = False,
-                 values_to_show: str = 'means',
-                 interacting_pairs_selection_logic: str = None,
-                 sort_interacting_pairs_alphabetically: bool = False
-                 ):
+async def get_viz_data(request: Request,
+                       project: str,
+                       viz: str,
+                       genes: str = None,
+                       interacting_pairs: str = None,
+                       classes: str = None,
+                       modalities: str = None,
+                       min_score: str = 0,
+                       cell_types: str = None,
+                       cell_type_pairs: str = None,
+                       microenvironments: str = None,
+                       refresh_plot: bool = False,
+                       values_to_show: str = 'means',
+                       interacting_pairs_selection_logic: str = None,
+                       sort_interacting_pairs_alphabetically: bool = False,
+                       format: str = None,
+                       row_offset: int = 0,
+                       num_rows: int = None,
+                       col_offset: int = 0,
+                       num_cols: int = None
+                       ):
+    # The matrices are sent in binary (c.f. binary_format) if requested via format=binary or via the Accept header
+    binary = binary_format.is_requested(format, request.headers.get('accept'))
+    # If num_rows and/or num_cols are set, only that window (tile) of cci_search matrices is returned
+    tile = None
+    if num_rows is not None or num_cols is not None:
+        tile = (row_offset, num_rows, col_offset, num_cols)
+    # N.B. The project is loaded (if not loaded already) outside of the event loop
+    start = time.perf_counter()
+    (project_data, file_name2df, generation) = await run_in_threadpool(projects.get_with_generation, project)
+    # The stages of the request (c.f. metrics.STAGE_HISTOGRAM) are labelled with its project and viz
+    metrics.set_labels(project=project, viz=viz if viz in utils.VIZZES else '')
+    metrics.observe_stage('get_project', time.perf_counter() - start)
+    selected_genes = get_jsonable(genes)
+    selected_interacting_pairs = get_jsonable(interacting_pairs)
+    selected_classes = get_jsonable(classes)
+    selected_modalities = get_jsonable(modalities)
+    selected_cell_types = get_jsonable(cell_types)
+    selected_cell_type_pairs = get_jsonable(cell_type_pairs)
+    selected_microenvironments = get_jsonable(microenvironments)
+    # N.B. min_score is parsed before it is used in key - so that e.g. min_score=0 and min_score=0.0 share the same response
+    min_score = int(float(min_score))
+    # N.B. single_gene_expression returns the selected genes in the order (and with the duplicates) they were selected in
+    key_genes = tuple(selected_genes) if viz == 'single_gene_expression' else get_key(selected_genes)
+    key = (project, generation, viz, key_genes, get_key(selected_interacting_pairs), get_key(selected_classes),
+           get_key(selected_modalities), min_score, get_key(selected_cell_types), get_key(selected_cell_type_pairs),
+           get_key(selected_microenvironments), refresh_plot, values_to_show, interacting_pairs_selection_logic,
+           sort_interacting_pairs_alphabetically, binary, tile)
+    # N.B. The selection made for a tile is shared by all tiles of the same matrix (in either format) - i.e. key[0:-2]
+    # is key regardless of binary and tile
+    tile_selection_key = key[0:-2]
+    group = request.headers.get('x-request-group')
+    cached_response = response_cache.get(key)
+    if cached_response is not None:
+        # The earlier request in the group (if still in progress) must not be shown after this one
+        request_executor.supersede(group)
+    else:
+        # N.B. The response is cached even if the request is superseded while it is being filtered
+        cached_response = await request_executor.run(group,
+            lambda: response_cache.put(key, get_viz_data_body(
+                binary, project_data, file_name2df, viz, selected_genes, selected_interacting_pairs, selected_classes,
+                selected_modalities, min_score, selected_cell_types, selected_cell_type_pairs,
+                selected_microenvironments, refresh_plot, values_to_show, interacting_pairs_selection_logic,
+                sort_interacting_pairs_alphabetically, tile, tile_selection_key)))
+        if cached_response is None:
+            # The front end shows the response to the latest request in the group only
+            return FastJSONResponse({'detail': 'Superseded by a later request'}, status_code=409)
+    (etag, body) = cached_response
+    # Browsers re-validate the response they already have (c.f. Cache-Control: no-cache) and get 304 if it is unchanged;
+    # Vary: Accept - as the same URL may be sent in either JSON or binary format
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept'}
+    if is_not_modified(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    media_type = binary_format.MEDIA_TYPE if binary else "application/json"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def get_viz_data_body(binary: bool, *args) -> bytes:
+    ret = get_viz_data_dict(*args)
+    with metrics.span('serialise'):
+        if binary:
+            return binary_format.dumps(ret)
+        # N.B. ret is serialised directly (rather than via FastAPI's jsonable_encoder()) - c.f. FastJSONResponse
+        return FastJSONResponse(ret).body
+
+def get_viz_data_dict(project_data, file_name2df, viz,
+                      selected_genes, selected_interacting_pairs, selected_classes, selected_modalities, min_score,
+                      selected_cell_types, selected_cell_type_pairs, selected_microenvironments, refresh_plot,
+                      values_to_show, interacting_pairs_selection_logic, sort_interacting_pairs_alphabetically,
+                      tile = None, tile_selection_key = None) -> dict:
     if viz == 'single_gene_expression':
-        selected_genes = get_jsonable(genes)
-        selected_cell_types = get_jsonable(cell_types)
-        ret = copy.deepcopy(dir_name2project_data[project])
-        utils.populate_deconvoluted_data(ret, dir_name2file_name2df[project]['deconvoluted_result'], \
+        # N.B. Loaded project data is shared by all requests and is never modified - each request adds its results to
+        # shallow copies of the dicts it needs (populate_deconvoluted_data() only assigns keys at their top level)
+        ret = {'single_gene_expression': dict(project_data['single_gene_expression']),
+               'cell_cell_interaction_search': dict(project_data['cell_cell_interaction_search'])}
+        # N.B. The expressions are retrieved from the project's gene expression index (c.f. utils.get_gene_expression())
+        # rather than from the deconvoluted DataFrames
+        utils.populate_deconvoluted_data(ret, None, \
                                          selected_genes = selected_genes, selected_cell_types = selected_cell_types,
                                          refresh_plot = refresh_plot, percents = False)
         dict_sge = ret['single_gene_expression']
-        if 'deconvoluted_percents' in dir_name2file_name2df[project]:
-            utils.populate_deconvoluted_data(ret, dir_name2file_name2df[project]['deconvoluted_percents'], \
+        if 'deconvoluted_percents' in dict_sge['gene_expression']:
+            utils.populate_deconvoluted_data(ret, None, \
                                              # The following ensures that the same genes and cell types are used to
                                              # filter deconvoluted_percents as were used to filter deconvoluted_result
                                              selected_genes=dict_sge['genes'], \
                                              selected_cell_types=dict_sge['cell_types'], \
                                              refresh_plot=refresh_plot, percents = True)
-        if refresh_plot:
-            # Autocompletes are initialised on first load only - hence on refresh_plot we avoid
-            # bulking-up the API output unnecessarily
-            dict_sge.pop('all_genes')
+        # E.g. gene_index is used for filtering by genes, and all_genes is searched via /autocomplete/{project}/genes,
+        # but neither is used by the front end directly
+        utils.remove_server_side_data(dict_sge)
         ret = dict_sge
 
     elif viz == 'cell_cell_interaction_search':
-        selected_genes = get_jsonable(genes)
-        selected_interacting_pairs = get_jsonable(interacting_pairs)
-        selected_cell_types = get_jsonable(cell_types)
-        selected_cell_type_pairs = get_jsonable(cell_type_pairs)
-        selected_microenvironments = get_jsonable(microenvironments)
-        selected_classes = get_jsonable(classes)
-        selected_modalities = get_jsonable(modalities)
-        ret = copy.deepcopy(dir_name2project_data[project][viz])
-        if refresh_plot:
-            # Autocompletes are initialised on first load only - hence on refresh_plot
-            # we avoid bulking-up the API output unnecessarily
-            ret.pop('all_genes')
-            ret.pop('all_interacting_pairs')
-        utils.filter_interactions_for_cci_search(ret, dir_name2file_name2df[project],
+        # N.B. filter_interactions_for_cci_search() only assigns keys at the top level of ret
+        ret = dict(project_data[viz])
+        selection = tile_selection_cache.get(tile_selection_key) if tile is not None else None
+        selection = utils.filter_interactions_for_cci_search(ret, file_name2df,
                                   selected_genes, selected_interacting_pairs, selected_classes, selected_cell_types,
                                   selected_cell_type_pairs, selected_microenvironments, refresh_plot, values_to_show,
-                                  interacting_pairs_selection_logic, sort_interacting_pairs_alphabetically)
-        # 'analysis_means' is used for pre-selecting interacting pairs - it is not needed by the front end
-        ret.pop('analysis_means')
-        # cellphonedb is needed for retrieving properties of interacting pairs but it is not used by the front end directly
-        if 'cellphonedb' in ret:
-            ret.pop('cellphonedb')
+                                  interacting_pairs_selection_logic, sort_interacting_pairs_alphabetically, tile,
+                                  selection)
+        if tile is not None and selection is not None:
+            tile_selection_cache.put(tile_selection_key, selection)
+        # E.g. 'analysis_means' is used for pre-selecting interacting pairs and cellphonedb is needed for retrieving
+        # properties of interacting pairs, but neither is used by the front end directly (N.B. neither are the
+        # vocabularies of genes, interacting pairs and cell type pairs - c.f. /autocomplete/{project}/{field})
+        utils.remove_server_side_data(ret)
     elif viz == 'cell_cell_interaction_summary':
-        selected_classes = get_jsonable(classes)
-        selected_modalities = get_jsonable(modalities)
-        ret = copy.deepcopy(dir_name2project_data[project][viz])
+        # N.B. filter_interactions_for_cci_summary() only assigns keys at the top level of ret
+        ret = dict(project_data[viz])
         significant_interactions_only = True
         utils.filter_interactions_for_cci_summary(
-            ret, dir_name2file_name2df[project], selected_classes,
-            selected_modalities, int(min_score), significant_interactions_only)
+            ret, file_name2df, selected_classes,
+            selected_modalities, min_score, significant_interactions_only)
+        utils.remove_server_side_data(ret)
     else:
-        ret = dir_name2project_data[project][viz]
+        ret = project_data[viz]
     return ret
 
+# Sidenav html for interacting_pair - retrieved by the front end when the user clicks on an interacting pair in
+# cell_cell_interaction_search plot (N.B. interacting_pair:path allows for '/' in interacting pair names)
+@api.get("/interaction/{project}/{interacting_pair:path}", response_class=HTMLResponse)
+def get_interaction_html(project: str, interacting_pair: str):
+    (project_data, _, generation) = projects.get_with_generation(project)
+    key = (project, generation, interacting_pair)
+    html = properties_html_cache.get(key)
+    if html is None:
+        html = utils.get_properties_html(project_data['cell_cell_interaction_search'], interacting_pair)
+        if html is None:
+            return HTMLResponse(status_code=404)
+        properties_html_cache.put(key, html)
+    return HTMLResponse(html)
+
+# Values of field (genes, interacting_pairs or cell_type_pairs) with a word starting with q - for the front end's
+# autocompletes (rather than shipping the whole vocabularies to the browser)
+@api.get("/autocomplete/{project}/{field}")
+def get_autocomplete(project: str, field: str, q: str = "", limit: int = utils.AUTOCOMPLETE_LIMIT) -> list:
+    (project_data, _) = projects.get(project)
+    return utils.autocomplete(project_data, field, q, limit)
+
+# The genes of family (e.g. WNT*, as suggested by /autocomplete/{project}/genes) - for the front end to expand the family
+# into the genes it selects
+@api.get("/gene_family/{project}")
+def get_gene_family(project: str, family: str) -> list:
+    (project_data, _) = projects.get(project)
+    return utils.get_gene_family(project_data, family)
+
+# The cell types paired with each of cell_types (as the first cell type of a cell type pair) - for the front end's
+# cell type pair selection grid in cell_cell_interaction_search plot
+@api.get("/cell_type_pairs/{project}")
+def get_paired_cell_types(project: str, cell_types: str = None) -> dict:
+    (project_data, _) = projects.get(project)
+    return utils.get_paired_cell_types(project_data['cell_cell_interaction_search'], get_jsonable(cell_types))
+
 @api.get("/generate/hash")
 def generate_random_hash() -> str:
     return utils.generate_random_hash()
@@ -105,15 +243,16 @@ def generate_random_hash() -> str:
 @api.get("/validate/{project_id}")
 def validate_projectid(project_id: str) -> bool:
     ret = False
-    if project_id in dir_name2project_data:
+    if project_id in projects:
         ret = True
     return ret
 
 @api.get("/validate/auth/{project_id}")
 def validate_auth(project_id: str, auth: str) -> bool:
     ret = False
-    if 'hash' in dir_name2project_data[project_id]:
-            if hash is not None and auth == dir_name2project_data[project_id]['hash']:
+    config = projects.get_config(project_id)
+    if 'hash' in config:
+            if hash is not None and auth == config['hash']:
                 ret = True
     else:
         ret = True
@@ -125,8 +264,22 @@ def get_jsonable(val: str) -> list:
         ret = jsonable_encoder(val).split(",")
     return ret
 
+def get_key(selected_values: list) -> tuple:
+    # N.B. The selected values are de-duplicated and sorted in response_cache's key only (the filters get them in
+    # the order they were selected in) - so that requests differing only in the order of the selected values share
+    # the same response
+    return tuple(sorted(set(selected_values)))
+
 app = FastAPI()
 # See: https://fastapi.tiangolo.com/tutorial/cors/
 app.add_middleware(CORSMiddleware, allow_origins=["*"])
+
+# Latency histograms in Prometheus text format - c.f. utils/metrics.py
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(request: Request):
+    if not metrics.is_allowed_host(request.client.host if request.client else None):
+        return PlainTextResponse(status_code=403)
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
 app.mount("/api", api)
 app.mount("/", StaticFiles(directory="public", html = True), name="public")
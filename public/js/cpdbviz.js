@@ -116,7 +116,7 @@ document.addEventListener('DOMContentLoaded', function() {
         success: function(res) {
             generateSingleGeneExpressionPlot(res, storeTokens=true);
             // Enable gene and cell type input autocompletes for gene expression plot
-            enable_autocomplete('sge_gene_input', 'sge_selected_genes', res['all_genes']);
+            enable_server_side_autocomplete('sge_gene_input', 'sge_selected_genes', 'genes');
             enable_autocomplete('sge_celltype_input', 'sge_selected_celltypes', res['all_cell_types']);
             if (res.hasOwnProperty('microenvironments')) {
                 enable_autocomplete('sge_microenvironment_input', 'sge_selected_microenvironments', res['microenvironments']);
@@ -154,10 +154,11 @@ document.addEventListener('DOMContentLoaded', function() {
             $('#num_all_cell_type_pairs').text(res['num_all_cell_type_pairs']);
             // Enable gene and cell type input autocompletes for gene expression plot
             enable_autocomplete('cci_search_celltype_input', 'cci_search_selected_celltypes', res['all_cell_types']);
-            enable_autocomplete('cci_search_gene_input', 'cci_search_selected_genes', res['all_genes']);
-            enable_autocomplete('cci_search_interaction_input', 'cci_search_selected_interactions', res['all_interacting_pairs']);
-            initialise_cell_type_pairs(res['all_cell_type_pairs']);
-            populate_cci_cell_type_pair_search_grid();
+            enable_server_side_autocomplete('cci_search_gene_input', 'cci_search_selected_genes', 'genes');
+            enable_server_side_autocomplete('cci_search_interaction_input', 'cci_search_selected_interactions', 'interacting_pairs');
+            cell_type_pair_separator = res['separator'];
+            // Cell type pairs are retrieved for the selected cell types only - rather than for all cell types on page load
+            load_cell_type_pairs(res['selected_cell_types']).then(populate_cci_cell_type_pair_search_grid);
             if (res.hasOwnProperty('microenvironments')) {
                 enable_autocomplete('cci_search_microenvironment_input', 'cci_search_selected_microenvironments', res['microenvironments']);
                 // Initialise 'Filter cell types by micro-environment in 'cell-cell interaction search' plot select dropdown
@@ -316,6 +317,25 @@ function enable_side_navs() {
     var instances = M.Sidenav.init(elems, options);
 }
 
+function openInteractingPairSidenav(interacting_pair) {
+    /*Open the sidenav with information about interacting_pair - its content is retrieved from the API (and inserted
+    into #cci_search_sidenav_content div) when the sidenav is opened for the first time*/
+    const sidenav = document.getElementById('sidenav_' + interacting_pair);
+    if (sidenav) {
+        M.Sidenav.getInstance(sidenav).open();
+        return;
+    }
+    $.ajax({
+        url: './api/interaction/' + getProjectId() + '/' + encodeURIComponent(interacting_pair),
+        dataType: 'html',
+        success: function(html) {
+            $('#cci_search_sidenav_content').append(html);
+            const instance = M.Sidenav.init(document.getElementById('sidenav_' + interacting_pair), {});
+            instance.open();
+        }
+    });
+}
+
 function enable_cci_summary_switch(num_cell_types) {
     $('#cci_summary_switch').on('change', function() {
         var max_cci_summary_plot_number= 9;
@@ -435,6 +455,55 @@ function enable_autocomplete(input_field_id, target_div_class, vals) {
     var instances = M.Autocomplete.init(elems, options);
 }
 
+// The maximum number of values shown in the autocompletes backed by the API
+const AUTOCOMPLETE_LIMIT = 5;
+
+function enable_server_side_autocomplete(input_field_id, target_div_class, field) {
+    /*Enable autocomplete for input_field_id, in which the values matching the user's input are retrieved from the API
+    (c.f. /api/autocomplete/{project}/{field}) - rather than the whole vocabulary of field being sent to the browser.
+    Parameters:
+      -> field(string): genes, interacting_pairs or cell_type_pairs
+    */
+    const url = './api/autocomplete/' + getProjectId() + '/' + field;
+    const options = {
+        data : {},
+        sortFunction : sortBy,
+        limit: AUTOCOMPLETE_LIMIT,
+        onAutocomplete: function(val) {
+            if (val.match(/\*$/)) {
+                // If val is a pseudo-regex string (e.g. WNT*), expand it into all matching gene names
+                $.ajax({
+                    url: './api/gene_family/' + getProjectId(),
+                    data: {family: val},
+                    dataType: 'json',
+                    success: function(vals) {
+                        vals.forEach( e => storeToken(e, target_div_class, input_field_id));
+                    }
+                });
+            } else {
+                storeToken(val, target_div_class, input_field_id)
+            }
+        }
+    }
+    var elems = document.querySelectorAll('#'+input_field_id);
+    var instances = M.Autocomplete.init(elems, options);
+    $('#'+input_field_id).on('input', function() {
+        const query = $(this).val();
+        $.ajax({
+            url: url,
+            data: {q: query, limit: AUTOCOMPLETE_LIMIT},
+            dataType: 'json',
+            success: function(vals) {
+                // Ignore the response if the user has changed their input in the meantime
+                if ($('#'+input_field_id).val() == query) {
+                    instances[0].updateData(Object.fromEntries(vals.map(e => [e, null])));
+                    instances[0].open();
+                }
+            }
+        });
+    });
+}
+
 // Sort function for sorting autocomplete results
 function sortBy(a, b) {
   return  b > a;
@@ -512,12 +581,21 @@ function refreshSGEPlot() {
     }
     // In refresh mode, we don't pre-select interactions/cell type pairs - if the user did not enter any selections
     url += "refresh_plot=True";
+    $("#sge_spinner").show();
     $.ajax({
             url: url,
             contentType: "application/json",
             dataType: 'json',
+            headers: getRequestGroupHeaders('single_gene_expression'),
             success: function(res) {
                 generateSingleGeneExpressionPlot(res, storeTokens=false);
+            },
+            complete: function(jqXHR, textStatus) {
+                if (jqXHR.status == 409) {
+                    // The request was superseded by a later one - which is still in progress
+                    return;
+                }
+                $("#sge_spinner").hide();
             }
      });
 }
@@ -1630,6 +1708,7 @@ function refreshCCISummaryPlots(storeTokens=false) {
         url: url,
         contentType: "application/json",
         dataType: 'json',
+        headers: getRequestGroupHeaders('cell_cell_interaction_summary'),
         success: function(res) {
            if (res.hasOwnProperty('microenvironment2cell_types')) {
                 if (maxCellTypesExceeded(res['all_cell_types'])) {
@@ -1777,6 +1856,15 @@ function refreshCCISummaryPlots(storeTokens=false) {
             }
             // Hide progress spinner
             $("#cci_summary_spinner").hide();
+        },
+        complete: function(jqXHR, textStatus) {
+            if (jqXHR.status == 409) {
+                // The request was superseded by a later one - which is still in progress
+                return;
+            }
+            if (jqXHR.status != 200) {
+                $("#cci_summary_spinner").hide();
+            }
         }
      });
 }
@@ -1873,16 +1961,10 @@ function generateCellCellInteractionSearchPlot(data, storeTokens, interacting_pa
     const interacting_pair2classes = data['interacting_pair2classes'];
     // interacting_pair2modalities is retrieved from analysis_means file - is available in versions>=v5.1.0 of cellphonedb-data
     const interacting_pair2modalities = data['interacting_pair2modalities'];
-    // interacting_pair2properties_html from CellphoneDB database file - it it was provided in the config file
-    const interacting_pair2properties_html = data['interacting_pair2properties_html'];
-    if (typeof interacting_pair2properties_html != 'undefined') {
-        // CellphoneDB database file name was provided in config file - we have richer participants info to show (in sidenav) than
-        // interacting_pair2properties (retrieved from analysis means file and shown as a tooltip) - insert sidenav content
-        // into #cci_search_sidenav_content div
-        for (var ip in interacting_pair2properties_html) {
-            $('#cci_search_sidenav_content').append(interacting_pair2properties_html[ip]);
-        }
-    }
+    // interacting_pair_sidenavs is set if CellphoneDB database file was provided in the config file - we then have richer
+    // participants info to show (in sidenav) than interacting_pair2properties (retrieved from analysis means file and shown
+    // as a tooltip) - each sidenav's content is retrieved from the API when first opened (c.f. openInteractingPairSidenav())
+    const interacting_pair_sidenavs = data['interacting_pair_sidenavs'];
     
     if (storeTokens) {
         if (typeof selectedMicroenvironments != 'undefined' && selectedMicroenvironments.length > 0 && $('.cci_search_selected_microenvironments').is(':empty')) {
@@ -2102,7 +2184,7 @@ function generateCellCellInteractionSearchPlot(data, storeTokens, interacting_pa
         .text(title);
 
     var ip_info = " on an interaction pair on Y axis and on each circle in the plot for more information.";
-    if (typeof interacting_pair2properties_html !== 'undefined') {
+    if (typeof interacting_pair_sidenavs !== 'undefined') {
         ip_info = "Click" + ip_info;
     } else {
         ip_info = "Mouse over " + ip_info;
@@ -2141,7 +2223,7 @@ function generateCellCellInteractionSearchPlot(data, storeTokens, interacting_pa
   }
 
   cciSearchRenderYAxis(svg, yVals, yScale, xMargin, top_yMargin, xAxisLength, colorscale, tooltip_xPos, tooltip_yPos,
-                       interacting_pair2participants, interacting_pair2properties, interacting_pair2properties_html,
+                       interacting_pair2participants, interacting_pair2properties, interacting_pair_sidenavs,
                        interacting_pair2classes, ip2Colour, ip2ModalityAcronym);
   cciSearchRenderXAxis(svg, xVals, xScale, xMargin, height, top_yMargin, bottom_yMargin, ctp2Colour);
   const barLegend_xPos=width-300;
@@ -2469,7 +2551,7 @@ function cciSearchRenderXAxis(svg, xVals, xScale, xMargin, height, top_yMargin,
 }
 
 function cciSearchRenderYAxis(svg, yVals, yScale, xMargin, top_yMargin, xAxisLength, colorscale, tooltip_xPos, tooltip_yPos,
-                              interacting_pair2participants, interacting_pair2properties, interacting_pair2properties_html,
+                              interacting_pair2participants, interacting_pair2properties, interacting_pair_sidenavs,
                               interacting_pair2classes, ip2Colour, ip2ModalityAcronym) {
     var yAxis = d3
       .axisLeft()
@@ -2597,13 +2679,12 @@ function cciSearchRenderYAxis(svg, yVals, yScale, xMargin, top_yMargin, xAxisLen
         return ret;
      }
 
-     if (typeof interacting_pair2properties_html !== 'undefined') {
+     if (typeof interacting_pair_sidenavs !== 'undefined') {
          d3.selectAll("#cci_search_y-axis g.tick").each(function() {
             d3.select(this)
             .on("click", function(d) {
                 // split() below is needed in the case the modality was appended to this.textContent (see below)
-                var instance = M.Sidenav.getInstance($('#sidenav_' + this.textContent.split(" ")[0]));
-                instance.open();
+                openInteractingPairSidenav(this.textContent.split(" ")[0]);
             })
             .select("text").style("cursor", function() {
                 return "pointer";
@@ -2736,6 +2817,16 @@ function refreshCCISearchPlot(interacting_pairs_selection_logic, storeTokens=fal
     var pos=0;
     var selectedGenes = ret[pos++];
     var selectedCellTypes = ret[pos++];
+    if (selectedCellTypes) {
+      const cellTypes = decodeURIComponent(selectedCellTypes).split(",");
+      if (cellTypes.some(ct => !cell_types_with_pairs_loaded.has(ct))) {
+        // The cell type pairs of newly selected cell types are needed for updating cell type pair selection below
+        load_cell_type_pairs(cellTypes).then(function() {
+          refreshCCISearchPlot(interacting_pairs_selection_logic, storeTokens);
+        });
+        return;
+      }
+    }
     populate_cci_cell_type_pair_search_grid(); //update cell type pair selection
     var selectedCellTypePairs = selectedCellTypes ? [CCIGetSelectedCellTypePairs()] : [] ;
     var selectedInteractions = ret[pos++];
@@ -2796,6 +2887,7 @@ function refreshCCISearchPlot(interacting_pairs_selection_logic, storeTokens=fal
               url: url,
               contentType: "application/json",
               dataType: 'json',
+              headers: getRequestGroupHeaders('cell_cell_interaction_search'),
               success: function(res) {
                   generateCellCellInteractionSearchPlot(res, storeTokens=false, interacting_pairs_selection_logic);
                   // Enable side navs - used for displaying interacting pair participant information
@@ -2803,6 +2895,10 @@ function refreshCCISearchPlot(interacting_pairs_selection_logic, storeTokens=fal
               },
               complete: function(jqXHR, textStatus) {
                   var errMsg;
+                  if (jqXHR.status == 409) {
+                      // The request was superseded by a later one - which is still in progress
+                      return;
+                  }
                   if (jqXHR.status == 400) {
                       $("#cci_search_sel_ips_request_error").text("ERROR: Your search criteria are too large for this service to handle. Please restrict your search and try again.")
                       $("#cci_search_sel_ips_request_error").show();
@@ -2832,6 +2928,10 @@ const MARGIN_LEFT = 200;
 const MARGIN_BOTTOM = -200;
 var selection_grid_obj = null;
 var pairs_map = {};
+// Cell types for which cell type pairs have been retrieved into pairs_map - c.f. load_cell_type_pairs()
+var cell_types_with_pairs_loaded = new Set();
+// The project's separator of the cell types in cell type pairs (c.f. separator in config.yml)
+var cell_type_pair_separator = "|";
 var grid_cell_type_data = [];
 
 function render_x_axis_cci_cell_type_pair_search(svg, xVals, xScale) {
@@ -3002,21 +3102,33 @@ function generate_cci_cell_type_pair_search_grid(ticks_arr){
   });
 }
 
-function initialise_cell_type_pairs(all_cell_type_pairs){
-  //Populate pair mapping with incoming/outgoing interactions
-  //key is outgoing interaction, values are incoming interactions
-  for(pair=0; pair < all_cell_type_pairs.length; pair++){
-    const cell_type_pair = all_cell_type_pairs[pair];
-    const individual_types = cell_type_pair.split("|");
-    if (pairs_map.hasOwnProperty(individual_types[0])) {
-        pairs_map[individual_types[0]].push(individual_types[1])
-    } else {
-        pairs_map[individual_types[0]] = [individual_types[1]];
-    }
+function load_cell_type_pairs(cell_types){
+  /*Retrieve from the API (in a single request) the cell type pairs in which the first cell type is one of cell_types
+  that have not been retrieved yet, and add them to pairs_map
+  Parameters:
+    -> cell_types: array of cell types
+  Returns:
+    -> a promise that is resolved once all the cell type pairs have been retrieved
+  */
+  const cell_types_to_load = cell_types.filter(ct => !cell_types_with_pairs_loaded.has(ct));
+  if (!cell_types_to_load.length) {
+    return $.when();
   }
+  return $.ajax({
+    url: './api/cell_type_pairs/' + getProjectId(),
+    data: {cell_types: cell_types_to_load.join(",")},
+    dataType: 'json',
+    success: function(cell_type2paired_cell_types) {
+      //Populate pair mapping with incoming/outgoing interactions
+      //key is outgoing interaction, values are incoming interactions
+      for (const cell_type of cell_types_to_load) {
+        pairs_map[cell_type] = cell_type2paired_cell_types[cell_type] || [];
+        cell_types_with_pairs_loaded.add(cell_type);
+      }
+    }
+  });
 }
 
-
 function populate_cci_cell_type_pair_search_grid() {
   /*
   Using all cell types, generate a grid format so that each cell type has a row and column
@@ -3086,7 +3198,7 @@ function CCIGetSelectedCellTypePairs(){
     // iterate for cells/columns inside rows
     for (var cell = 0; cell < grid_cell_type_data[row].cells.length; cell++) {
       if (grid_cell_type_data[row].cells[cell].clicked && grid_cell_type_data[row].cells[cell].interacts){
-        selected_pairs.push(grid_cell_type_data[row].cells[cell].xLabel + "|" + grid_cell_type_data[row].cells[cell].yLabel);
+        selected_pairs.push(grid_cell_type_data[row].cells[cell].xLabel + cell_type_pair_separator + grid_cell_type_data[row].cells[cell].yLabel);
       }
     }
   }
@@ -3103,6 +3215,15 @@ function getHash() {
     return urlParams.get('auth')
 }
 
+// Identifies the requests from this page - c.f. getRequestGroupHeaders()
+const PAGE_ID = Math.random().toString(36).substring(2);
+
+function getRequestGroupHeaders(viz) {
+    /*Returns the headers that assign a request for viz's data to this page's group of requests for viz - in which each
+    request supersedes the earlier ones still in progress (the API responds to those with status 409)*/
+    return {'X-Request-Group': PAGE_ID + ':' + viz};
+}
+
 function getProjectId() {
     const queryString = window.location.search
     const urlParams = new URLSearchParams(window.location.search);
@@ -1,3 +1,22 @@
 #!/usr/bin/env bash
 
-uvicorn main:app --host=0.0.0.0 --port=${APP_PORT:-8001} --reload --log-level=debug
+# Projects added, changed or removed under data/ are picked up (every HOT_RELOAD_INTERVAL seconds) without restarting
+# the web service - c.f. ProjectRegistry.scan()
+HOT_RELOAD_INTERVAL=${HOT_RELOAD_INTERVAL:-10}
+
+if [ "${WORKERS:-1}" -gt 1 ]; then
+  # The projects' caches are built once, before the worker processes are started; each worker then memory-maps
+  # the cached arrays - so that all workers share a single copy of the projects' data
+  export MMAP_CACHE=1
+  python -c "from utils import utils; utils.build_all_project_caches()" || exit 1
+  if [ "${HOT_RELOAD_INTERVAL}" != "0" ]; then
+    # Only this (single) process re-builds the caches of the changed projects; the workers merely re-read them
+    # (CACHE_READ_ONLY=1) - c.f. utils.watch_project_caches()
+    python -c "from utils import utils; utils.watch_project_caches(${HOT_RELOAD_INTERVAL})" &
+    trap "kill $!" EXIT
+  fi
+  HOT_RELOAD_INTERVAL=${HOT_RELOAD_INTERVAL} CACHE_READ_ONLY=1 \
+    uvicorn main:app --host=0.0.0.0 --port=${APP_PORT:-8001} --workers=${WORKERS} --log-level=debug
+else
+  HOT_RELOAD_INTERVAL=${HOT_RELOAD_INTERVAL} uvicorn main:app --host=0.0.0.0 --port=${APP_PORT:-8001} --reload --log-level=debug
+fi
@@ -0,0 +1,52 @@
+import os
+import sys
+import pytest
+
+base_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, f"{base_path}/..")
+from utils import utils, project_cache
+
+"""
+Tests of the autocompletes backed by the API (c.f. utils.autocomplete()) and of the expansion of the gene families they
+suggest (c.f. utils.get_gene_family()) - on the example projects under data/.
+"""
+DATA_ROOT = f"{base_path}/../data"
+
+def get_example_projects() -> list:
+    (prev_data_root, utils.DATA_ROOT) = (utils.DATA_ROOT, DATA_ROOT)
+    try:
+        return utils.get_project_dirs()
+    finally:
+        utils.DATA_ROOT = prev_data_root
+
+@pytest.fixture(scope='module', params=get_example_projects())
+def project_data(request) -> dict:
+    (prev_data_root, prev_cache_root) = (utils.DATA_ROOT, project_cache.CACHE_ROOT)
+    (utils.DATA_ROOT, project_cache.CACHE_ROOT) = (DATA_ROOT, '')
+    try:
+        config = utils.get_project_config(request.param)
+        if not all(os.path.exists(fpath) for fpath in utils.get_project_files(request.param, config)):
+            pytest.skip("Not all files in config.yml of {} exist".format(request.param))
+        yield utils.load_project(request.param, config)[0]
+    finally:
+        (utils.DATA_ROOT, project_cache.CACHE_ROOT) = (prev_data_root, prev_cache_root)
+
+@pytest.mark.parametrize('field', utils.AUTOCOMPLETE_FIELD2KEY.keys())
+@pytest.mark.parametrize('limit', [0, 5, utils.AUTOCOMPLETE_MAX_LIMIT + 1])
+def test_autocomplete_limit(project_data, field, limit):
+    vocabulary = project_data['cell_cell_interaction_search'][utils.AUTOCOMPLETE_FIELD2KEY[field]]
+    # All genes' families are suggested along with the genes
+    num_values = len(vocabulary) + \
+        (len(utils.get_gene_families(vocabulary, range(len(vocabulary)))) if field == 'genes' else 0)
+    assert len(utils.autocomplete(project_data, field, '', limit)) == \
+        min(limit, utils.AUTOCOMPLETE_MAX_LIMIT, num_values)
+
+def test_get_gene_family(project_data):
+    genes = project_data['cell_cell_interaction_search']['all_genes']
+    families = utils.get_gene_families(genes, range(len(genes)))
+    assert families
+    for family in families:
+        assert utils.get_gene_family(project_data, family) == [gene for gene in genes if gene.startswith(family[0:-1])]
+    # Only the gene families suggested by autocomplete() are expanded
+    for family in ['*', 'W*', 'WN*', families[0][0:-1], families[0] + 'X*']:
+        assert utils.get_gene_family(project_data, family) == []
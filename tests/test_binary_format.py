@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import struct
+import numpy as np
+import pytest
+
+base_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, f"{base_path}/..")
+from utils import binary_format, fast_json
+
+"""
+Round-trip tests of the binary encoding of /api/data responses (c.f. binary_format.dumps()) - each matrix is read back
+from the encoded response as the front end reads it, and compared with the response's JSON encoding.
+"""
+DTYPE2NUMPY_DTYPE = {'float32': '<f4', 'uint8': 'u1'}
+
+def loads(body: bytes) -> (dict, dict):
+    # Returns (header, key -> matrix) of body
+    header_length = struct.unpack('<I', body[0:4])[0]
+    header = json.loads(body[4:4 + header_length])
+    key2matrix = {}
+    for (key, matrix) in header.pop('matrices').items():
+        assert matrix['offset'] % 4 == 0
+        (num_rows, num_cols) = matrix['shape']
+        key2matrix[key] = np.frombuffer(body, DTYPE2NUMPY_DTYPE[matrix['dtype']], num_rows * num_cols,
+                                        matrix['offset']).reshape(num_rows, num_cols)
+    return (header, key2matrix)
+
+@pytest.mark.parametrize('content', [
+    # Typical cell_cell_interaction_search response
+    {'values': [[0.5, 1.25, 0.0], [3.75, 0.125, 2.0]], 'filtered_pvalues': [[0.001, 1, 1], [0.05, 0.5, 1]],
+     'filtered_relevant_interactions': [[0, 1, 1], [1, 0, 0]], 'interacting_pairs_means': ['A_B', 'C_D'],
+     'cell_type_pairs_means': ['x|y', 'y|x', 'x|x'], 'min_value': 0.0, 'max_value': 3.75},
+    # Whole numbers that do not fit into uint8
+    {'values': [[0, 256], [-1, 3]]},
+    # A matrix without rows, and one with rows but without columns (e.g. a tile beyond the matrix's columns)
+    {'values': [], 'filtered_pvalues': [[], []], 'interacting_pairs_means': ['A_B', 'C_D']},
+    # Matrices with a single row and column
+    {'values': [[7.5]], 'filtered_relevant_interactions': [[1]]}])
+def test_dumps(content):
+    (header, key2matrix) = loads(binary_format.dumps(content))
+    json_content = json.loads(fast_json.dumps(content))
+    for (key, matrix) in key2matrix.items():
+        expected = json_content.pop(key)
+        assert list(matrix.shape) == [len(expected), len(expected[0]) if expected else 0]
+        np.testing.assert_array_equal(matrix, np.array(expected, dtype=np.float32).reshape(matrix.shape))
+    assert header == json_content
+
+def test_dumps_dtypes():
+    (_, key2matrix) = loads(binary_format.dumps({'values': [[0.5, 1]], 'filtered_relevant_interactions': [[0, 1]],
+                                                 'filtered_pvalues': [[1, float('nan')]]}))
+    assert key2matrix['values'].dtype == np.float32
+    assert key2matrix['filtered_relevant_interactions'].dtype == np.uint8
+    # N.B. nan is not a whole number - hence the matrix is sent as float32 rather than uint8
+    assert key2matrix['filtered_pvalues'].dtype == np.float32
+    assert key2matrix['filtered_pvalues'][0, 0] == 1 and np.isnan(key2matrix['filtered_pvalues'][0, 1])
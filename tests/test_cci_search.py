@@ -0,0 +1,182 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+base_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, f"{base_path}/..")
+from utils import utils, project_cache
+
+"""
+Regression tests of the retrieval of the values for cell_cell_interaction_search plot from the projects' sparse matrices
+(c.f. utils.get_sparse_block()) - against the nested loops over the selected interacting pairs and cell type pairs
+they replaced, on the example projects under data/. N.B. The nested loops read the values from the dicts of dicts
+built from the project's files as before the sparse matrices (c.f. get_dict_of_dicts()) - rather than from the
+sparse matrices themselves.
+"""
+DATA_ROOT = f"{base_path}/../data"
+# The example projects have fewer cell type pairs than utils.SPARSE_MATRIX_CHUNK_SIZE - they are parsed in chunks of
+# the size below, so that the values are converted across multiple chunks (c.f. utils.get_sparse_matrix())
+SPARSE_MATRIX_CHUNK_SIZE = 7
+# Sparse matrix -> the value of its elements that are not stored
+MATRIX2DEFAULT = {'interaction_scores': 0, 'relevant_interactions': 0, 'pvalues': 1}
+
+def get_example_projects() -> list:
+    (prev_data_root, utils.DATA_ROOT) = (utils.DATA_ROOT, DATA_ROOT)
+    try:
+        return utils.get_project_dirs()
+    finally:
+        utils.DATA_ROOT = prev_data_root
+
+@pytest.fixture(scope='module', params=get_example_projects())
+def project(request) -> (dict, dict, dict, pd.DataFrame):
+    # Returns (project_data, file_name2df) of the example project request.param - parsed, rather than read from its
+    # cache - and, read directly from the project's files, get_dict_of_dicts() of each of MATRIX2DEFAULT and the means
+    (prev_data_root, prev_cache_root, prev_chunk_size) = \
+        (utils.DATA_ROOT, project_cache.CACHE_ROOT, utils.SPARSE_MATRIX_CHUNK_SIZE)
+    (utils.DATA_ROOT, project_cache.CACHE_ROOT, utils.SPARSE_MATRIX_CHUNK_SIZE) = \
+        (DATA_ROOT, '', SPARSE_MATRIX_CHUNK_SIZE)
+    try:
+        config = utils.get_project_config(request.param)
+        if not all(os.path.exists(fpath) for fpath in utils.get_project_files(request.param, config)):
+            pytest.skip("Not all files in config.yml of {} exist".format(request.param))
+        (project_data, file_name2df) = utils.load_project(request.param, config)
+        key2ctp2ip2value = {key: get_dict_of_dicts(f"{DATA_ROOT}/{request.param}/{config[key]}", key,
+                                                   config['separator']) for key in MATRIX2DEFAULT if key in config}
+        means_df = pd.read_csv(f"{DATA_ROOT}/{request.param}/{config['analysis_means']}", sep='\t', low_memory=False)
+        yield (project_data, file_name2df, key2ctp2ip2value, means_df)
+    finally:
+        (utils.DATA_ROOT, project_cache.CACHE_ROOT, utils.SPARSE_MATRIX_CHUNK_SIZE) = \
+            (prev_data_root, prev_cache_root, prev_chunk_size)
+
+def get_dict_of_dicts(fpath: str, key: str, separator: str) -> dict:
+    # Returns the values in file fpath of config key as cell_type_pair -> interacting_pair -> value - built as they were
+    # before the sparse matrices, i.e. without the values that are not stored (pvalues of 1, relevant interaction flags
+    # and interaction scores of 0), and with the last of the duplicate interacting pairs' values
+    df = pd.read_csv(fpath, sep='\t', low_memory=False)
+    # The cell type pair columns start at the first column containing separator
+    first_cell_type_pair = next(i for (i, col) in enumerate(df.columns) if separator in col)
+    ret = {}
+    for cell_type_pair in df.columns[first_cell_type_pair:]:
+        if key == 'pvalues':
+            df_filtered = df[['interacting_pair', cell_type_pair]][df[cell_type_pair] < 1]
+        else:
+            df_filtered = df[['interacting_pair', cell_type_pair]][df[cell_type_pair] > 0]
+        if not df_filtered.empty:
+            ret[cell_type_pair] = dict(zip(df_filtered['interacting_pair'], df_filtered[cell_type_pair]))
+    return ret
+
+def get_values_by_nested_loops(ctp2ip2value: dict, interacting_pairs: list, cell_type_pairs: list, default) -> list:
+    ret = []
+    for interacting_pair in interacting_pairs:
+        row = []
+        for cell_type_pair in cell_type_pairs:
+            if cell_type_pair in ctp2ip2value and interacting_pair in ctp2ip2value[cell_type_pair]:
+                row.append(ctp2ip2value[cell_type_pair][interacting_pair])
+            else:
+                row.append(default)
+        ret.append(row)
+    return ret
+
+def get_means_by_nested_loops(means_df: pd.DataFrame, interacting_pairs: list, cell_type_pairs: list) -> list:
+    means_df = means_df.drop_duplicates('interacting_pair').set_index('interacting_pair')
+    ret = []
+    for interacting_pair in interacting_pairs:
+        row = []
+        for cell_type_pair in cell_type_pairs:
+            value = means_df.at[interacting_pair, cell_type_pair]
+            row.append(0.0 if np.isnan(value) else value)
+        ret.append(row)
+    return ret
+
+def filter_interactions_for_cci_search(project: tuple, **kwargs) -> dict:
+    (project_data, file_name2df) = project[0:2]
+    ret = dict(project_data['cell_cell_interaction_search'])
+    args = {'genes': [], 'interacting_pairs': [], 'classes': [], 'cell_types': [], 'cell_type_pairs': [],
+            'microenvironments': [], 'refresh_plot': False, 'values_to_show': 'means',
+            'interacting_pairs_selection_logic': None, 'sort_interacting_pairs_alphabetically': False}
+    args.update(kwargs)
+    utils.filter_interactions_for_cci_search(ret, file_name2df, **args)
+    return ret
+
+@pytest.mark.parametrize('key', sorted(MATRIX2DEFAULT))
+def test_get_sparse_block(project, key):
+    result_dict = project[0]['cell_cell_interaction_search']
+    if key not in result_dict:
+        pytest.skip("The project has no {}".format(key))
+    ctp2ip2value = project[2][key]
+    # Interacting pairs and cell type pairs with values stored, duplicates and ones missing from the project
+    interacting_pairs = list(result_dict['interacting_pair2index'])[0:50]
+    interacting_pairs += interacting_pairs[0:3] + ['missing_interacting_pair']
+    cell_type_pairs = list(result_dict['cell_type_pair2index'])[0:20]
+    cell_type_pairs += cell_type_pairs[0:2] + ['missing|missing']
+    assert utils.get_sparse_block(result_dict[key], result_dict, interacting_pairs, cell_type_pairs,
+                                  MATRIX2DEFAULT[key]).tolist() == \
+        get_values_by_nested_loops(ctp2ip2value, interacting_pairs, cell_type_pairs, MATRIX2DEFAULT[key])
+
+# Config key -> the function that parses its file into a sparse matrix
+KEY2POPULATE = {'interaction_scores': utils.populate_interaction_scores_data,
+                'relevant_interactions': utils.populate_relevant_interactions_data,
+                'pvalues': utils.populate_pvalues_data}
+
+@pytest.mark.parametrize('key', sorted(MATRIX2DEFAULT))
+def test_get_sparse_matrix(tmp_path, monkeypatch, key):
+    # A file with duplicate interacting pairs (with different values), values that are not stored and nan,
+    # in more cell type pairs than fit into a single chunk
+    monkeypatch.setattr(utils, 'SPARSE_MATRIX_CHUNK_SIZE', SPARSE_MATRIX_CHUNK_SIZE)
+    rng = np.random.default_rng(0)
+    interacting_pairs = ["IP{}_IP{}".format(i, i) for i in rng.integers(0, 10, 40)]
+    cell_type_pairs = ["ct{}|ct{}".format(i // 5, i % 5) for i in range(3 * SPARSE_MATRIX_CHUNK_SIZE + 1)]
+    values = rng.choice([0, 0.001, 0.25, 0.5, 1, 2, np.nan], (len(interacting_pairs), len(cell_type_pairs)))
+    df = pd.DataFrame(values, columns=cell_type_pairs)
+    df.insert(0, 'interacting_pair', interacting_pairs)
+    df.insert(0, 'id_cp_interaction', ["CPI-{}".format(i) for i in range(len(interacting_pairs))])
+    fpath = str(tmp_path / "{}.txt".format(key))
+    df.to_csv(fpath, sep='\t', index=False)
+    result_dict = {'cell_cell_interaction_search': {}, 'cell_cell_interaction_summary': {}}
+    KEY2POPULATE[key](result_dict, utils.read_project_file(fpath, key, '|'), '|')
+    dict_cci_search = result_dict['cell_cell_interaction_search']
+    selected_interacting_pairs = sorted(set(interacting_pairs)) + ['missing_interacting_pair']
+    assert utils.get_sparse_block(dict_cci_search[key], dict_cci_search, selected_interacting_pairs, cell_type_pairs,
+                                  MATRIX2DEFAULT[key]).tolist() == \
+        get_values_by_nested_loops(get_dict_of_dicts(fpath, key, '|'), selected_interacting_pairs, cell_type_pairs,
+                                   MATRIX2DEFAULT[key])
+
+# Selection -> function returning the selection's keyword arguments of filter_interactions_for_cci_search()
+SELECTION2KWARGS = {
+    'preselected': lambda result_dict: {},
+    'cell_types': lambda result_dict: {'cell_types': result_dict['all_cell_types'][0:3], 'refresh_plot': True,
+                                       'interacting_pairs_selection_logic': 'all'},
+    'classes': lambda result_dict: {'classes': list(result_dict.get('class2interacting_pairs', {}))[0:2],
+                                    'cell_types': result_dict['all_cell_types'][0:2], 'refresh_plot': True},
+    'microenvironments': lambda result_dict: {
+        'microenvironments': result_dict.get('microenvironments', [])[0:1],
+        'cell_types': result_dict['all_cell_types'][0:1], 'refresh_plot': True,
+        'interacting_pairs_selection_logic': '10'}}
+
+@pytest.mark.parametrize('values_to_show', ['means', 'zscores', 'scores'])
+@pytest.mark.parametrize('selection', sorted(SELECTION2KWARGS))
+def test_filter_interactions_for_cci_search(project, selection, values_to_show):
+    kwargs = SELECTION2KWARGS[selection](project[0]['cell_cell_interaction_search'])
+    ret = filter_interactions_for_cci_search(project, values_to_show=values_to_show, **kwargs)
+    if 'values' not in ret:
+        pytest.skip("No interactions were selected")
+    (interacting_pairs, cell_type_pairs) = (ret['interacting_pairs_means'], ret['cell_type_pairs_means'])
+    means = get_means_by_nested_loops(project[3], interacting_pairs, cell_type_pairs)
+    if values_to_show == 'scores' and 'interaction_scores' in ret:
+        assert ret['values'] == get_values_by_nested_loops(project[2]['interaction_scores'],
+                                                           interacting_pairs, cell_type_pairs, 0)
+    elif values_to_show == 'zscores':
+        zscores = np.round(np.nan_to_num(stats.zscore(np.array(means), axis=1), nan=0.0), 3)
+        # N.B. The z-scores are rounded to 3 decimal places
+        np.testing.assert_allclose(ret['values'], zscores, atol=1e-3)
+    else:
+        # N.B. Means are shown also for values_to_show='scores' if the project has no interaction scores
+        assert ret['values'] == means
+    for key in ['relevant_interactions', 'pvalues']:
+        if key in ret:
+            assert ret['filtered_' + key] == get_values_by_nested_loops(project[2][key],
+                                                                        interacting_pairs, cell_type_pairs,
+                                                                        MATRIX2DEFAULT[key])
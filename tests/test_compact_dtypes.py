@@ -0,0 +1,76 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+base_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, f"{base_path}/..")
+from utils import utils, project_cache
+import main
+
+"""
+Tests that the API's output for the example projects under data/ is byte-identical whether or not the projects' data is
+kept in memory as compact dtypes (c.f. utils.compact_project_data() and environment variable COMPACT_DTYPES).
+"""
+DATA_ROOT = f"{base_path}/../data"
+
+def get_example_projects() -> list:
+    (prev_data_root, utils.DATA_ROOT) = (utils.DATA_ROOT, DATA_ROOT)
+    try:
+        return utils.get_project_dirs()
+    finally:
+        utils.DATA_ROOT = prev_data_root
+
+def get_queries(project_data) -> list:
+    # Returns (viz, values_to_show, selected_genes, min_score, tile) of each query made against each project
+    genes = project_data['single_gene_expression'].get('all_genes', [])[:3]
+    queries = [(viz, 'means', [], 0, None) for viz in utils.VIZZES]
+    queries += [('cell_cell_interaction_search', values_to_show, [], 0, None) for values_to_show in ['zscores', 'scores']]
+    queries += [('cell_cell_interaction_search', values_to_show, [], 0, (1, 3, 0, 2)) for values_to_show in ['means', 'zscores']]
+    queries += [('cell_cell_interaction_summary', 'means', [], 50, None),
+                ('single_gene_expression', 'means', genes, 0, None)]
+    return queries
+
+@pytest.fixture(scope='module', params=get_example_projects())
+def project(request) -> (dict, dict):
+    # Returns {compact_dtypes: (project_data, file_name2df)} of the example project request.param - parsed, rather than
+    # read from its cache
+    (prev_data_root, prev_cache_root, prev_compact_dtypes) = \
+        (utils.DATA_ROOT, project_cache.CACHE_ROOT, utils.COMPACT_DTYPES)
+    (utils.DATA_ROOT, project_cache.CACHE_ROOT) = (DATA_ROOT, '')
+    try:
+        config = utils.get_project_config(request.param)
+        if not all(os.path.exists(fpath) for fpath in utils.get_project_files(request.param, config)):
+            pytest.skip("Not all files in config.yml of {} exist".format(request.param))
+        compact_dtypes2project = {}
+        for compact_dtypes in [False, True]:
+            utils.COMPACT_DTYPES = compact_dtypes
+            compact_dtypes2project[compact_dtypes] = utils.load_project(request.param, config)
+        yield (request.param, compact_dtypes2project)
+    finally:
+        (utils.DATA_ROOT, project_cache.CACHE_ROOT, utils.COMPACT_DTYPES) = \
+            (prev_data_root, prev_cache_root, prev_compact_dtypes)
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_compact_dtypes_output(project, binary):
+    (dir_name, compact_dtypes2project) = project
+    for (viz, values_to_show, genes, min_score, tile) in get_queries(compact_dtypes2project[False][0]):
+        (body, compact_body) = \
+            [main.get_viz_data_body(binary, project_data, file_name2df, viz, genes, [], [], [], min_score, [], [], [],
+                                    False, values_to_show, None, False, tile, (dir_name, compact_dtypes, binary, tile))
+             for (compact_dtypes, (project_data, file_name2df)) in compact_dtypes2project.items()]
+        assert body == compact_body, (viz, values_to_show, genes, min_score, tile)
+
+def test_get_compact_values():
+    table = {'keys': np.empty(0, dtype=np.uint32), 'values': np.empty(0, dtype=np.float64)}
+    values = np.tile([0.1, 1 / 3, -0.0, 0.0, np.nan, np.inf], 10)
+    compact_values = utils.get_compact_values(values, table)
+    assert compact_values.dtype == np.float32
+    assert utils.restore_values(compact_values, table).tobytes() == values.tobytes()
+    # 0.1 + 1e-12 has the same float32 value as 0.1 above - the values below are not converted
+    for values in [np.tile([0.1, 0.1 + 1e-12], 10), np.tile([0.1 + 1e-12], 10)]:
+        assert utils.get_compact_values(values, table) is values
+    # Values that would add more entries to table than the conversion saves are not converted
+    values = np.arange(10) / 7
+    assert utils.get_compact_values(values, table) is values
+    assert len(table['keys']) == 6
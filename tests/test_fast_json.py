@@ -0,0 +1,51 @@
+import os
+import sys
+import json
+import numpy as np
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+base_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, f"{base_path}/..")
+from utils.fast_json import FastJSONResponse
+
+"""
+Tests of the serialisation of the API's output by FastJSONResponse - against FastAPI's jsonable_encoder() and
+JSONResponse that it replaced. N.B. jsonable_encoder() does not serialise numpy scalars (other than float64) or arrays -
+the output for numpy values is compared with the output of jsonable_encoder() for the Python values they stand for.
+"""
+
+def get_old_json(content):
+    return json.loads(JSONResponse(jsonable_encoder(content)).body)
+
+# (value, the Python value it stands for)
+VALUES = {
+    'set': ({'IL6_IL6R', 'WNT5A_FZD3', 'CD74_MIF', 'A|B'}, None),
+    'frozenset': (frozenset(['celltype_1', 'celltype_2']), None),
+    'set_in_list': ([{'x|y', 'y|x'}, {1, 2, 3}], None),
+    'int64': (np.int64(7), 7),
+    'uint8': (np.uint8(1), 1),
+    'float64': (np.float64(0.123), 0.123),
+    'bool': (np.bool_(True), True),
+    'int_array': (np.array([[0, 1], [1, 0]], dtype=np.uint8), [[0, 1], [1, 0]]),
+    'float_array': (np.array([0.5, 1.25, 3.0]), [0.5, 1.25, 3.0]),
+    'object_array': (np.array(['WNT5A', None, 3, 0.5], dtype=object), ['WNT5A', None, 3, 0.5]),
+    'object_array_of_numpy_scalars': (np.array([np.int64(1), 'x'], dtype=object), [1, 'x']),
+    'empty_array': (np.zeros((0,)), [])}
+
+@pytest.mark.parametrize('name', VALUES.keys())
+def test_fast_json_response(name):
+    (value, python_value) = VALUES[name]
+    content = {'values': value, 'title': 'Project', 'min_value': 0, 'int_keys': {1: 'a'}}
+    python_content = dict(content, values=value if python_value is None else python_value)
+    assert json.loads(FastJSONResponse(content).body) == get_old_json(python_content)
+
+def test_fast_json_response_float32():
+    # float32 values are serialised via their shortest decimal representation
+    values = np.array([0.1, 0.123, 1e-05, 2.5, 123.456], dtype=np.float32)
+    assert json.loads(FastJSONResponse(values).body) == get_old_json([0.1, 0.123, 1e-05, 2.5, 123.456])
+
+def test_fast_json_response_unsupported():
+    with pytest.raises(TypeError):
+        FastJSONResponse({'value': object()})
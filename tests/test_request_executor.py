@@ -0,0 +1,64 @@
+import os
+import sys
+import asyncio
+import threading
+import httpx
+
+base_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, f"{base_path}/..")
+from utils import project_cache
+from utils.request_executor import RequestExecutor
+import main
+
+"""
+Tests of the superseding of earlier /api/data requests by later requests in the same X-Request-Group (c.f.
+RequestExecutor) - including later requests answered from the response cache, which are not run by RequestExecutor.
+"""
+URL = '/api/data/CaseExample3_specificityScoring/cell_cell_interaction_search'
+HEADERS = {'X-Request-Group': 'plot'}
+
+def test_supersede():
+    async def run():
+        executor = RequestExecutor(max_workers=1)
+        (started, release) = (threading.Event(), threading.Event())
+        def block():
+            started.set()
+            release.wait(10)
+            return 'running'
+        running = asyncio.ensure_future(executor.run(None, block))
+        await asyncio.to_thread(started.wait, 10)
+        # The request below waits for the only thread - it is cancelled before it starts
+        queued = asyncio.ensure_future(executor.run('group', lambda: 'queued'))
+        await asyncio.sleep(0.1)
+        executor.supersede('group')
+        release.set()
+        return (await running, await queued, executor.group2future)
+    assert asyncio.run(run()) == ('running', None, {})
+
+def test_cached_response_supersedes_earlier_request(monkeypatch):
+    monkeypatch.setattr(project_cache, 'CACHE_ROOT', '')
+    (started, release) = (threading.Event(), threading.Event())
+    is_blocking = threading.Event()
+    get_viz_data_body = main.get_viz_data_body
+    def get_blocked_viz_data_body(*args):
+        if is_blocking.is_set():
+            started.set()
+            release.wait(10)
+        return get_viz_data_body(*args)
+    monkeypatch.setattr(main, 'get_viz_data_body', get_blocked_viz_data_body)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://test') as client:
+            # The response to the later request is cached already
+            cached = await client.get(URL, params={'values_to_show': 'means'}, headers=HEADERS)
+            assert cached.status_code == 200
+            is_blocking.set()
+            earlier = asyncio.ensure_future(client.get(URL, params={'values_to_show': 'zscores'}, headers=HEADERS))
+            await asyncio.to_thread(started.wait, 10)
+            later = await client.get(URL, params={'values_to_show': 'means'}, headers=HEADERS)
+            release.set()
+            return (later, await earlier)
+    (later, earlier) = asyncio.run(run())
+    assert later.status_code == 200
+    # The front end shows the response to the latest request in the group only
+    assert earlier.status_code == 409
@@ -0,0 +1,23 @@
+import os
+import sys
+
+base_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, f"{base_path}/..")
+from utils.response_cache import HtmlCache
+
+"""
+Tests of the bounding (by the least recently used entries) and invalidation of HtmlCache.
+"""
+
+def test_html_cache():
+    cache = HtmlCache(max_htmls=2)
+    cache.put(('project1', 1, 'A_B'), 'a_b')
+    cache.put(('project2', 1, 'C_D'), 'c_d')
+    # A_B becomes more recently used than C_D - which is then dropped to make room for E_F
+    assert cache.get(('project1', 1, 'A_B')) == 'a_b'
+    cache.put(('project1', 1, 'E_F'), 'e_f')
+    assert list(cache.key2html) == [('project1', 1, 'A_B'), ('project1', 1, 'E_F')]
+    assert cache.get(('project2', 1, 'C_D')) is None
+    cache.put(('project2', 1, 'C_D'), 'c_d')
+    cache.invalidate('project1')
+    assert list(cache.key2html) == [('project2', 1, 'C_D')]
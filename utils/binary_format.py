@@ -0,0 +1,56 @@
+import numpy as np
+from utils import fast_json
+
+"""
+Binary encoding of /api/data responses - requested via format=binary query parameter or via MEDIA_TYPE in the request's
+Accept header. The heatmap matrices (MATRIX_KEYS) are sent as raw numbers rather than as JSON nested lists:
+- bytes 0-3: the length (N) of the JSON header, as a little-endian uint32,
+- bytes 4 - 4+N: the JSON header - the response without its matrices, plus key 'matrices', which maps the key of each
+  matrix to its 'offset' (in bytes, from the start of the response), 'shape' ([number of rows, number of columns])
+  and 'dtype' ('float32' or - for matrices of whole numbers between 0 and 255, e.g. relevant interactions - 'uint8'),
+- followed by the matrices - little-endian values, in row-major order.
+N.B. The header and the matrices are padded so that each matrix starts at a multiple of 4 bytes, e.g. in JavaScript:
+  new Float32Array(buffer, matrix.offset, matrix.shape[0] * matrix.shape[1])
+"""
+MEDIA_TYPE = 'application/x-cellphonedbviz-binary'
+FORMAT = 'binary'
+MATRIX_KEYS = ['values', 'filtered_pvalues', 'filtered_relevant_interactions', 'mean_zscores', 'percents']
+
+def is_requested(format: str, accept: str) -> bool:
+    return format == FORMAT or (accept is not None and MEDIA_TYPE in accept)
+
+def dumps(content: dict) -> bytes:
+    header = dict(content)
+    key2matrix = {}
+    for key in MATRIX_KEYS:
+        if key in header:
+            matrix = np.asarray(header[key], dtype='<f4')
+            if matrix.ndim == 1 and matrix.size == 0:
+                # A matrix without rows, i.e. [] (N.B. the shape of rows without columns, e.g. [[], []], is kept as is)
+                matrix = matrix.reshape(0, 0)
+            if matrix.ndim == 2:
+                # N.B. nan (e.g. null in a matrix of 0's and 1's) is not a whole number - hence not sent as uint8
+                if np.isfinite(matrix).all() and np.array_equal(matrix, matrix.astype(np.uint8)):
+                    matrix = matrix.astype(np.uint8)
+                key2matrix[key] = np.ascontiguousarray(matrix)
+                header.pop(key)
+    # Offsets of the matrices depend on the length of the header - hence the header is serialised with placeholder
+    # offsets first (N.B. the placeholder is at least as long as any actual offset)
+    placeholder = 2 ** 62
+    header['matrices'] = dict([(key, {'offset': placeholder, 'shape': list(matrix.shape), 'dtype': matrix.dtype.name}) \
+                               for (key, matrix) in key2matrix.items()])
+    # N.B. The header is padded with spaces (valid JSON whitespace)
+    header_length = get_padded_length(4 + len(fast_json.dumps(header))) - 4
+    offset = 4 + header_length
+    for (key, matrix) in key2matrix.items():
+        header['matrices'][key]['offset'] = offset
+        offset += get_padded_length(matrix.nbytes)
+    header_bytes = fast_json.dumps(header)
+    chunks = [np.uint32(header_length).astype('<u4').tobytes(), header_bytes.ljust(header_length)]
+    for matrix in key2matrix.values():
+        chunks.append(matrix.tobytes().ljust(get_padded_length(matrix.nbytes), b'\0'))
+    return b''.join(chunks)
+
+def get_padded_length(length: int) -> int:
+    # The smallest multiple of 4 that is >= length
+    return length + (-length % 4)
@@ -0,0 +1,28 @@
+import orjson
+import numpy as np
+from fastapi.responses import JSONResponse
+
+# N.B. OPT_SERIALIZE_NUMPY serialises numpy arrays and scalars natively; OPT_NON_STR_KEYS allows e.g. int dict keys
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+class FastJSONResponse(JSONResponse):
+    """
+    Serialises the API's output (dicts, lists, sets, numpy arrays and scalars) directly via orjson - skipping
+    FastAPI's jsonable_encoder(), which walks every element of the output in Python.
+    """
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=get_jsonable, option=ORJSON_OPTIONS)
+
+def get_jsonable(obj):
+    # Called by orjson for the objects it cannot serialise natively
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, np.ndarray):
+        # E.g. arrays of object dtype
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
@@ -0,0 +1,127 @@
+import os
+import re
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+"""
+Latency histograms of the API's requests, of the stages of filtering their data and of the loading of projects -
+exposed in Prometheus text format via /metrics (c.f. main.py), e.g.
+    cellphonedbviz_stage_seconds_bucket{project="CaseExample1_differentiation",viz="cell_cell_interaction_search",stage="zscores",le="0.1"} 12
+The stages of a request are recorded via StageTimer.lap() (or span()) and labelled with the project and viz of the
+request being handled (c.f. set_labels()). Requests taking longer than SLOW_REQUEST_SECONDS (environment variable; 0 by
+default, which disables the log) are logged with their query parameters and the durations of their stages.
+"""
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 0))
+# The hosts from which /metrics can be retrieved (comma-separated; '*' allows any host) - only local ones by default
+METRICS_ALLOWED_HOSTS = os.environ.get('METRICS_ALLOWED_HOSTS', '127.0.0.1,::1,localhost').split(',')
+# The upper bounds (in seconds) of the histograms' buckets
+BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf')]
+REQUEST_HISTOGRAM = 'cellphonedbviz_request_seconds'
+STAGE_HISTOGRAM = 'cellphonedbviz_stage_seconds'
+LOAD_HISTOGRAM = 'cellphonedbviz_load_seconds'
+HISTOGRAM2HELP = {REQUEST_HISTOGRAM: 'Duration of API requests, by endpoint',
+                  STAGE_HISTOGRAM: 'Duration of the stages of /api/data requests, by project and viz',
+                  LOAD_HISTOGRAM: 'Duration of loading projects, in total and per config key'}
+
+# The labels (e.g. project and viz) added to the stages recorded in the current context
+context_labels = contextvars.ContextVar('context_labels', default={})
+# The (stage, seconds) of the current request - for the slow request log
+context_stages = contextvars.ContextVar('context_stages', default=None)
+lock = threading.Lock()
+# (histogram, labels) -> [bucket counts (non-cumulative), sum, count]
+key2observations = {}
+
+def observe(histogram: str, seconds: float, **labels):
+    key = (histogram, tuple(labels.items()))
+    i = next(i for (i, bound) in enumerate(BUCKETS) if seconds <= bound)
+    with lock:
+        observations = key2observations.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+        observations[0][i] += 1
+        observations[1] += seconds
+        observations[2] += 1
+
+def observe_stage(stage: str, seconds: float, histogram: str = STAGE_HISTOGRAM, **labels):
+    if histogram == STAGE_HISTOGRAM:
+        context = context_labels.get()
+        if not context:
+            # The stages of the functions that handle requests are recorded only when they are called by a request
+            # (rather than e.g. when a project is loaded)
+            return
+        labels = dict(context, **labels)
+    observe(histogram, seconds, **labels, stage=stage)
+    stages = context_stages.get()
+    if stages is not None:
+        # E.g. a project loaded by the request
+        stages.append(("load {}".format(stage) if histogram == LOAD_HISTOGRAM else stage, seconds))
+
+def set_labels(**labels):
+    # Labels the stages recorded in the current context (N.B. including those in threads the context is copied to -
+    # c.f. RequestExecutor.run()). Each request is handled in a context of its own - hence the labels are not reset.
+    context_labels.set(dict(context_labels.get(), **labels))
+
+@contextmanager
+def span(stage: str, histogram: str = STAGE_HISTOGRAM, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, histogram, **labels)
+
+class StageTimer:
+    """
+    Records the consecutive stages of a function - each lap(stage) records the time elapsed since the previous lap
+    (or since the timer was created) as the duration of stage.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        observe_stage(stage, now - self.start)
+        self.start = now
+
+@contextmanager
+def request_stages():
+    # Collects the stages of the request handled within the context
+    stages = []
+    token = context_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        context_stages.reset(token)
+
+def log_if_slow(url: str, seconds: float, stages: list):
+    if SLOW_REQUEST_SECONDS > 0 and seconds >= SLOW_REQUEST_SECONDS:
+        print("\nSlow request ({:.3f}s): {} - stages: {}".format(seconds, url,
+              ", ".join(["{} {:.3f}s".format(stage, stage_seconds) for (stage, stage_seconds) in stages])),
+              flush=True, end="")
+
+def is_allowed_host(host: str) -> bool:
+    return '*' in METRICS_ALLOWED_HOSTS or host in METRICS_ALLOWED_HOSTS
+
+def render() -> str:
+    # Returns the histograms in Prometheus text exposition format
+    lines = []
+    with lock:
+        items = sorted([(key, (list(buckets), total, count)) for (key, (buckets, total, count)) in key2observations.items()])
+    for histogram in HISTOGRAM2HELP:
+        lines += ["# HELP {} {}".format(histogram, HISTOGRAM2HELP[histogram]), "# TYPE {} histogram".format(histogram)]
+        for ((name, labels), (buckets, total, count)) in items:
+            if name != histogram:
+                continue
+            cumulative_count = 0
+            for (bound, bucket_count) in zip(BUCKETS, buckets):
+                cumulative_count += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append("{}_bucket{} {}".format(name, format_labels(labels + (('le', le),)), cumulative_count))
+            lines.append("{}_sum{} {}".format(name, format_labels(labels), repr(total)))
+            lines.append("{}_count{} {}".format(name, format_labels(labels), count))
+    return "\n".join(lines) + "\n"
+
+def format_labels(labels: tuple) -> str:
+    return "{" + ",".join(['{}="{}"'.format(name, escape(str(value))) for (name, value) in labels]) + "}"
+
+def escape(value: str) -> str:
+    return re.sub(r'(["\\])', r'\\\1', value).replace("\n", "\\n")
@@ -0,0 +1,115 @@
+import os
+import json
+import pickle
+import shutil
+import numpy as np
+
+base_path = os.path.dirname(os.path.realpath(__file__))
+# Parsed projects are cached under CACHE_ROOT, one sub-directory per project; set CACHE_ROOT to '' to disable caching
+CACHE_ROOT = os.environ.get('CACHE_ROOT', f"{base_path}/../cache")
+# N.B. Increment CACHE_VERSION whenever the structures built by utils.load_project() change - so that
+# the caches built by the previous version of the code are not used
+CACHE_VERSION = 16
+INDEX_FILE_NAME = 'index.json'
+OBJECTS_FILE_NAME = 'objects.pkl'
+ARRAYS_DIR_NAME = 'arrays'
+# Numeric numpy arrays of at least this size are stored in their own .npy files rather than in the pickle
+MIN_NPY_ARRAY_BYTES = 4096
+# If MMAP_CACHE=1, the cached .npy arrays are memory-mapped (read-only) rather than read into memory - so that multiple
+# processes (e.g. uvicorn workers - c.f. run.sh) loading the same project share a single copy of its arrays
+MMAP_CACHE = os.environ.get('MMAP_CACHE', '0') == '1'
+# If CACHE_READ_ONLY=1, this process never writes the projects' caches - they are (re-)built by another process
+# (c.f. run.sh) and only read here, so that multiple processes do not (re-)write the same cache concurrently
+CACHE_READ_ONLY = os.environ.get('CACHE_READ_ONLY', '0') == '1'
+
+"""
+The cache of a project consists of:
+- index.json - the fingerprint of the source files the project was loaded from,
+- objects.pkl - the pickled (project_data, file_name2df) tuple, except for
+- arrays/*.npy - numeric numpy arrays (incl. the DataFrames' blocks), saved in numpy's binary format.
+The cache is used only if the fingerprint of the source files it was built from is identical to the current one.
+N.B. A cache directory is never modified once written (it is replaced as a whole) - hence its arrays can be memory-mapped.
+"""
+
+def get_fingerprint(fpaths: list, options: dict = None) -> dict:
+    # N.B. options are the settings (if any) that the cached structures depend on
+    files = {}
+    for fpath in fpaths:
+        stat = os.stat(fpath)
+        files[os.path.realpath(fpath)] = [stat.st_size, stat.st_mtime_ns]
+    return {'version': CACHE_VERSION, 'files': files, 'options': options or {}}
+
+def get_cache_dir(dir_name: str, cache_root: str = None) -> str:
+    if cache_root is None:
+        cache_root = CACHE_ROOT
+    if not cache_root:
+        return None
+    return "{}/{}".format(cache_root, dir_name)
+
+def is_up_to_date(cache_dir: str, fingerprint: dict) -> bool:
+    try:
+        with open("{}/{}".format(cache_dir, INDEX_FILE_NAME), 'r') as file:
+            return json.load(file) == fingerprint
+    except (OSError, ValueError):
+        return False
+
+def read(cache_dir: str, fingerprint: dict, mmap: bool = MMAP_CACHE):
+    """
+    Returns the cached object if the cache in cache_dir was built from source files matching fingerprint; None otherwise.
+    If mmap is True, the returned object's numeric arrays are read-only memory-mapped views of the cached .npy files.
+    """
+    if not is_up_to_date(cache_dir, fingerprint):
+        return None
+    try:
+        with open("{}/{}".format(cache_dir, OBJECTS_FILE_NAME), 'rb') as file:
+            return NpyUnpickler(file, "{}/{}".format(cache_dir, ARRAYS_DIR_NAME), mmap).load()
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print("\nIgnoring unreadable cache in {}: {}".format(cache_dir, e), flush=True)
+        return None
+
+def write(cache_dir: str, fingerprint: dict, obj):
+    # Write to a temporary directory first so that a cache is never seen half-written
+    tmp_dir = "{}.tmp{}".format(cache_dir, os.getpid())
+    try:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs("{}/{}".format(tmp_dir, ARRAYS_DIR_NAME))
+        with open("{}/{}".format(tmp_dir, OBJECTS_FILE_NAME), 'wb') as file:
+            NpyPickler(file, "{}/{}".format(tmp_dir, ARRAYS_DIR_NAME)).dump(obj)
+        # The index is written last - a cache without a matching index is never read
+        with open("{}/{}".format(tmp_dir, INDEX_FILE_NAME), 'w') as file:
+            json.dump(fingerprint, file)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(tmp_dir, cache_dir)
+    except OSError as e:
+        print("\nFailed to write cache to {}: {}".format(cache_dir, e), flush=True)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+class NpyPickler(pickle.Pickler):
+    def __init__(self, file, arrays_dir: str):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.arrays_dir = arrays_dir
+        # id(array) -> (array, file name) - so that an array referenced more than once is saved once only
+        self.id2array_file = {}
+
+    def persistent_id(self, obj):
+        if type(obj) is np.ndarray and obj.dtype.kind in 'biufc' and obj.nbytes >= MIN_NPY_ARRAY_BYTES:
+            if id(obj) not in self.id2array_file:
+                file_name = "{}.npy".format(len(self.id2array_file))
+                np.save("{}/{}".format(self.arrays_dir, file_name), obj, allow_pickle=False)
+                self.id2array_file[id(obj)] = (obj, file_name)
+            return self.id2array_file[id(obj)][1]
+        return None
+
+class NpyUnpickler(pickle.Unpickler):
+    def __init__(self, file, arrays_dir: str, mmap: bool = False):
+        super().__init__(file)
+        self.arrays_dir = arrays_dir
+        self.mmap_mode = 'r' if mmap else None
+        self.file_name2array = {}
+
+    def persistent_load(self, file_name):
+        if file_name not in self.file_name2array:
+            self.file_name2array[file_name] = \
+                np.load("{}/{}".format(self.arrays_dir, file_name), mmap_mode=self.mmap_mode, allow_pickle=False)
+        return self.file_name2array[file_name]
@@ -0,0 +1,214 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from utils import utils, project_cache
+
+# Upper bound (in MB) on the memory taken up by all projects loaded at any one time; 0 means no limit.
+# When the limit is exceeded, the least recently used projects are unloaded (they are re-loaded on their next request).
+MAX_PROJECTS_MEMORY_MB = int(os.environ.get('MAX_PROJECTS_MEMORY_MB', 0))
+# If PRELOAD_PROJECTS=1, all projects are loaded at start-up (in parallel - c.f. utils.NUM_LOADING_PROCESSES)
+PRELOAD_PROJECTS = os.environ.get('PRELOAD_PROJECTS', '0') == '1'
+# If HOT_RELOAD_INTERVAL > 0, utils.DATA_ROOT is scanned every HOT_RELOAD_INTERVAL seconds for projects that were added,
+# changed or removed since the previous scan - c.f. ProjectRegistry.scan()
+HOT_RELOAD_INTERVAL = float(os.environ.get('HOT_RELOAD_INTERVAL', 0))
+
+class ProjectRegistry:
+    """
+    Knows of all projects under utils.DATA_ROOT (via their config.yml files) but loads each project's data
+    only when it is first requested, keeping an LRU of loaded projects within MAX_PROJECTS_MEMORY_MB.
+    """
+    def __init__(self, max_memory_mb: int = MAX_PROJECTS_MEMORY_MB, preload: bool = PRELOAD_PROJECTS,
+                 hot_reload_interval: float = HOT_RELOAD_INTERVAL):
+        self.max_memory = max_memory_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        self.dir_name2config = {}
+        # dir_name -> the sizes and modification times of the project's files when its config was read - c.f. scan()
+        self.dir_name2fingerprint = {}
+        self.dir_name2load_lock = {}
+        # dir_name -> (project_data, file_name2df, memory_usage, generation), in least to most recently used order
+        self.loaded_projects = OrderedDict()
+        # Incremented each time a project is loaded - so that data derived from a project's previous load can be told apart
+        self.generation = 0
+        # Functions called with dir_name whenever that project is loaded or unloaded, e.g. to invalidate caches
+        self.listeners = []
+        self.load_configs()
+        if preload:
+            self.preload()
+        if hot_reload_interval > 0:
+            threading.Thread(target=self.watch, args=(hot_reload_interval,), daemon=True).start()
+
+    def load_configs(self):
+        dir_name2config = {}
+        dir_name2fingerprint = {}
+        for dir_name in utils.get_project_dirs():
+            dir_name2config[dir_name] = utils.get_project_config(dir_name)
+            dir_name2fingerprint[dir_name] = get_project_fingerprint(dir_name, dir_name2config[dir_name])
+        with self.lock:
+            self.dir_name2config = dir_name2config
+            self.dir_name2fingerprint = dir_name2fingerprint
+            for dir_name in dir_name2config:
+                self.dir_name2load_lock.setdefault(dir_name, threading.Lock())
+
+    def watch(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.scan()
+            except Exception as e:
+                print("\nFailed to scan projects for changes: {}".format(e), flush=True)
+
+    def scan(self):
+        """
+        (Re-)loads the projects added or changed (i.e. their config.yml or any of the files it refers to) and unloads
+        the projects removed since the previous scan. A changed project is re-loaded only if it is currently loaded -
+        while it is being re-loaded, requests are still served from its previous data, which is then swapped for
+        the new data in one go. Projects that have not changed are not affected.
+        """
+        dir_names = utils.get_project_dirs()
+        for dir_name in sorted(set(self.dir_name2config) - set(dir_names)):
+            self.remove(dir_name)
+        for dir_name in sorted(dir_names):
+            config = self.dir_name2config.get(dir_name)
+            if config is not None and get_project_fingerprint(dir_name, config) == self.dir_name2fingerprint[dir_name]:
+                continue
+            try:
+                config = utils.get_project_config(dir_name)
+                fingerprint = get_project_fingerprint(dir_name, config)
+            except Exception as e:
+                # E.g. config.yml is still being copied into dir_name
+                print("\nIgnoring project: {} until its config.yml is valid: {}".format(dir_name, e), flush=True)
+                continue
+            if fingerprint is None:
+                print("\nIgnoring project: {} until all files in its config.yml exist".format(dir_name), flush=True)
+                continue
+            self.reload(dir_name, config, fingerprint)
+
+    def reload(self, dir_name: str, config: dict, fingerprint: dict):
+        with self.lock:
+            is_new = dir_name not in self.dir_name2config
+            load_lock = self.dir_name2load_lock.setdefault(dir_name, threading.Lock())
+        # N.B. load_lock ensures that the project is not being loaded (with its previous config) by a request meanwhile
+        with load_lock:
+            with self.lock:
+                is_loaded = dir_name in self.loaded_projects
+            if is_loaded and project_cache.CACHE_READ_ONLY and not utils.is_project_cache_up_to_date(dir_name, config):
+                # The project's cache is yet to be re-built by another process (c.f. utils.watch_project_caches()) -
+                # its re-loading is re-tried on the next scan, rather than each process re-parsing the project itself
+                return
+            if is_loaded:
+                try:
+                    project_data, file_name2df = utils.load_project(dir_name, config)
+                except Exception as e:
+                    # The project's previous data is kept - and its re-loading is re-tried on the next scan
+                    print("\nFailed to re-load project: {}: {}".format(dir_name, e), flush=True)
+                    return
+                memory_usage = utils.get_memory_usage((project_data, file_name2df))
+            with self.lock:
+                self.dir_name2config[dir_name] = config
+                self.dir_name2fingerprint[dir_name] = fingerprint
+                if is_loaded:
+                    self.add(dir_name, project_data, file_name2df, memory_usage)
+        print("\n{} project: {}".format("Added" if is_new else "Reloaded", dir_name), flush=True)
+
+    def remove(self, dir_name: str):
+        with self.lock:
+            load_lock = self.dir_name2load_lock[dir_name]
+        with load_lock:
+            with self.lock:
+                self.dir_name2config.pop(dir_name)
+                self.dir_name2fingerprint.pop(dir_name)
+                if dir_name in self.loaded_projects:
+                    self.loaded_projects.pop(dir_name)
+                    self.notify(dir_name)
+        print("\nRemoved project: {}".format(dir_name), flush=True)
+
+    def preload(self):
+        (dir_name2project_data, dir_name2file_name2df) = utils.get_projects()
+        with self.lock:
+            for dir_name, project_data in dir_name2project_data.items():
+                file_name2df = dir_name2file_name2df[dir_name]
+                memory_usage = utils.get_memory_usage((project_data, file_name2df))
+                self.add(dir_name, project_data, file_name2df, memory_usage)
+
+    def __contains__(self, dir_name: str) -> bool:
+        return dir_name in self.dir_name2config
+
+    def get_config(self, dir_name: str) -> dict:
+        return self.dir_name2config[dir_name]
+
+    def get_titles(self) -> dict:
+        # N.B. self.lock - as projects may be added or removed meanwhile (c.f. scan())
+        with self.lock:
+            return {dir_name: config['title'] for dir_name, config in self.dir_name2config.items()}
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, dir_name: str):
+        for listener in self.listeners:
+            listener(dir_name)
+
+    def get(self, dir_name: str) -> (dict, dict):
+        """
+        Returns (project_data, file_name2df) for dir_name, loading the project first if it is not already loaded.
+        """
+        return self.get_with_generation(dir_name)[0:2]
+
+    def get_with_generation(self, dir_name: str) -> (dict, dict, int):
+        """
+        As get(), but also returns the generation of the project's data - different each time the project is loaded.
+        """
+        config = self.get_config(dir_name)
+        with self.lock:
+            if dir_name in self.loaded_projects:
+                self.loaded_projects.move_to_end(dir_name)
+                return self.get_loaded(dir_name)
+            load_lock = self.dir_name2load_lock[dir_name]
+        # Requests for different projects may load them concurrently, but each project is loaded once only
+        with load_lock:
+            with self.lock:
+                if dir_name in self.loaded_projects:
+                    self.loaded_projects.move_to_end(dir_name)
+                    return self.get_loaded(dir_name)
+            project_data, file_name2df = utils.load_project(dir_name, config)
+            memory_usage = utils.get_memory_usage((project_data, file_name2df))
+            print("\nLoaded project: {} ({:.1f} MB)".format(dir_name, memory_usage / 1024 / 1024), flush=True)
+            with self.lock:
+                self.add(dir_name, project_data, file_name2df, memory_usage)
+                return self.get_loaded(dir_name)
+
+    def get_loaded(self, dir_name: str) -> (dict, dict, int):
+        # N.B. The caller holds self.lock
+        (project_data, file_name2df, _, generation) = self.loaded_projects[dir_name]
+        return (project_data, file_name2df, generation)
+
+    def add(self, dir_name: str, project_data: dict, file_name2df: dict, memory_usage: int):
+        # N.B. The caller holds self.lock
+        self.generation += 1
+        self.loaded_projects[dir_name] = (project_data, file_name2df, memory_usage, self.generation)
+        self.notify(dir_name)
+        self.evict(keep=dir_name)
+
+    def get_memory_usage(self) -> int:
+        return sum(memory_usage for (_, _, memory_usage, _) in self.loaded_projects.values())
+
+    def evict(self, keep: str):
+        # N.B. The caller holds self.lock
+        if not self.max_memory:
+            return
+        while self.get_memory_usage() > self.max_memory and len(self.loaded_projects) > 1:
+            dir_name = next(iter(self.loaded_projects))
+            if dir_name == keep:
+                break
+            self.loaded_projects.pop(dir_name)
+            self.notify(dir_name)
+            print("\nUnloaded least recently used project: {}".format(dir_name), flush=True)
+
+def get_project_fingerprint(dir_name: str, config: dict) -> dict:
+    # Returns the sizes and modification times of the project's config.yml and of all the files it refers to,
+    # or None if any of these files does not exist
+    try:
+        return project_cache.get_fingerprint(utils.get_project_files(dir_name, config))
+    except OSError:
+        return None
@@ -0,0 +1,69 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from utils import metrics
+
+# The maximum number of /api/data requests that are filtered at the same time - the remaining ones wait in a queue
+MAX_FILTER_THREADS = int(os.environ.get('MAX_FILTER_THREADS', min(4, os.cpu_count() or 1)))
+
+class RequestExecutor:
+    """
+    Runs the filtering of /api/data requests in a bounded pool of threads - so that it does not take up the threads
+    in which the web server runs its lightweight endpoints (e.g. /list, /title, /validate).
+    N.B. Threads (rather than processes) are used as they share the projects' data loaded in memory.
+    A request can be assigned to a group (e.g. one per browser page and plot) - each request then supersedes the
+    earlier request in its group: if the earlier request is still queued, it is cancelled; if it is being filtered, its
+    result is not returned (but it is still cached by the function the request runs - c.f. main.py)
+    """
+    def __init__(self, max_workers: int = MAX_FILTER_THREADS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='filter')
+        self.lock = threading.Lock()
+        # group -> the future of the latest request in that group
+        self.group2future = {}
+
+    async def run(self, group: str, fn, *args):
+        # Returns the result of fn(*args), or None if the request was superseded by a later request in group
+        submitted = time.perf_counter()
+        def run_fn():
+            metrics.observe_stage('wait_for_filter_thread', time.perf_counter() - submitted)
+            return fn(*args)
+        # N.B. fn is run in a copy of the request's context - so that e.g. its metrics are labelled with the request's
+        # project and viz (c.f. metrics.set_labels())
+        future = self.executor.submit(contextvars.copy_context().run, run_fn)
+        if group is None:
+            return await asyncio.wrap_future(future)
+        with self.lock:
+            earlier_future = self.group2future.get(group)
+            self.group2future[group] = future
+        if earlier_future is not None:
+            # Succeeds only if the earlier request has not started yet
+            earlier_future.cancel()
+        try:
+            ret = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            with self.lock:
+                is_superseded = self.group2future.get(group) is not future
+            if future.cancelled() and is_superseded:
+                return None
+            raise
+        finally:
+            # N.B. The request is removed from its group also if fn raised (unless a later request has replaced it)
+            with self.lock:
+                is_superseded = self.group2future.get(group) is not future
+                if not is_superseded:
+                    del self.group2future[group]
+        return None if is_superseded else ret
+
+    def supersede(self, group: str):
+        # Supersedes the request in group (if any) without running a new one - e.g. when a later request in group is
+        # answered from a cache
+        if group is None:
+            return
+        with self.lock:
+            future = self.group2future.pop(group, None)
+        if future is not None:
+            # Succeeds only if the request has not started yet
+            future.cancel()
@@ -0,0 +1,125 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Upper bound (in MB) on the total size of the /api/data responses kept in memory; 0 disables the cache
+# (ETag headers are still sent - so that browsers can re-validate the responses they already have)
+RESPONSE_CACHE_MB = int(os.environ.get('RESPONSE_CACHE_MB', 256))
+# The number of selections made for the tiles of cell_cell_interaction_search matrices kept in memory - c.f. SelectionCache
+TILE_SELECTION_CACHE_SIZE = int(os.environ.get('TILE_SELECTION_CACHE_SIZE', 64))
+# The number of interacting pairs' sidenav html kept in memory - c.f. HtmlCache
+PROPERTIES_HTML_CACHE_SIZE = int(os.environ.get('PROPERTIES_HTML_CACHE_SIZE', 1024))
+
+class ResponseCache:
+    """
+    LRU cache of serialised /api/data responses, keyed on (project, generation, viz, normalised query parameters),
+    where generation is incremented by ProjectRegistry each time the project is loaded. The responses of a project are
+    dropped whenever that project is (re-)loaded or unloaded - c.f. invalidate()
+    """
+    def __init__(self, max_size_mb: int = RESPONSE_CACHE_MB):
+        self.max_size = max_size_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        # key -> (etag, body), in least to most recently used order
+        self.key2response = OrderedDict()
+        self.size = 0
+
+    def get(self, key: tuple) -> (str, bytes):
+        with self.lock:
+            if key not in self.key2response:
+                return None
+            self.key2response.move_to_end(key)
+            return self.key2response[key]
+
+    def put(self, key: tuple, body: bytes) -> (str, bytes):
+        response = (get_etag(body), body)
+        if len(body) > self.max_size:
+            return response
+        with self.lock:
+            if key in self.key2response:
+                self.size -= len(self.key2response.pop(key)[1])
+            self.key2response[key] = response
+            self.size += len(body)
+            while self.size > self.max_size:
+                (_, (_, lru_body)) = self.key2response.popitem(last=False)
+                self.size -= len(lru_body)
+        return response
+
+    def invalidate(self, dir_name: str):
+        with self.lock:
+            for key in [key for key in self.key2response if key[0] == dir_name]:
+                self.size -= len(self.key2response.pop(key)[1])
+
+class SelectionCache:
+    """
+    LRU cache of the (ordered) selections of interacting pairs and cell type pairs made for the tiles of
+    cell_cell_interaction_search matrices (c.f. utils.filter_interactions_for_cci_search()), keyed like ResponseCache
+    but regardless of the tile and format - so that the selection is made once for all tiles of the same matrix.
+    The selections of a project are dropped whenever that project is (re-)loaded or unloaded - c.f. invalidate()
+    """
+    def __init__(self, max_selections: int = TILE_SELECTION_CACHE_SIZE):
+        self.max_selections = max_selections
+        self.lock = threading.Lock()
+        # key -> selection, in least to most recently used order
+        self.key2selection = OrderedDict()
+
+    def get(self, key: tuple) -> dict:
+        with self.lock:
+            if key not in self.key2selection:
+                return None
+            self.key2selection.move_to_end(key)
+            return self.key2selection[key]
+
+    def put(self, key: tuple, selection: dict):
+        # N.B. selection must not be modified once put
+        with self.lock:
+            self.key2selection[key] = selection
+            self.key2selection.move_to_end(key)
+            while len(self.key2selection) > self.max_selections:
+                self.key2selection.popitem(last=False)
+
+    def invalidate(self, dir_name: str):
+        with self.lock:
+            for key in [key for key in self.key2selection if key[0] == dir_name]:
+                self.key2selection.pop(key)
+
+class HtmlCache:
+    """
+    LRU cache of the sidenav html of interacting pairs (c.f. utils.get_properties_html()), keyed on (project, generation,
+    interacting pair) - kept apart from the project's data, which is read-only once loaded. The html of a project is
+    dropped whenever that project is (re-)loaded or unloaded - c.f. invalidate()
+    """
+    def __init__(self, max_htmls: int = PROPERTIES_HTML_CACHE_SIZE):
+        self.max_htmls = max_htmls
+        self.lock = threading.Lock()
+        # key -> html, in least to most recently used order
+        self.key2html = OrderedDict()
+
+    def get(self, key: tuple) -> str:
+        with self.lock:
+            if key not in self.key2html:
+                return None
+            self.key2html.move_to_end(key)
+            return self.key2html[key]
+
+    def put(self, key: tuple, html: str):
+        with self.lock:
+            self.key2html[key] = html
+            self.key2html.move_to_end(key)
+            while len(self.key2html) > self.max_htmls:
+                self.key2html.popitem(last=False)
+
+    def invalidate(self, dir_name: str):
+        with self.lock:
+            for key in [key for key in self.key2html if key[0] == dir_name]:
+                self.key2html.pop(key)
+
+def get_etag(body: bytes) -> str:
+    return '"{}"'.format(hashlib.blake2b(body, digest_size=16).hexdigest())
+
+def is_not_modified(if_none_match: str, etag: str) -> bool:
+    # if_none_match is the value of the request's If-None-Match header, e.g. '"etag1", W/"etag2"' or '*'
+    if not if_none_match:
+        return False
+    etags = [val.strip() for val in if_none_match.split(",")]
+    return '*' in etags or etag in etags or "W/{}".format(etag) in etags
@@ -1,13 +1,19 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
-from scipy import stats
+from scipy import stats, sparse
 import yaml
 import re
 from collections import OrderedDict
+from bisect import bisect_left
 import secrets
+import time
+import resource
 from cellphonedb.utils import db_utils, search_utils
-import copy
+from utils import project_cache, metrics
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 base_path = os.path.dirname(os.path.realpath(__file__))
 DATA_ROOT = f"{base_path}/../data"
@@ -21,46 +27,380 @@ MAX_NUM_STACKS_IN_SANKEY_PLOTS = 6
 SIDENAV_PROPERTY_STYLE = "style=\"padding-left: 60px; font-size: 14px; margin: 20px 0px !important; \""
 CELLTYPE_COMPOSITION_SANKEY_EDGE_WEIGHT = 1
 INDENT="     "
+# The number of worker processes used by get_projects() to load projects in parallel
+NUM_LOADING_PROCESSES = int(os.environ.get('NUM_LOADING_PROCESSES', os.cpu_count() or 1))
+# If COMPACT_DTYPES=1, the data kept in memory for filtering is stored in compact dtypes - c.f. compact_project_data()
+COMPACT_DTYPES = os.environ.get('COMPACT_DTYPES', '0') == '1'
+
+# CellphoneDB's interaction files (means, pvalues etc.) consist of metadata columns followed by a column per cell type
+# pair. Only the metadata columns below are read from them (the others, e.g. partner_a or rank, are not used).
+INTERACTION_METADATA_COLUMNS = ['id_cp_interaction', 'interacting_pair', 'secreted', 'receptor_a', 'receptor_b',
+                                'is_integrin', 'classification', 'modality']
+INTERACTION_FILE_KEYS = ['analysis_means', 'relevant_interactions', 'interaction_scores', 'pvalues']
 
 TOP_N = 3
+MAX_INTERACTION_SCORE = 100
+# The number of cell type pairs whose means are processed at a time in preselect_interacting_pairs()
+PRESELECTION_CHUNK_SIZE = 128
+# The number of cell type pairs with the highest means ranked for each interacting pair when a project is loaded - c.f.
+# get_means_ranking()
+PRESELECTION_RANKING_SIZE = 32
+# The number of cell type pairs whose values are converted at a time in get_sparse_matrix()
+SPARSE_MATRIX_CHUNK_SIZE = 256
+# Autocomplete fields (c.f. /autocomplete/{project}/{field}) -> the cci_search dict keys of their vocabularies
+AUTOCOMPLETE_FIELD2KEY = {'genes': 'all_genes', 'interacting_pairs': 'all_interacting_pairs',
+                          'cell_type_pairs': 'all_cell_type_pairs'}
+AUTOCOMPLETE_LIMIT = 10
+# The maximum number of values returned by autocomplete() - whatever the limit requested
+AUTOCOMPLETE_MAX_LIMIT = 50
+# The lengths of the gene name prefixes of gene families (e.g. WNT*) - c.f. get_gene_families()
+GENE_FAMILY_PREFIX_LENGTHS = [3, 4]
+# Words within a vocabulary value start after any of the characters below, e.g. FZD3 in WNT5A_FZD3
+AUTOCOMPLETE_WORD_SEPARATOR = re.compile(r"[_| ]")
+# Keys in cci_search and cci_summary dicts that are used for filtering only - c.f. remove_server_side_data()
+SERVER_SIDE_ONLY_KEYS = ['analysis_means', 'cellphonedb', 'relevant_interactions', 'pvalues', \
+                         'interacting_pair2index', 'index2interacting_pair', 'cell_type_pair2index', 'cci_summary_index',
+                         'gene_index', 'analysis_means_row2index', 'analysis_means_ranking', 'autocomplete_index',
+                         'gene_expression', 'cell_type_pair_index', 'compact_values_table',
+                         # The vocabularies below are searched via autocomplete() rather than shipped to the front end
+                         'all_genes', 'all_interacting_pairs', 'all_cell_type_pairs']
 
-def get_projects() -> dict:
+def get_projects(num_processes: int = NUM_LOADING_PROCESSES) -> dict:
     dir_name2project_data = {}
     dir_name2file_name2df = {}
-    project_dirs = None
+    dir_names = get_project_dirs()
+    cache_root = project_cache.CACHE_ROOT
+    with tempfile.TemporaryDirectory() as tmp_cache_root:
+        if num_processes > 1 and len(dir_names) > 1:
+            # Projects are parsed in parallel by worker processes, each of which writes the parsed project into
+            # the project's cache; the projects are then loaded from their caches below. If caching is disabled,
+            # a temporary cache is used to pass the parsed projects from the worker processes.
+            if not cache_root:
+                cache_root = tmp_cache_root
+            build_project_caches(dir_names, num_processes, cache_root)
+        for dir_name in dir_names:
+            (dir_name2project_data[dir_name], dir_name2file_name2df[dir_name]) = \
+                load_project(dir_name, cache_root = cache_root)
+    return (dir_name2project_data, dir_name2file_name2df)
+
+def build_all_project_caches(num_processes: int = NUM_LOADING_PROCESSES):
+    # (Re-)builds the caches of all projects that are not up-to-date - e.g. before starting multiple uvicorn workers,
+    # which then memory-map the cached arrays rather than each parsing the projects themselves (c.f. run.sh)
+    dir_names = []
+    for dir_name in get_project_dirs():
+        try:
+            config = get_project_config(dir_name)
+            fingerprint = get_project_cache_fingerprint(dir_name, config)
+        except Exception as e:
+            # E.g. the project's files are still being copied into dir_name
+            print("\nIgnoring project: {} until all files in its config.yml exist: {}".format(dir_name, e), flush=True)
+            continue
+        if not project_cache.is_up_to_date(project_cache.get_cache_dir(dir_name), fingerprint):
+            dir_names.append(dir_name)
+    if dir_names and project_cache.CACHE_ROOT:
+        build_project_caches(dir_names, num_processes)
+
+def watch_project_caches(interval: float, num_processes: int = NUM_LOADING_PROCESSES):
+    # Re-builds every interval seconds the caches of the projects added or changed since - so that uvicorn workers
+    # started with CACHE_READ_ONLY=1 pick up the changed projects from their caches (c.f. run.sh)
+    while True:
+        time.sleep(interval)
+        try:
+            build_all_project_caches(num_processes)
+        except Exception as e:
+            print("\nFailed to re-build project caches: {}".format(e), flush=True)
+
+def build_project_caches(dir_names: list, num_processes: int, cache_root: str = None):
+    with ProcessPoolExecutor(max_workers = min(num_processes, len(dir_names))) as executor:
+        # N.B. list() re-raises in this process any exception raised in a worker process
+        list(executor.map(build_project_cache, dir_names, [cache_root] * len(dir_names)))
+
+def build_project_cache(dir_name: str, cache_root: str = None):
+    # Parses project dir_name into its cache - unless that cache is already up-to-date
+    config = get_project_config(dir_name)
+    cache_dir = project_cache.get_cache_dir(dir_name, cache_root)
+    fingerprint = get_project_cache_fingerprint(dir_name, config)
+    if not project_cache.is_up_to_date(cache_dir, fingerprint):
+        project_cache.write(cache_dir, fingerprint, parse_project(dir_name, config))
+
+def get_project_cache_fingerprint(dir_name: str, config: dict) -> dict:
+    return project_cache.get_fingerprint(get_project_files(dir_name, config), {'compact_dtypes': COMPACT_DTYPES})
+
+def is_project_cache_up_to_date(dir_name: str, config: dict = None, cache_root: str = None) -> bool:
+    try:
+        if config is None:
+            config = get_project_config(dir_name)
+        fingerprint = get_project_cache_fingerprint(dir_name, config)
+    except Exception:
+        # E.g. the project's files are still being copied into dir_name
+        return False
+    cache_dir = project_cache.get_cache_dir(dir_name, cache_root)
+    return cache_dir is not None and project_cache.is_up_to_date(cache_dir, fingerprint)
+
+def get_project_dirs() -> list:
+    # Each sub-directory of DATA_ROOT is a project
     for root, dirs, files in os.walk(DATA_ROOT):
-        if not project_dirs:
-            project_dirs = dirs
+        return dirs
+    return []
+
+def get_project_config(dir_name: str) -> dict:
+    with open('{}/{}/config.yml'.format(DATA_ROOT, dir_name), 'r') as file:
+        return yaml.safe_load(file)
+
+def get_project_files(dir_name: str, config: dict) -> list:
+    # Returns the paths of config.yml and of all the files it refers to
+    root = "{}/{}".format(DATA_ROOT, dir_name)
+    fpaths = ['{}/config.yml'.format(root)]
+    for key in CONFIG_KEYS[3:]:
+        if key in config and key != 'hash':
+            fpaths.append("{}/{}".format(root, config[key]))
+    return fpaths
+
+def load_project(dir_name: str, config: dict = None, cache_root: str = None) -> (dict, dict):
+    """
+    Returns (project_data, file_name2df) for project dir_name - from the project's cache if it is up-to-date with the
+    project's files; otherwise the project is parsed from its files and its cache is (re-)built.
+    """
+    with metrics.span('total', metrics.LOAD_HISTOGRAM, project=dir_name):
+        if config is None:
+            config = get_project_config(dir_name)
+        cache_dir = project_cache.get_cache_dir(dir_name, cache_root)
+        if cache_dir is None:
+            return parse_project(dir_name, config)
+        fingerprint = get_project_cache_fingerprint(dir_name, config)
+        with metrics.span('read_cache', metrics.LOAD_HISTOGRAM, project=dir_name):
+            ret = project_cache.read(cache_dir, fingerprint)
+        if ret is None:
+            ret = parse_project(dir_name, config)
+            if not project_cache.CACHE_READ_ONLY:
+                with metrics.span('write_cache', metrics.LOAD_HISTOGRAM, project=dir_name):
+                    project_cache.write(cache_dir, fingerprint, ret)
         else:
-            dir_name = root.split("/")[-1]
-            if dir_name in project_dirs:
-                dict = {}
-                dir_name2file_name2df[dir_name] = {}
-                print("\nLoading project: {}".format(dir_name), flush=True, end="")
-                with open('{}/config.yml'.format(root), 'r') as file:
-                    config = yaml.safe_load(file)
-                    dict['title'] = config['title']
-                    for key in CONFIG_KEYS[3:]:
-                        if key in config:
-                            if key not in ['hash', 'cellphonedb']:
-                                print("\n{}Loading {} for project: {}".format(INDENT, key, dir_name), flush=True, end="")
-                                fpath = "{}/{}".format(root, config[key])
-                                df = pd.read_csv(fpath, sep='\t', low_memory=False)
-                                populate_data4viz(key, dict, df, config['separator'], dir_name2file_name2df[dir_name])
-                            elif key == 'hash':
-                                dict[key] = config[key]
-                            elif key == 'cellphonedb':
-                                fpath = "{}/{}".format(root, config[key])
-                                protein2Info, complex2Info, resource2Complex2Acc, proteinAcc2Name = \
-                                    db_utils.get_protein_and_complex_data_for_web(fpath)
-                                dict['cell_cell_interaction_search'][key] = {'protein2Info': protein2Info,
-                                             'complex2Info': complex2Info,
-                                             'resource2Complex2Acc': resource2Complex2Acc,
-                                             'proteinAcc2Name': proteinAcc2Name}
-                    dict['cell_cell_interaction_summary']['separator'] = config['separator']
-                    dict['cell_cell_interaction_search']['separator'] = config['separator']
-                    dir_name2project_data[dir_name] = dict
-    return (dir_name2project_data, dir_name2file_name2df)
+            print("\nLoaded project: {} from cache".format(dir_name), flush=True, end="")
+        return ret
+
+def parse_project(dir_name: str, config: dict) -> (dict, dict):
+    root = "{}/{}".format(DATA_ROOT, dir_name)
+    dict = {}
+    file_name2df = {}
+    print("\nLoading project: {}".format(dir_name), flush=True, end="")
+    # N.B. The peak memory of parsing the project is measured from the process' memory at this point (if supported) -
+    # rather than as the peak of the process so far, which may be e.g. that of parsing a larger project earlier
+    is_peak_memory_reset = reset_peak_memory_usage()
+    memory_before = get_process_memory_usage()[0]
+    dict['title'] = config['title']
+    for key in CONFIG_KEYS[3:]:
+        if key in config:
+            if key not in ['hash', 'cellphonedb']:
+                print("\n{}Loading {} for project: {}".format(INDENT, key, dir_name), flush=True, end="")
+                fpath = "{}/{}".format(root, config[key])
+                # N.B. Parsing a project (in this process) records the time taken by each of its files
+                with metrics.span(key, metrics.LOAD_HISTOGRAM, project=dir_name):
+                    df = read_project_file(fpath, key, config['separator'])
+                    populate_data4viz(key, dict, df, config['separator'], file_name2df)
+            elif key == 'hash':
+                dict[key] = config[key]
+            elif key == 'cellphonedb':
+                fpath = "{}/{}".format(root, config[key])
+                protein2Info, complex2Info, resource2Complex2Acc, proteinAcc2Name = \
+                    db_utils.get_protein_and_complex_data_for_web(fpath)
+                dict['cell_cell_interaction_search'][key] = {'protein2Info': protein2Info,
+                             'complex2Info': complex2Info,
+                             'resource2Complex2Acc': resource2Complex2Acc,
+                             'proteinAcc2Name': proteinAcc2Name}
+    dict['cell_cell_interaction_summary']['separator'] = config['separator']
+    dict['cell_cell_interaction_search']['separator'] = config['separator']
+    with metrics.span('cci_summary_index', metrics.LOAD_HISTOGRAM, project=dir_name):
+        populate_cci_summary_index(dict, file_name2df, config)
+    with metrics.span('autocomplete_index', metrics.LOAD_HISTOGRAM, project=dir_name):
+        populate_autocomplete_index(dict)
+    # relevant_interactions DataFrame is needed only for building cci_summary_index, and deconvoluted_result and
+    # deconvoluted_percents DataFrames only for building gene_index and gene_expression
+    for key in ['relevant_interactions', 'deconvoluted_result', 'deconvoluted_percents']:
+        file_name2df.pop(key, None)
+    if COMPACT_DTYPES:
+        compact_project_data(dir_name, dict, file_name2df)
+    peak_memory = get_process_memory_usage()[1]
+    if is_peak_memory_reset:
+        print("\nParsed project: {} - peak memory of the process while parsing: {:.1f} MB ({:.1f} MB before parsing)"\
+              .format(dir_name, peak_memory / 1024 / 1024, memory_before / 1024 / 1024), flush=True, end="")
+    else:
+        print("\nParsed project: {} - peak memory of the process so far: {:.1f} MB".format(dir_name, \
+              peak_memory / 1024 / 1024), flush=True, end="")
+    return (dict, file_name2df)
+
+def read_project_file(fpath: str, key: str, separator: str) -> pd.DataFrame:
+    # Reads the project file of config key - only the columns of CellphoneDB's interaction files that are used, c.f.
+    # INTERACTION_METADATA_COLUMNS
+    if key not in INTERACTION_FILE_KEYS:
+        return pd.read_csv(fpath, sep='\t', low_memory=False)
+    # N.B. The header is read directly - pd.read_csv(nrows=0) is slow for files with many columns
+    with open(fpath, 'r') as file:
+        columns = file.readline().rstrip('\r\n').split('\t')
+    # As in get_cell_type_pairs(), the cell type pair columns start at the first column containing separator
+    first_cell_type_pair = next((i for (i, col) in enumerate(columns) if separator in col), len(columns))
+    usecols = [col for col in columns[0:first_cell_type_pair] if col in INTERACTION_METADATA_COLUMNS] + \
+              columns[first_cell_type_pair:]
+    try:
+        return pd.read_csv(fpath, sep='\t', usecols=usecols, low_memory=False)
+    except ValueError:
+        # The header could not be split as above, e.g. quoted column names - read all the columns
+        return pd.read_csv(fpath, sep='\t', low_memory=False)
+
+def reset_peak_memory_usage() -> bool:
+    # Resets the peak resident memory of this process to its current resident memory (Linux only - c.f. clear_refs in
+    # man 5 proc); returns False if the peak could not be reset
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+def get_process_memory_usage() -> (int, int):
+    # Returns (resident memory, peak resident memory) of this process in bytes - the peak since the last
+    # reset_peak_memory_usage(), if any (N.B. memory is None if /proc/self/status is not available, e.g. on macOS)
+    try:
+        key2kb = {}
+        with open('/proc/self/status', 'r') as file:
+            for line in file:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    key2kb[line.split(':')[0]] = int(line.split()[1])
+        return (key2kb['VmRSS'] * 1024, key2kb['VmHWM'] * 1024)
+    except (OSError, KeyError, ValueError):
+        # N.B. ru_maxrss is in kilobytes on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return (None, peak if sys.platform == 'darwin' else peak * 1024)
+
+def compact_project_data(dir_name: str, project_data: dict, file_name2df: dict):
+    """
+    Converts (in place) the project's data kept in memory for filtering to compact dtypes:
+    - float64 columns of DataFrames, float64 values of sparse matrices and gene expression matrices (c.f.
+    get_gene_expression()) to float32 - provided that each value can be restored exactly from its float32 counterpart
+    via the project's compact_values_table, c.f. get_compact_values(),
+    - integer values of sparse matrices (e.g. relevant_interactions of DEG analysis) to uint8 - if they are all 0 or 1,
+    - text columns of DataFrames to categoricals - sharing the categories of same-named columns across DataFrames.
+    N.B. The values are restored to their original dtypes before they are returned by the API - so that
+    the API's output is unchanged.
+    """
+    memory_usage = get_memory_usage((project_data, file_name2df))
+    dict_cci_search = project_data['cell_cell_interaction_search']
+    # The float64 value of each float32 value in the project's compacted data - c.f. restore_values()
+    dict_cci_search['compact_values_table'] = table = \
+        {'keys': np.empty(0, dtype=np.uint32), 'values': np.empty(0, dtype=np.float64)}
+    dfs = list(file_name2df.items()) + [('analysis_means_index', dict_cci_search['analysis_means'])]
+    col2categories = {}
+    for (_, df) in dfs:
+        for col in df.columns[df.dtypes == object]:
+            col2categories.setdefault(col, []).append(df[col].dropna().unique())
+    col2dtype = dict([(col, pd.CategoricalDtype(pd.unique(np.concatenate(categories)))) \
+                      for (col, categories) in col2categories.items()])
+    for (key, df) in dfs:
+        col2compact = {}
+        for col in df.columns:
+            if df[col].dtype == object:
+                col2compact[col] = df[col].astype(col2dtype[col])
+            elif df[col].dtype == np.float64:
+                values = get_compact_values(df[col].values, table)
+                if values.dtype != np.float64:
+                    col2compact[col] = values
+        compact_df = df.assign(**col2compact) if col2compact else df
+        if key == 'analysis_means_index':
+            dict_cci_search['analysis_means'] = compact_df
+        else:
+            file_name2df[key] = compact_df
+    for dict_viz in [dict_cci_search, project_data['cell_cell_interaction_summary']]:
+        for key in ['relevant_interactions', 'pvalues', 'interaction_scores']:
+            matrix = dict_viz.get(key)
+            if matrix is not None:
+                matrix.data = get_compact_values(matrix.data, table)
+    gene_expression = project_data['single_gene_expression'].get('gene_expression', {})
+    for key in ['deconvoluted_result', 'deconvoluted_percents']:
+        if key in gene_expression:
+            gene_expression[key] = get_compact_values(gene_expression[key], table)
+    print("\n{}Compacted data of project: {} ({:.1f} MB -> {:.1f} MB)".format(INDENT, dir_name, \
+        memory_usage / 1024 / 1024, get_memory_usage((project_data, file_name2df)) / 1024 / 1024), flush=True, end="")
+
+def get_compact_values(values: np.ndarray, table: dict) -> np.ndarray:
+    """
+    Returns integer values as uint8 if they are all 0 or 1, and float64 values as float32 if each float32 value stands
+    for a single float64 value (in values and in table) - adding the float32 values to table (c.f. restore_values());
+    otherwise, values are returned unchanged. N.B. float64 values are not converted if their entries in table would
+    take up more memory than the conversion saves.
+    """
+    if values.dtype.kind in 'iu':
+        if np.isin(values, [0, 1]).all():
+            return values.astype(np.uint8)
+    elif values.dtype == np.float64:
+        compact_values = values.astype(np.float32)
+        # N.B. The values are compared by their bits - so that e.g. -0.0 and 0.0 are told apart
+        (keys, first, inverse) = np.unique(compact_values.view(np.uint32), return_index=True, return_inverse=True)
+        key_values = values.ravel()[first]
+        if not np.array_equal(key_values[inverse.ravel()].view(np.uint64), values.ravel().view(np.uint64)):
+            return values
+        positions = np.minimum(np.searchsorted(table['keys'], keys), max(len(table['keys']) - 1, 0))
+        is_in_table = table['keys'][positions] == keys if len(table['keys']) > 0 else np.zeros(len(keys), dtype=bool)
+        if not np.array_equal(table['values'][positions[is_in_table]].view(np.uint64),
+                              key_values[is_in_table].view(np.uint64)):
+            return values
+        # Each new entry of table takes up 12 bytes, and each converted value saves 4 bytes
+        if (~is_in_table).sum() * 12 >= values.size * 4:
+            return values
+        keys = np.concatenate([table['keys'], keys[~is_in_table]])
+        order = np.argsort(keys, kind='stable')
+        (table['keys'], table['values']) = (keys[order],
+                                            np.concatenate([table['values'], key_values[~is_in_table]])[order])
+        return compact_values
+    return values
+
+def restore_values(values: np.ndarray, table: dict) -> np.ndarray:
+    # Returns float32 values (c.f. get_compact_values()) as the float64 values they stand for in table (i.e.
+    # the project's compact_values_table) - other values are returned unchanged
+    if values.dtype == np.float32:
+        return table['values'][np.searchsorted(table['keys'], values.view(np.uint32))]
+    return values
+
+def restore_dtypes(df: pd.DataFrame, table: dict) -> pd.DataFrame:
+    # Returns a copy of df (e.g. a small selection of rows from a DataFrame in file_name2df) in which the columns
+    # converted by compact_project_data() are restored to their original dtypes - c.f. restore_values()
+    col2restored = {}
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            col2restored[col] = df[col].astype(object)
+        elif df[col].dtype == np.float32:
+            col2restored[col] = restore_values(df[col].values, table)
+    return df.assign(**col2restored) if col2restored else df
+
+def get_memory_usage(obj, seen: set = None) -> int:
+    """
+    Approximate number of bytes held by obj - DataFrames and numpy arrays are measured via their buffers, containers
+    are walked recursively (objects shared between containers are counted once).
+    """
+    if seen is None:
+        seen = set([])
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        if isinstance(o, pd.DataFrame):
+            total += int(o.memory_usage(deep=True).sum())
+        elif isinstance(o, pd.Index):
+            total += int(o.memory_usage(deep=True))
+        elif isinstance(o, np.ndarray):
+            total += o.nbytes
+        elif sparse.issparse(o):
+            total += o.data.nbytes + o.indices.nbytes + o.indptr.nbytes
+        else:
+            total += sys.getsizeof(o)
+            if isinstance(o, dict):
+                stack.extend(o.keys())
+                stack.extend(o.values())
+            elif isinstance(o, (list, tuple, set, frozenset)):
+                stack.extend(o)
+    return total
 
 def populate_data4viz(config_key, result_dict, df, separator, file_name2df):
     for viz in VIZZES:
@@ -199,6 +539,8 @@ def populate_analysis_means_data(dict_dd, df, separator):
     # num_all_cell_type_pairs is used for warning the user that if they select all cell type pairs and
     # all relevant interactions for the cci_search plot, the browser may run out of memory and crash
     dict_cci_search['num_all_cell_type_pairs'] = len(dict_cci_search['all_cell_type_pairs'])
+    # Index of all_cell_type_pairs by cell type and by microenvironment - for selecting cell type pairs
+    dict_cci_search['cell_type_pair_index'] = get_cell_type_pair_index(dict_cci_search, separator)
     df_ips = df[df.columns.intersection(['interacting_pair'] + all_cell_types_combinations)].copy()
     df_ips.set_index('interacting_pair', inplace=True)
     # We need df_ips to be able to select top N interacting pairs based on the selected cell type pairs
@@ -208,6 +550,17 @@ def populate_analysis_means_data(dict_dd, df, separator):
     dict_cci_search['all_interacting_pairs'] = df_ips.sum(axis=1).sort_values(ascending=False).index.tolist()
     # On first page load, we pre-select N interacting pairs (from means file), but we can map each interacting
     # pair label to a pair of gene names using deconvoluted file (via interaction id - shared by deconvoluted and means files - hence the dict below
+    # Indexes of rows (interacting pairs) and columns (cell type pairs) of the sparse matrices in which
+    # relevant_interactions, pvalues and interaction_scores are stored - c.f. get_sparse_matrix()
+    dict_cci_search['index2interacting_pair'] = list(OrderedDict.fromkeys(df['interacting_pair'].values.tolist()))
+    dict_cci_search['interacting_pair2index'] = \
+        dict([(ip, i) for i, ip in enumerate(dict_cci_search['index2interacting_pair'])])
+    dict_cci_search['cell_type_pair2index'] = dict([(ctp, i) for i, ctp in enumerate(all_cell_types_combinations)])
+    # The index (in index2interacting_pair) of the interacting pair in each row of analysis_means
+    dict_cci_search['analysis_means_row2index'] = \
+        np.array([dict_cci_search['interacting_pair2index'][ip] for ip in df_ips.index.tolist()], dtype=np.int64)
+    # The cell type pairs with the highest means of each row of analysis_means - c.f. preselect_interacting_pairs()
+    dict_cci_search['analysis_means_ranking'] = get_means_ranking(df_ips)
     dict_cci_search['interaction_id2interacting_pair'] = {}
     for i, j in zip(df['id_cp_interaction'].values.tolist(), df['interacting_pair'].values.tolist()):
         dict_cci_search['interaction_id2interacting_pair'][i] = j
@@ -251,22 +604,108 @@ def populate_analysis_means_data(dict_dd, df, separator):
         dict_cci_summary['all_modalities'] = all_modalities
         dict_cci_search['all_modalities'] = all_modalities
 
-def get_all_relevant_interactions(dict_cci_search: dict, selected_cell_type_pairs):
-    rel_ints_dict = dict_cci_search['relevant_interactions']
-    relevant_interactions_set = set([])
-    for ctp in selected_cell_type_pairs:
-        if ctp in rel_ints_dict:
-            if ctp in rel_ints_dict:
-                relevant_interactions_set.update(rel_ints_dict[ctp].keys())
-    return relevant_interactions_set
+def get_all_relevant_interactions_mask(dict_cci_search: dict, selected_cell_type_pairs) -> np.ndarray:
+    # Returns a mask over index2interacting_pair of the interacting pairs relevant in any of selected_cell_type_pairs
+    rel_ints = dict_cci_search['relevant_interactions']
+    ctp2index = dict_cci_search['cell_type_pair2index']
+    num_cols = rel_ints.shape[1]
+    cols = [j for j in map(ctp2index.get, selected_cell_type_pairs) if j is not None and j < num_cols]
+    mask = np.zeros(len(dict_cci_search['index2interacting_pair']), dtype=bool)
+    mask[rel_ints[:, cols].indices] = True
+    return mask
+
+def get_means_ranking(df_ips: pd.DataFrame) -> np.ndarray:
+    """
+    Returns an array with a row for each row of df_ips - of the positions of the (up to PRESELECTION_RANKING_SIZE)
+    columns with the highest positive means in that row, by mean descending, padded with len(df_ips.columns).
+    Returns None if any of the means is negative (as preselect_interacting_pairs() relies on a positive maximum mean
+    being the same as a positive sum of means).
+    """
+    means = df_ips.values
+    ret = np.full((means.shape[0], min(PRESELECTION_RANKING_SIZE, means.shape[1])), means.shape[1], dtype=np.int32)
+    if ret.size == 0:
+        return ret
+    # The rows are ranked a few at a time - so that the temporary arrays below stay small for projects with many
+    # cell type pairs
+    num_rows = max(1, PRESELECTION_CHUNK_SIZE * 1024 // means.shape[1])
+    for start in range(0, means.shape[0], num_rows):
+        chunk = np.nan_to_num(means[start:start + num_rows].astype(np.float64), nan=0.0)
+        if (chunk < 0).any():
+            return None
+        # The columns of the highest means, in no particular order ...
+        cols = np.argpartition(-chunk, ret.shape[1] - 1, axis=1)[:, 0:ret.shape[1]]
+        chunk = np.take_along_axis(chunk, cols, axis=1)
+        # ... sorted by mean descending
+        order = np.argsort(-chunk, axis=1, kind='stable')
+        cols = np.take_along_axis(cols, order, axis=1)
+        ret[start:start + num_rows] = np.where(np.take_along_axis(chunk, order, axis=1) > 0, cols, means.shape[1])
+    return ret
+
+def get_sums_and_max_means(means_t: np.ndarray, cols: np.ndarray, rows: np.ndarray = None) -> (np.ndarray, np.ndarray):
+    # Returns the sums and the maximums of means (in rows, or all rows if None) across cols. N.B. The transposed means
+    # are (normally) C-contiguous, i.e. the means of each cell type pair are contiguous. The sums and maximums are
+    # accumulated over chunks of cols - to avoid copying the means of all cols at once
+    num_rows = means_t.shape[1] if rows is None else len(rows)
+    sums = np.zeros(num_rows)
+    max_means = np.full(num_rows, np.nan)
+    for start in range(0, len(cols), PRESELECTION_CHUNK_SIZE):
+        chunk_cols = cols[start:start + PRESELECTION_CHUNK_SIZE]
+        chunk = means_t[chunk_cols] if rows is None else means_t[np.ix_(chunk_cols, rows)]
+        chunk_sums = chunk.sum(axis=0)
+        if np.isnan(chunk_sums).any():
+            chunk_sums = np.nansum(chunk, axis=0)
+        sums += chunk_sums
+        # N.B. fmax ignores NaNs
+        max_means = np.fmax(max_means, np.fmax.reduce(chunk, axis=0))
+    return (sums, max_means)
 
 def preselect_interacting_pairs(dict_cci_search: dict, selected_cell_type_pairs, interacting_pairs_selection_logic: str):
-    relevant_interactions_set = get_all_relevant_interactions(dict_cci_search, selected_cell_type_pairs)
-    df_ips = dict_cci_search['analysis_means'][selected_cell_type_pairs]
-    selected_interacting_pairs_sorted = \
-        df_ips[df_ips[selected_cell_type_pairs].apply(lambda row: row.sum() > 0, axis=1)].max(axis=1).sort_values(ascending=False).index.tolist()
-    # Filter selected_interacting_pairs_sorted by interactions in relevant_interactions_set
-    selected_interacting_pairs_sorted = [ip for ip in selected_interacting_pairs_sorted if ip in relevant_interactions_set]
+    df_ips = dict_cci_search['analysis_means']
+    cols = df_ips.columns.get_indexer(selected_cell_type_pairs)
+    if (cols < 0).any():
+        raise KeyError("Cell type pairs not in analysis_means: {}".format(
+            [ctp for i, ctp in zip(cols, selected_cell_type_pairs) if i < 0]))
+    means = df_ips.values
+    ranking = dict_cci_search.get('analysis_means_ranking')
+    if ranking is None or ranking.shape[1] == 0:
+        (sums, max_means) = get_sums_and_max_means(means.T, cols)
+        # Interacting pairs with a non-zero mean in selected_cell_type_pairs ...
+        rows = np.flatnonzero(sums > 0)
+        max_means = max_means[rows]
+    else:
+        # The maximum mean of an interacting pair across selected_cell_type_pairs is its mean in the first of
+        # selected_cell_type_pairs in its ranking (c.f. get_means_ranking()) - if any. N.B. The last element of
+        # is_selected corresponds to the ranking's padding
+        is_selected = np.zeros(means.shape[1] + 1, dtype=bool)
+        is_selected[cols] = True
+        is_ranked_selected = is_selected[ranking]
+        first = is_ranked_selected.argmax(axis=1)
+        is_found = is_ranked_selected[np.arange(len(ranking)), first]
+        rows = np.flatnonzero(is_found)
+        max_means = means[rows, ranking[rows, first[rows]]]
+        # The maximum means of the remaining interacting pairs are calculated from all their means in
+        # selected_cell_type_pairs - unless all their positive means are in their ranking (i.e. none of them is in
+        # selected_cell_type_pairs)
+        unranked_rows = np.flatnonzero(~is_found & (ranking[:, -1] < means.shape[1]))
+        if len(unranked_rows) > 0:
+            (sums, unranked_max_means) = get_sums_and_max_means(means.T, cols, unranked_rows)
+            rows = np.concatenate([rows, unranked_rows[sums > 0]])
+            max_means = np.concatenate([max_means, unranked_max_means[sums > 0]])
+            # Interacting pairs in the order of their rows - as they are sorted below
+            order = np.argsort(rows, kind='stable')
+            (rows, max_means) = (rows[order], max_means[order])
+    # Interacting pairs with a non-zero mean in selected_cell_type_pairs, sorted by their maximum mean across
+    # selected_cell_type_pairs, descending. N.B. This is done in the same way as pandas' sort_values(ascending=False)
+    # does it - so that the pre-selected interacting pairs stay the same. N.B. A partial sort (e.g. argpartition) for
+    # the top N interacting pairs would not order ties the same way - and sorting all interacting pairs takes
+    # a fraction of a millisecond. N.B. If means are float32 (c.f. compact_project_data()), they are sorted as float64
+    # - in the same way as the original float64 means
+    max_means = max_means.astype(np.float64)
+    rows = rows[::-1][np.argsort(max_means[::-1], kind='quicksort')][::-1]
+    # Only the interacting pairs relevant in at least one of selected_cell_type_pairs are pre-selected
+    relevant_mask = get_all_relevant_interactions_mask(dict_cci_search, selected_cell_type_pairs)
+    rows = rows[relevant_mask[dict_cci_search['analysis_means_row2index'][rows]]]
+    selected_interacting_pairs_sorted = df_ips.index.values[rows].tolist()
     if interacting_pairs_selection_logic == "all":
         return selected_interacting_pairs_sorted
     else:
@@ -280,57 +719,213 @@ def preselect_cell_types_pairs(dict_cci_search: dict, separator: str, mes: set):
     if maxCellTypePairsExceeded(dict_cci_search):
         if 'microenvironment2cell_types' in dict_cci_search:
             dd = dict_cci_search['microenvironment2cell_types']
+            me2positions = dict_cci_search['cell_type_pair_index']['microenvironment2positions']
             if not mes:
                 me = list(dd.keys())[0]
                 mes.add(me)
             cell_type_pairs = []
             cell_types = []
             for me in mes:
-                cts = dd[me]
-                for ct_pair in dict_cci_search['all_cell_type_pairs']:
-                    (ct1, ct2) = ct_pair.split(separator)
-                    if ct1 in cts and ct2 in cts:
-                        cell_type_pairs += [ct_pair]
-                        cell_types += cts
+                # The cell type pairs both cell types of which are in me
+                positions = me2positions.get(me, [])
+                if len(positions) > 0:
+                    cell_type_pairs += get_cell_type_pairs_at(dict_cci_search, positions)
+                    cell_types += dd[me]
             return cell_types, cell_type_pairs
         else:
             return dict_cci_search['all_cell_types'], dict_cci_search['all_cell_type_pairs']
     else:
         return dict_cci_search['all_cell_types'], dict_cci_search['all_cell_type_pairs']
 
-def add_naive_regexes(all_genes: set) -> set:
-    ret = set()
-    for n in [3, 4]:
-        ret.update(set([g[0:n]+"*" for g in all_genes]))
-    ret.update(all_genes)
+def get_cell_type_pair_index(dict_cci_search: dict, separator: str) -> dict:
+    """
+    Returns an index of dict_cci_search's all_cell_type_pairs, consisting of:
+    - cell_type_pair2position - the position of each cell type pair in all_cell_type_pairs,
+    - cell_type2positions - the (sorted) positions of the cell type pairs in which each cell type is the first and
+      the second cell type respectively,
+    - microenvironment2positions - the (sorted) positions of the cell type pairs both cell types of which are in each
+      microenvironment (if microenvironments were provided),
+    - microenvironments - the microenvironment of each cell type pair, c.f. get_cell_type_pair_microenvironment()
+      (if microenvironments were provided; None for the cell type pairs with a cell type not in any microenvironment).
+    N.B. The cell type pairs are split into their cell types here only - rather than for each request.
+    """
+    cell_type_pairs = dict_cci_search['all_cell_type_pairs']
+    ct2mes = dict_cci_search.get('cell_type2microenvironments')
+    index = {'cell_type_pair2position': dict([(ctp, i) for (i, ctp) in enumerate(cell_type_pairs)])}
+    (ct2firsts, ct2seconds) = ({}, {})
+    microenvironments = []
+    for (i, ct_pair) in enumerate(cell_type_pairs):
+        cell_types = ct_pair.split(separator)
+        if len(cell_types) != 2:
+            # Not a cell type pair - hence never selected by its cell types or microenvironment
+            microenvironments.append(None)
+            continue
+        ct2firsts.setdefault(cell_types[0], []).append(i)
+        ct2seconds.setdefault(cell_types[1], []).append(i)
+        if ct2mes is not None and cell_types[0] in ct2mes and cell_types[1] in ct2mes:
+            microenvironments.append(get_cell_type_pair_microenvironment(ct_pair, ct2mes, separator))
+        else:
+            microenvironments.append(None)
+    index['cell_type2positions'] = dict([(ct, (np.array(ct2firsts.get(ct, []), dtype=np.int64),
+                                               np.array(ct2seconds.get(ct, []), dtype=np.int64))) \
+                                         for ct in sorted(set(ct2firsts) | set(ct2seconds))])
+    if ct2mes is not None:
+        index['microenvironment2positions'] = \
+            dict([(me, get_cell_type_pair_positions(index, cts, cts)) \
+                  for (me, cts) in dict_cci_search['microenvironment2cell_types'].items()])
+        index['microenvironments'] = microenvironments
+    return index
+
+def get_cell_type_pair_positions(index: dict, cell_types1, cell_types2 = None) -> np.ndarray:
+    # Returns the sorted positions (c.f. get_cell_type_pair_index()) of the cell type pairs in which the first cell type
+    # is in cell_types1 and the second one in cell_types2 - or, if cell_types2 is None, either cell type is in cell_types1
+    ct2positions = index['cell_type2positions']
+    firsts = [ct2positions[ct][0] for ct in set(cell_types1) if ct in ct2positions]
+    if cell_types2 is None:
+        return union_positions(firsts + [ct2positions[ct][1] for ct in set(cell_types1) if ct in ct2positions])
+    seconds = [ct2positions[ct][1] for ct in set(cell_types2) if ct in ct2positions]
+    return np.intersect1d(union_positions(firsts), union_positions(seconds), assume_unique=True)
+
+def union_positions(positions: list) -> np.ndarray:
+    return np.unique(np.concatenate(positions)) if positions else np.empty(0, dtype=np.int64)
+
+def get_cell_type_pairs_at(dict_cci_search: dict, positions) -> list:
+    all_cell_type_pairs = dict_cci_search['all_cell_type_pairs']
+    return [all_cell_type_pairs[i] for i in positions.tolist()]
+
+def get_paired_cell_types(dict_cci_search: dict, cell_types: list) -> dict:
+    # Returns, for each of cell_types, the cell types it is paired with as the first cell type of a cell type pair
+    # (in the order of all_cell_type_pairs) - for the front end's cell type pair selection grid
+    ct2positions = dict_cci_search['cell_type_pair_index']['cell_type2positions']
+    separator = dict_cci_search['separator']
+    ret = {}
+    for ct in cell_types:
+        if ct in ct2positions:
+            prefix_len = len(ct) + len(separator)
+            ret[ct] = [ct_pair[prefix_len:] for ct_pair in get_cell_type_pairs_at(dict_cci_search, ct2positions[ct][0])]
     return ret
 
+def get_cell_type_pair_microenvironment(ct_pair: str, ct2mes: dict, separator: str) -> str:
+    # Returns the microenvironment both cell types of ct_pair belong to - or 'multiple' if that is ambiguous
+    mes1 = ct2mes[ct_pair.split(separator)[0]]
+    mes2 = ct2mes[ct_pair.split(separator)[1]]
+    if len(mes1) == 1 and mes1[0] in mes2:
+        return mes1[0]
+    elif len(mes2) == 1 and mes2[0] in mes1:
+        return mes2[0]
+    else:
+        return 'multiple'
+
+def get_gene_families(genes: list, positions) -> list:
+    # Returns the sorted simplified regular expression terms (e.g. WNT*) for the 3- and 4-character prefixes of the genes
+    # at positions in genes (sorted) that are shared by at least two genes (i.e. for the genes' families)
+    ret = set()
+    for gene in [genes[i] for i in positions]:
+        for n in GENE_FAMILY_PREFIX_LENGTHS:
+            if len(gene) >= n and gene[0:n] + "*" not in ret:
+                # genes are sorted - hence the genes sharing a prefix are adjacent
+                start = bisect_left(genes, gene[0:n])
+                if start + 1 < len(genes) and genes[start + 1].startswith(gene[0:n]):
+                    ret.add(gene[0:n] + "*")
+    return sorted(ret)
+
+def get_gene_index(df, interaction_id2interacting_pair: dict) -> dict:
+    """
+    Returns an index of df's rows by gene_name, consisting of:
+    - genes - the sorted gene names (so that the gene names starting with a prefix can be found via bisect),
+    - rows - the positions of df's rows, grouped by gene (in the order of genes) and in df order within each gene,
+    - offsets - the rows of genes[i] are rows[offsets[i]:offsets[i+1]],
+    - interacting_pairs - the interacting pair of each row in rows (via the row's id_cp_interaction).
+    """
+    gene_names = df['gene_name'].values
+    row_positions = np.flatnonzero(pd.notna(gene_names))
+    (genes, row2gene) = np.unique(gene_names[row_positions].astype(str), return_inverse=True)
+    rows = row_positions[np.argsort(row2gene, kind='stable')]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(row2gene, minlength=len(genes)))])
+    interacting_pairs = [interaction_id2interacting_pair.get(i) for i in df['id_cp_interaction'].values[rows].tolist()]
+    return {'genes': genes.tolist(), 'rows': rows, 'offsets': offsets, 'interacting_pairs': interacting_pairs}
+
+def get_gene_ranges(gene_index: dict, genes: list) -> list:
+    # Returns (start, end) positions in gene_index['genes'] for each gene in genes; simplified regular expression
+    # terms (e.g. WNT*) are expanded to all the genes starting with the prefix (e.g. WNT)
+    all_genes = gene_index['genes']
+    ranges = []
+    for gene in genes:
+        if len(gene) > 1 and gene.endswith("*"):
+            prefix = gene[0:-1]
+            # The first string greater than all strings starting with prefix
+            prefix_end = prefix[0:-1] + chr(ord(prefix[-1]) + 1)
+            ranges.append((bisect_left(all_genes, prefix), bisect_left(all_genes, prefix_end)))
+        else:
+            start = bisect_left(all_genes, gene)
+            if start < len(all_genes) and all_genes[start] == gene:
+                ranges.append((start, start + 1))
+    return ranges
+
+def get_gene_family(project_data: dict, family: str) -> list:
+    # Returns the genes of family (a simplified regular expression term suggested by autocomplete(), e.g. WNT*) - found via
+    # bisect, i.e. in time bounded by the number of the family's genes rather than of all genes
+    gene_index = project_data['cell_cell_interaction_search'].get('gene_index', {}).get('deconvoluted_result')
+    if gene_index is None or not family.endswith("*") or len(family) - 1 not in GENE_FAMILY_PREFIX_LENGTHS:
+        return []
+    (start, end) = get_gene_ranges(gene_index, [family])[0]
+    return gene_index['genes'][start:end]
+
+def get_gene_rows(gene_index: dict, genes: list) -> np.ndarray:
+    # Returns the sorted positions of the rows for genes in the DataFrame indexed by gene_index
+    offsets = gene_index['offsets']
+    rows = [gene_index['rows'][offsets[start]:offsets[end]] for (start, end) in get_gene_ranges(gene_index, genes)]
+    return np.unique(np.concatenate(rows)) if rows else np.array([], dtype=np.int64)
+
+def get_gene_interacting_pairs(gene_index: dict, genes: list) -> list:
+    offsets = gene_index['offsets']
+    interacting_pairs = []
+    for (start, end) in get_gene_ranges(gene_index, genes):
+        interacting_pairs += gene_index['interacting_pairs'][offsets[start]:offsets[end]]
+    return interacting_pairs
 
 def populate_deconvoluted_data(dict_dd, df, separator = None, selected_genes = None, selected_cell_types = None, refresh_plot = False, percents = False):
+    """
+    On project load, indexes df (deconvoluted_result or deconvoluted_percents) - c.f. get_gene_expression(); then (on
+    project load as well as for each request) populates single gene expression plot's data for selected_genes and
+    selected_cell_types from that index. N.B. df is used on project load only (requests can pass None).
+    """
+    timer = metrics.StageTimer()
     dict_sge = dict_dd['single_gene_expression']
     dict_cci_search = dict_dd['cell_cell_interaction_search']
     if not separator:
         separator = dict_dd['cell_cell_interaction_search']['separator']
 
-    # Note: all_genes is needed for autocomplete - for the user to include genes in the plot
-    all_genes = set(df['gene_name'].values)
-    # Add simplified regular expression terms (e.g. WNT*) - to allow the user to select gene families
-    all_genes = add_naive_regexes(all_genes)
-    all_cell_types = list(df.columns[7:])
-    # Data below is needed for autocomplete functionality
-    dict_sge['all_genes'] = all_genes
-    dict_sge['all_cell_types'] = all_cell_types
-    dict_cci_search['all_genes'] = all_genes
-    dict_cci_search['all_cell_types'] = all_cell_types
-
-    # On first page load, we pre-select N interacting pairs (from means file), but we can map each interacting
-    # pair label to a pair of gene names using deconvoluted file (via interaction id - shared by deconvoluted and means files -
-    # hence the need for interacting_pair2genes_names
-    interacting_pair2genes_names = {}
-    for i, j in zip(df['id_cp_interaction'].values.tolist(), df['gene_name'].values.tolist()):
-        if i in dict_cci_search['interaction_id2interacting_pair']:
-            interacting_pair = dict_cci_search['interaction_id2interacting_pair'][i]
-            interacting_pair2genes_names.setdefault(interacting_pair, set([])).add(j)
+    file_name = 'deconvoluted_percents' if percents else 'deconvoluted_result'
+    gene_expression = dict_sge.get('gene_expression', {})
+    if file_name not in gene_expression:
+        # On project load only - the indexes are then used by all requests
+        if percents:
+            gene_expression[file_name] = get_aligned_values(gene_expression, df)
+        else:
+            gene_index = dict_sge.setdefault('gene_index', {})
+            gene_index[file_name] = get_gene_index(df, dict_cci_search['interaction_id2interacting_pair'])
+            dict_cci_search['gene_index'] = gene_index
+            dict_sge['gene_expression'] = gene_expression = \
+                get_gene_expression(df, dict_cci_search['interaction_id2interacting_pair'])
+            # Note: all_genes is needed for autocomplete - for the user to include genes in the plot (N.B. simplified
+            # regular expression terms for gene families, e.g. WNT*, are added to the suggestions by autocomplete())
+            all_genes = gene_index[file_name]['genes']
+            all_cell_types = list(df.columns[7:])
+            # Data below is needed for autocomplete functionality
+            dict_sge['all_genes'] = all_genes
+            dict_sge['all_cell_types'] = all_cell_types
+            dict_cci_search['all_genes'] = all_genes
+            dict_cci_search['all_cell_types'] = all_cell_types
+            # Retrieve gene and complex information for each interacting pair
+            interacting_pair2participants = {}
+            for row in df[['id_cp_interaction', 'gene_name', 'uniprot', 'protein_name', 'complex_name']].fillna('').values:
+                interaction_id = row[0]
+                interacting_pair = dict_cci_search['interaction_id2interacting_pair'][interaction_id]
+                if interacting_pair not in interacting_pair2participants:
+                    interacting_pair2participants[interacting_pair] = []
+                interacting_pair2participants[interacting_pair].append([str(i) for i in row[1:]])
+            dict_cci_search['interacting_pair2participants'] = interacting_pair2participants
 
     if not selected_cell_types:
         if not refresh_plot:
@@ -349,73 +944,95 @@ def populate_deconvoluted_data(dict_dd, df, separator = None, selected_genes = N
             selected_genes = set([])
             # Derive pre-selected genes from the pre-selected interacting_pairs
             for ip in selected_interacting_pairs:
-                selected_genes.update(interacting_pair2genes_names[ip])
+                selected_genes.update(gene_expression['interacting_pair2genes'][ip])
             selected_genes = sorted(list(selected_genes))
         else:
             selected_genes = []
     dict_sge['genes'] = selected_genes
+    timer.lap('select_genes')
 
-    # Retrieve gene and complex information for each interacting pair
-    interacting_pair2participants = {}
-    if not percents:
-        # We need to do this once only - hence not when percents are retrieved
-        for row in df[['id_cp_interaction', 'gene_name', 'uniprot', 'protein_name', 'complex_name']].fillna('').values:
-            interaction_id = row[0]
-            interacting_pair = dict_cci_search['interaction_id2interacting_pair'][interaction_id]
-            if interacting_pair not in interacting_pair2participants:
-                interacting_pair2participants[interacting_pair] = []
-            interacting_pair2participants[interacting_pair].append([str(i) for i in row[1:]])
-        dict_cci_search['interacting_pair2participants'] = interacting_pair2participants
-
-    # Retrieve means for genes in selected_genes and cell types in all_cell_types
-    selected_genes_means_or_pcts_df = df[df['gene_name'].isin(selected_genes)][['gene_name', 'complex_name'] + selected_cell_types].drop_duplicates()
+    # Retrieve means (or percents) for genes in selected_genes (incl. gene families, e.g. WNT*) and selected_cell_types
+    # - as a block of gene_expression's matrix of file_name
+    rows = get_gene_rows(gene_expression, selected_genes)
+    cols = np.array([gene_expression['cell_type2index'][ct] for ct in selected_cell_types], dtype=np.int64)
+    values = restore_values(gene_expression[file_name][np.ix_(rows, cols)],
+                            dict_cci_search.get('compact_values_table'))
     if percents:
-        deconvoluted_df = selected_genes_means_or_pcts_df[selected_cell_types]
         key = 'percents'
         min_key = 'min_percent'
         max_key = 'max_percent'
-        # Drop all rows/genes with all zeros in them - to match deconvoluted_df.dropna for z-scores below
-        deconvoluted_df = deconvoluted_df.loc[~(deconvoluted_df == 0).all(axis=1)]
+        # Drop all rows/genes with all zeros in them - to match the removal of rows with z-scores = nan below
+        values = values[~(values == 0).all(axis=1)]
     else:
-        deconvoluted_df = selected_genes_means_or_pcts_df
-        # Calculate z-scores (so that cell types per gene complex are comparable)
-        deconvoluted_df.set_index(['gene_name', 'complex_name'], inplace=True)
-        if not deconvoluted_df.empty:
+        if values.size > 0:
             # If at least one cell type was selected
-            deconvoluted_df = stats.zscore(deconvoluted_df, axis=1)
-        # Genes with expression=0 across all selected_cell_types will get z-score = nan - remove
-        # them from the plot
-        deconvoluted_df.dropna(axis=0, inplace=True)
-        # Round zscores to 3 decimal places
-        deconvoluted_df = np.round(deconvoluted_df, 3)
-        deconvoluted_df.reset_index(drop=False, inplace=True)
+            # Calculate z-scores (so that cell types per gene complex are comparable)
+            values = stats.zscore(values, axis=1)
+            # Genes with expression=0 across all selected_cell_types will get z-score = nan - remove them from the plot
+            is_kept = ~np.isnan(values).any(axis=1)
+            (rows, values) = (rows[is_kept], values[is_kept])
+            # Round zscores to 3 decimal places
+            values = np.round(values, 3)
         # Assemble gene_complex_list with the genes remaining in mean_zscores
-        gene_complex_list = (deconvoluted_df['gene_name'] + " in " + deconvoluted_df['complex_name'].fillna('')).values
-        gene_complex_list = [re.sub(r"\sin\s$", "", x) for x in gene_complex_list]
-        dict_sge['gene_complex'] = gene_complex_list
-        deconvoluted_df.drop(columns=['gene_name', 'complex_name'], inplace=True)
+        dict_sge['gene_complex'] = [gene_expression['gene_complex'][i] for i in rows.tolist()]
         key = 'mean_zscores'
         min_key = 'min_zscore'
         max_key = 'max_zscore'
-    dict_sge[key] = deconvoluted_df.values.tolist()
-    if not deconvoluted_df.empty:
-        dict_sge[min_key] = deconvoluted_df.min(axis=None)
-        dict_sge[max_key] = deconvoluted_df.max(axis=None)
+    dict_sge[key] = values.tolist()
+    if values.size > 0:
+        dict_sge[min_key] = values.min()
+        dict_sge[max_key] = values.max()
+    timer.lap(key)
+
+def get_gene_expression(df, interaction_id2interacting_pair: dict) -> dict:
+    """
+    Returns an index of deconvoluted_result df's mean expressions in each cell type of each distinct (gene_name,
+    complex_name), consisting of:
+    - deconvoluted_result - the (genes in complexes x cell types) matrix of mean expressions, with the genes in complexes
+      in the order in which they first occur in df (N.B. CellphoneDB outputs the same values in all rows of a gene in a
+      complex - hence only the first such row is kept),
+    - genes, rows and offsets - an index of the matrix's rows by gene_name, as in get_gene_index(),
+    - gene_complex - the label of each row, e.g. 'WNT5A in WNT5A_receptor_complex',
+    - row_keys - the (gene_name, complex_name) of each row - c.f. get_aligned_values(),
+    - cell_type2index - the column of each cell type,
+    - interacting_pair2genes - the gene names of each interacting pair (via df's id_cp_interaction).
+    """
+    gene_names = df['gene_name'].values
+    complex_names = df['complex_name'].fillna('').values
+    rows = np.flatnonzero(pd.notna(gene_names) & ~df.duplicated(['gene_name', 'complex_name']).values)
+    (genes, row2gene) = np.unique(gene_names[rows].astype(str), return_inverse=True)
+    cell_types = list(df.columns[7:])
+    interacting_pair2genes = {}
+    for (interaction_id, gene) in zip(df['id_cp_interaction'].values.tolist(), gene_names.tolist()):
+        if interaction_id in interaction_id2interacting_pair:
+            interacting_pair2genes.setdefault(interaction_id2interacting_pair[interaction_id], set([])).add(gene)
+    return {'deconvoluted_result': np.ascontiguousarray(df[cell_types].values[rows], dtype=np.float64),
+            'genes': genes.tolist(),
+            'rows': np.argsort(row2gene, kind='stable'),
+            'offsets': np.concatenate([[0], np.cumsum(np.bincount(row2gene, minlength=len(genes)))]),
+            'gene_complex': [re.sub(r"\sin\s$", "", "{} in {}".format(gene, complex_name)) \
+                             for (gene, complex_name) in zip(gene_names[rows].tolist(), complex_names[rows].tolist())],
+            'row_keys': pd.MultiIndex.from_arrays([gene_names[rows], complex_names[rows]]),
+            'cell_type2index': dict([(ct, i) for (i, ct) in enumerate(cell_types)]),
+            'interacting_pair2genes': interacting_pair2genes}
+
+def get_aligned_values(gene_expression: dict, df) -> np.ndarray:
+    # Returns df's (e.g. deconvoluted_percents) values in the rows and columns of gene_expression's matrix - taking the
+    # first row of each (gene_name, complex_name) in df; the values of genes in complexes or cell types not in df are 0
+    df_keys = pd.MultiIndex.from_arrays([df['gene_name'].values, df['complex_name'].fillna('').values])
+    df_rows = np.flatnonzero(~df_keys.duplicated())
+    rows = df_keys[df_rows].get_indexer(gene_expression['row_keys'])
+    cols = df.columns.get_indexer(list(gene_expression['cell_type2index'].keys()))
+    ret = np.zeros(gene_expression['deconvoluted_result'].shape)
+    (is_row_found, is_col_found) = (rows >= 0, cols >= 0)
+    ret[np.ix_(is_row_found, is_col_found)] = \
+        df.iloc[df_rows[rows[is_row_found]], cols[is_col_found]].to_numpy(dtype=np.float64)
+    return ret
 
 def populate_pvalues_data(result_dict, df, separator):
     dict_cci_search = result_dict['cell_cell_interaction_search']
-    dict_pvals = {}
-    all_cell_types_combinations = get_cell_type_pairs(df, separator)
-    cnt = 0
-    for ct_pair in all_cell_types_combinations:
-        # Filter out pvals = 1.0 - no point bloating the API call result
-        df_filtered = df[['interacting_pair', ct_pair]][df[ct_pair] < 1]
-        if cnt % 100000 == 0:
-            print('.', flush=True, end="")
-        if not df_filtered.empty:
-            dict_pvals[ct_pair] = dict(zip(df_filtered['interacting_pair'], df_filtered[ct_pair]))
-        cnt += 1
-    dict_cci_search['pvalues'] = dict_pvals
+    # Filter out pvals = 1.0 - no point storing them
+    dict_cci_search['pvalues'] = get_sparse_matrix(dict_cci_search, df, separator, lambda vals: vals < 1)
 
 """
 By aggregate mean expression, retrieve top TOP_N interaction classes, and for those retrieve top TOP_N  
@@ -429,38 +1046,96 @@ def sort_df_by_mean(df, cols):
 
 def populate_relevant_interactions_data(result_dict, df, separator):
     dict_cci_search = result_dict['cell_cell_interaction_search']
-    dict_ri_flags = {}
-    all_cell_types_combinations = get_cell_type_pairs(df, separator)
-    cnt = 0
-    for ct_pair in all_cell_types_combinations:
-        # Filter out values of 0 (= irrelevant interactions) - no point bloating the API call result
-        df_filtered = df[['interacting_pair', ct_pair]][df[ct_pair] > 0]
-        if cnt % 100000 == 0:
-            print('.', flush=True, end="")
-        if not df_filtered.empty:
-            dict_ri_flags[ct_pair] = dict(zip(df_filtered['interacting_pair'], df_filtered[ct_pair]))
-        cnt += 1
-    dict_cci_search['relevant_interactions'] = dict_ri_flags
-
-
+    # Filter out values of 0 (= irrelevant interactions) - no point storing them
+    dict_cci_search['relevant_interactions'] = get_sparse_matrix(dict_cci_search, df, separator, lambda vals: vals > 0)
 
 def populate_interaction_scores_data(result_dict, df, separator):
     dict_cci_summary = result_dict['cell_cell_interaction_summary']
     dict_cci_search = result_dict['cell_cell_interaction_search']
-    dict_int_scores = {}
-    all_cell_types_combinations = get_cell_type_pairs(df, separator)
-    cnt = 0
-    for ct_pair in all_cell_types_combinations:
-        # Filter out scores of 0 - no point bloating the API call result
-        df_filtered = df[['interacting_pair', ct_pair]][df[ct_pair] > 0]
-        if cnt % 100000 == 0:
-            print('.', flush=True, end="")
-        if not df_filtered.empty:
-            dict_int_scores[ct_pair] = dict(zip(df_filtered['interacting_pair'], df_filtered[ct_pair]))
-        cnt += 1
+    # Filter out scores of 0 - no point storing them
+    dict_int_scores = get_sparse_matrix(dict_cci_search, df, separator, lambda vals: vals > 0)
     dict_cci_summary['interaction_scores'] = dict_int_scores
     dict_cci_search['interaction_scores'] = dict_int_scores
 
+def get_sparse_matrix(dict_cci_search, df, separator, is_stored) -> sparse.csc_matrix:
+    """
+    Returns the values in df's cell type pair columns for which is_stored(values) is True as a sparse matrix,
+    in which rows and columns correspond to the interacting pairs and cell type pairs in dict_cci_search's
+    interacting_pair2index and cell_type_pair2index respectively. If an interacting pair occurs in multiple
+    rows of df, its value in a given cell type pair is taken from the last row in which that value is stored.
+    """
+    ip2index = dict_cci_search.setdefault('interacting_pair2index', {})
+    index2ip = dict_cci_search.setdefault('index2interacting_pair', [])
+    ctp2index = dict_cci_search.setdefault('cell_type_pair2index', {})
+    cell_type_pairs = get_cell_type_pairs(df, separator)
+    # Interacting pairs and cell type pairs not in analysis_means file (if any) are appended to the indexes
+    for ip in df['interacting_pair'].values:
+        if ip not in ip2index:
+            ip2index[ip] = len(index2ip)
+            index2ip.append(ip)
+    for ctp in cell_type_pairs:
+        if ctp not in ctp2index:
+            ctp2index[ctp] = len(ctp2index)
+    row_idxs = np.array([ip2index[ip] for ip in df['interacting_pair'].values], dtype=np.int64)
+    col_idxs = np.array([ctp2index[ctp] for ctp in cell_type_pairs], dtype=np.int64)
+    # The values are converted SPARSE_MATRIX_CHUNK_SIZE cell type pairs at a time - so that the temporary arrays below
+    # are the size of a chunk of df rather than of the whole of df. N.B. cell_type_pairs are df's last columns.
+    first_col = len(df.columns) - len(cell_type_pairs)
+    (rows, cols, vals) = ([], [], [])
+    for start in range(0, len(cell_type_pairs), SPARSE_MATRIX_CHUNK_SIZE):
+        chunk_vals = df.iloc[:, first_col + start:first_col + start + SPARSE_MATRIX_CHUNK_SIZE].values
+        (df_rows, df_cols) = np.nonzero(is_stored(chunk_vals))
+        chunk_rows = row_idxs[df_rows]
+        chunk_cols = col_idxs[start + df_cols]
+        # np.nonzero() returns stored values in the order of df's rows - keep the last one for each (row, col)
+        (_, last) = np.unique((chunk_cols * len(index2ip) + chunk_rows)[::-1], return_index=True)
+        last = len(chunk_rows) - 1 - last
+        rows.append(chunk_rows[last])
+        cols.append(chunk_cols[last])
+        vals.append(chunk_vals[df_rows[last], df_cols[last]])
+    if not vals:
+        return sparse.csc_matrix((len(index2ip), len(ctp2index)))
+    return sparse.csc_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                             shape=(len(index2ip), len(ctp2index)))
+
+def get_sparse_column(matrix, result_dict, cell_type_pair) -> (np.ndarray, np.ndarray):
+    # Returns the indexes of interacting pairs with a value stored for cell_type_pair in matrix, and those values
+    j = result_dict['cell_type_pair2index'].get(cell_type_pair)
+    if j is None or j >= matrix.shape[1]:
+        return (np.empty(0, dtype=matrix.indices.dtype), np.empty(0, dtype=matrix.dtype))
+    start, end = matrix.indptr[j], matrix.indptr[j + 1]
+    return (matrix.indices[start:end], matrix.data[start:end])
+
+def get_sparse_block(matrix, result_dict, interacting_pairs, cell_type_pairs, default) -> np.ndarray:
+    """
+    Returns a (len(interacting_pairs) x len(cell_type_pairs)) array of the values stored in matrix for interacting_pairs
+    and cell_type_pairs, and default where no value is stored. N.B. The array's dtype is object so that its tolist()
+    returns exactly the values stored in matrix (as Python ints or floats) and default.
+    """
+    ip2index = result_dict['interacting_pair2index']
+    ctp2index = result_dict['cell_type_pair2index']
+    rows = np.array([ip2index.get(ip, -1) for ip in interacting_pairs], dtype=np.int64)
+    cols = np.array([ctp2index.get(ctp, -1) for ctp in cell_type_pairs], dtype=np.int64)
+    ret = np.full((len(rows), len(cols)), default, dtype=object)
+    valid_rows = np.nonzero((rows >= 0) & (rows < matrix.shape[0]))[0]
+    valid_cols = np.nonzero((cols >= 0) & (cols < matrix.shape[1]))[0]
+    if len(valid_rows) == 0 or len(valid_cols) == 0:
+        return ret
+    # interacting_pairs may contain duplicates - gather values for each distinct row of matrix first
+    (distinct_rows, row2distinct_row) = np.unique(rows[valid_rows], return_inverse=True)
+    matrix_row2distinct_row = np.full(matrix.shape[0], -1, dtype=np.int64)
+    matrix_row2distinct_row[distinct_rows] = np.arange(len(distinct_rows))
+    # Slicing columns of a csc matrix retains explicitly stored zeros (e.g. pvalues = 0)
+    block = matrix[:, cols[valid_cols]]
+    block_cols = np.repeat(np.arange(len(valid_cols)), np.diff(block.indptr))
+    block_rows = matrix_row2distinct_row[block.indices]
+    is_selected = block_rows >= 0
+    distinct_rows_block = np.full((len(distinct_rows), len(valid_cols)), default, dtype=object)
+    distinct_rows_block[block_rows[is_selected], block_cols[is_selected]] = \
+        restore_values(block.data[is_selected], result_dict.get('compact_values_table')).tolist()
+    ret[np.ix_(valid_rows, valid_cols)] = distinct_rows_block[row2distinct_row]
+    return ret
+
 def populate_degs_data(result_dict, df):
     dict_degs = result_dict['single_gene_expression']
     degs_cell_types = list(zip(df['gene'], df['cluster']))
@@ -497,20 +1172,15 @@ def sort_cell_type_pairs(cell_type_pairs, result_dict, separator) -> (list, dict
         return selected_cell_type_pairs, ct_pair2me
     else:
         ct2mes = result_dict['cell_type2microenvironments']
+        index = result_dict['cell_type_pair_index']
+        ctp2position = index['cell_type_pair2position']
         # Microenvironments are used - sort selected_cell_type_pairs by microenvironment
         ct_pair2me = {}
         me2ct_pairs = {}
         for ct_pair in cell_type_pairs:
-            ct1 = ct_pair.split(separator)[0]
-            ct2 = ct_pair.split(separator)[1]
-            mes1 = ct2mes[ct1]
-            mes2 = ct2mes[ct2]
-            if len(mes1) == 1 and mes1[0] in mes2:
-                me = mes1[0]
-            elif len(mes2) == 1 and mes2[0] in mes1:
-                me = mes2[0]
-            else:
-                me = 'multiple'
+            me = index['microenvironments'][ctp2position[ct_pair]] if ct_pair in ctp2position else None
+            if me is None:
+                me = get_cell_type_pair_microenvironment(ct_pair, ct2mes, separator)
             ct_pair2me[ct_pair] = me
             if me not in me2ct_pairs:
                 me2ct_pairs[me] = set([])
@@ -521,55 +1191,59 @@ def sort_cell_type_pairs(cell_type_pairs, result_dict, separator) -> (list, dict
         for me in OrderedDict(sorted(me2ct_pairs.items())):
             sorted_selected_cell_type_pairs += sorted(list(me2ct_pairs[me]))
         return sorted_selected_cell_type_pairs, ct_pair2me
-def get_properties_html_for_interacting_pairs(result_dict: dict) -> dict:
-    interacting_pairs = result_dict['interacting_pairs_means']
-    interacting_pair2properties_html = {}
+
+def get_properties_html(result_dict: dict, ip: str) -> str:
+    # Returns the sidenav html for interacting pair ip, or None if no such html is available. N.B. result_dict is not
+    # modified - the html is cached by the caller (c.f. get_interaction_html() in main.py)
+    if 'cellphonedb' not in result_dict or ip not in result_dict.get('interacting_pair2participants', {}):
+        return None
+    return get_properties_html_for_interacting_pair(result_dict, ip)
+
+def get_properties_html_for_interacting_pair(result_dict: dict, ip: str) -> str:
     cpdb_data = result_dict['cellphonedb']
     protein2Info = cpdb_data['protein2Info']
     complex2Info = cpdb_data['complex2Info']
     resource2Complex2Acc = cpdb_data['resource2Complex2Acc']
     proteinAcc2Name = cpdb_data['proteinAcc2Name']
     interacting_pair2participants = result_dict['interacting_pair2participants']
-    for ip in interacting_pairs:
-        html = "<ul id=\"sidenav_{}\" class=\"sidenav fixed\" style=\"width:410px\">".format(ip)
-        if 'interacting_pair2classes' in result_dict and ip in result_dict['interacting_pair2classes']:
-            classes = result_dict['interacting_pair2classes'][ip]
-            html += "<li><a class=\"subheader black-text\">Interaction classification</a></li>" + \
-                    "<a {}>{}</a><br> ".format(SIDENAV_PROPERTY_STYLE, classes)
-            html += "<li><div class=\"divider\"></div></li>"
-        if 'interacting_pair2modalities' in result_dict and ip in result_dict['interacting_pair2modalities']:
-            modalities = result_dict['interacting_pair2modalities'][ip]
-            html += "<li><a class=\"subheader black-text\">Interaction modality</a></li>" + \
-                    "<a {}>{}</a><br> ".format(SIDENAV_PROPERTY_STYLE, modalities)
-            html += "<li><div class=\"divider\"></div></li>"
-
-        complex_name2proteins = {}
-        partners = [None, None]
-        partner_letters = "ab"
-        i = 0
-        for (geneName, uniprotAcc, proteinName, complexName) in interacting_pair2participants[ip]:
-             pos = min(i, 1)
-             if complexName != '':
-                partners[pos] = complexName
-                if complexName not in complex_name2proteins:
-                    complex_name2proteins[complexName] = []
-                    complex_name2proteins[complexName].append(uniprotAcc)
-             else:
-                 partners[pos] = uniprotAcc
-             i += 1
-        if partners[1] is None:
-            # E.g. GJA1_GJA1 - protein interacts with the same protein in a different cell
-            partners[1] = partners[0]
-        for i, partner in enumerate(partners):
-            if i > 0:
-                html += "<li><div class=\"divider\"></div></li>"
-            html += "<li><a class=\"subheader black-text\">Partner {} </a></li>".format(partner_letters[i])
-            html += search_utils.get_sidenav_html(partner in complex_name2proteins, partner, complex_name2proteins, protein2Info,
-                                                   complex2Info, resource2Complex2Acc, proteinAcc2Name)
+    html = "<ul id=\"sidenav_{}\" class=\"sidenav fixed\" style=\"width:410px\">".format(ip)
+    if 'interacting_pair2classes' in result_dict and ip in result_dict['interacting_pair2classes']:
+        classes = result_dict['interacting_pair2classes'][ip]
+        html += "<li><a class=\"subheader black-text\">Interaction classification</a></li>" + \
+                "<a {}>{}</a><br> ".format(SIDENAV_PROPERTY_STYLE, classes)
+        html += "<li><div class=\"divider\"></div></li>"
+    if 'interacting_pair2modalities' in result_dict and ip in result_dict['interacting_pair2modalities']:
+        modalities = result_dict['interacting_pair2modalities'][ip]
+        html += "<li><a class=\"subheader black-text\">Interaction modality</a></li>" + \
+                "<a {}>{}</a><br> ".format(SIDENAV_PROPERTY_STYLE, modalities)
         html += "<li><div class=\"divider\"></div></li>"
-        html += "</ul></td>"
-        interacting_pair2properties_html[ip] = html
-    return interacting_pair2properties_html
+
+    complex_name2proteins = {}
+    partners = [None, None]
+    partner_letters = "ab"
+    i = 0
+    for (geneName, uniprotAcc, proteinName, complexName) in interacting_pair2participants[ip]:
+         pos = min(i, 1)
+         if complexName != '':
+            partners[pos] = complexName
+            if complexName not in complex_name2proteins:
+                complex_name2proteins[complexName] = []
+                complex_name2proteins[complexName].append(uniprotAcc)
+         else:
+             partners[pos] = uniprotAcc
+         i += 1
+    if partners[1] is None:
+        # E.g. GJA1_GJA1 - protein interacts with the same protein in a different cell
+        partners[1] = partners[0]
+    for i, partner in enumerate(partners):
+        if i > 0:
+            html += "<li><div class=\"divider\"></div></li>"
+        html += "<li><a class=\"subheader black-text\">Partner {} </a></li>".format(partner_letters[i])
+        html += search_utils.get_sidenav_html(partner in complex_name2proteins, partner, complex_name2proteins, protein2Info,
+                                               complex2Info, resource2Complex2Acc, proteinAcc2Name)
+    html += "<li><div class=\"divider\"></div></li>"
+    html += "</ul></td>"
+    return html
 
 def filter_interactions_for_cci_search(result_dict,
                         file_name2df,
@@ -582,16 +1256,60 @@ def filter_interactions_for_cci_search(result_dict,
                         refresh_plot,
                         values_to_show,
                         interacting_pairs_selection_logic,
-                        sort_interacting_pairs_alphabetically):
+                        sort_interacting_pairs_alphabetically,
+                        tile = None,
+                        selection = None) -> dict:
+    # tile: (row_offset, num_rows, col_offset, num_cols) - if set, only that window of the (ordered) interacting pairs x
+    # cell type pairs matrix is returned - c.f. get_tile_slices()
+    # selection: the selection returned by a previous call with the same arguments other than tile (if any) - so that
+    # the selection is not made again for each tile of the same matrix (c.f. main.tile_selection_cache)
+    # Returns the selection (c.f. select_interactions_for_cci_search()) - or None if nothing sensible can be plotted
+    # N.B. The duration of each stage below is recorded in metrics.STAGE_HISTOGRAM
+    timer = metrics.StageTimer()
     means_df = file_name2df['analysis_means']
-    deconvoluted_df = file_name2df['deconvoluted_result']
-    separator = result_dict['separator']
+    show_scores = values_to_show == 'scores' and 'interaction_scores' in result_dict
+    if selection is None:
+        selection = select_interactions_for_cci_search(result_dict, means_df, genes, interacting_pairs, classes,
+                        cell_types, cell_type_pairs, microenvironments, refresh_plot, interacting_pairs_selection_logic,
+                        sort_interacting_pairs_alphabetically, timer)
+        if selection is None:
+            # Nothing sensible can be plotted
+            return None
+        if tile is not None and 'interacting_pairs_means' in selection and not show_scores:
+            # min_value and max_value are calculated across the whole matrix - so that all its tiles share the same
+            # colour scale
+            values = get_cci_search_values(means_df, selection['interacting_pairs_means'],
+                                           selection['cell_type_pairs_means'], values_to_show,
+                                           result_dict.get('compact_values_table'))
+            if values.size > 0:
+                (selection['min_value'], selection['max_value']) = (values.min(axis=None), values.max(axis=None))
+            timer.lap('value_range')
+    result_dict.update(selection)
+    if 'interacting_pairs_means' in selection:
+        populate_cci_search_values(result_dict, means_df, values_to_show, show_scores, tile, timer)
+    return selection
 
-    if 'cell_type2microenvironments' not in result_dict:
-        selected_cell_type_pairs = sorted(cell_type_pairs)
-        ct2mes = {ctp: 'all' for ctp in selected_cell_type_pairs}
-    else:
-        ct2mes = result_dict['cell_type2microenvironments']
+# The keys of cci_search dict assigned by select_interactions_for_cci_search()
+CCI_SEARCH_SELECTION_KEYS = ['selected_cell_types', 'selected_microenvironments', 'selected_cell_type_pairs',
+                             'selected_cell_type_pairs2microenvironment', 'selected_genes', 'selected_interacting_pairs',
+                             'selected_interacting_pair2class', 'selected_interacting_pair2modality',
+                             'interacting_pairs_means', 'cell_type_pairs_means']
+
+def select_interactions_for_cci_search(result_dict,
+                        means_df,
+                        genes,
+                        interacting_pairs,
+                        classes,
+                        cell_types,
+                        cell_type_pairs,
+                        microenvironments,
+                        refresh_plot,
+                        interacting_pairs_selection_logic,
+                        sort_interacting_pairs_alphabetically,
+                        timer) -> dict:
+    # Selects the cell type pairs (columns) and interacting pairs (rows) of cci_search matrices, in the order they are
+    # plotted in, and returns them (c.f. CCI_SEARCH_SELECTION_KEYS) - or None if nothing sensible can be plotted
+    separator = result_dict['separator']
 
     # Collect all combinations of cell types (disregarding the order) from cell_types and cell_type_pairs combined
     mes = set(microenvironments)
@@ -601,19 +1319,18 @@ def filter_interactions_for_cci_search(result_dict,
         selected_cell_type_pairs = []
         if cell_type_pairs:
             # Note: the search for cell types and cell type pairs is additive (inclusive OR)
-            selected_cell_type_pairs += cell_type_pairs
+            # Restrict cell_type_pairs to just those in means_df
+            ctp2position = result_dict['cell_type_pair_index']['cell_type_pair2position']
+            selected_cell_type_pairs += [ct_pair for ct_pair in cell_type_pairs if ct_pair in ctp2position]
         # Extract from result_dict['all_cell_type_pairs'] all elements containing at least one cell type in selected_cell_types
-        for ct_pair in result_dict['all_cell_type_pairs']:
-            (ct1, ct2) = ct_pair.split(separator)
-            if not microenvironments:
-                if ct1 in selected_cell_types or ct2 in selected_cell_types:
-                    selected_cell_type_pairs += [ct_pair]
-            else:
-                # Allow for cell type pairs in which both cell types' respective microenvironments intersect with microenvironments call argument
-                if any(i in ct2mes[ct1] for i in mes) and any(i in ct2mes[ct2] for i in mes):
-                    selected_cell_type_pairs += [ct_pair]
-        # Restrict all combinations of cell types to just those in means_df
-        selected_cell_type_pairs = [ct_pair for ct_pair in selected_cell_type_pairs if ct_pair in means_df.columns.values]
+        if not microenvironments:
+            positions = get_cell_type_pair_positions(result_dict['cell_type_pair_index'], selected_cell_types)
+        else:
+            # Allow for cell type pairs in which both cell types' respective microenvironments intersect with microenvironments call argument
+            me2cts = result_dict.get('microenvironment2cell_types', {})
+            mes_cell_types = [ct for me in mes for ct in me2cts.get(me, [])]
+            positions = get_cell_type_pair_positions(result_dict['cell_type_pair_index'], mes_cell_types, mes_cell_types)
+        selected_cell_type_pairs += get_cell_type_pairs_at(result_dict, positions)
     elif not cell_type_pairs:
         selected_cell_types, selected_cell_type_pairs = preselect_cell_types_pairs(result_dict, separator, mes)
     else:
@@ -621,9 +1338,8 @@ def filter_interactions_for_cci_search(result_dict,
         selected_cell_type_pairs = cell_type_pairs
     if not selected_cell_type_pairs:
         # Nothing sensible can be plotted
-        return
+        return None
 
-    means_cols_filter = means_df.columns[means_df.columns.isin(selected_cell_type_pairs)]
     result_dict['selected_cell_types'] = sorted(selected_cell_types)
     selected_cell_type_pairs, ctp2me = sort_cell_type_pairs(selected_cell_type_pairs, result_dict, separator)
 
@@ -642,6 +1358,7 @@ def filter_interactions_for_cci_search(result_dict,
     # The following will be used to colour cell type pair labels on the plot's x-axis depending on
     # micro-environment they _both_ belong to.
     result_dict['selected_cell_type_pairs2microenvironment'] = ctp2me
+    timer.lap('select_cell_type_pairs')
     # Collect all interactions from query_genes and query_interactions
     interactions = set([])
     if interacting_pairs_selection_logic is not None:
@@ -665,8 +1382,9 @@ def filter_interactions_for_cci_search(result_dict,
             for c in classes:
                 interacting_pairs.extend(result_dict['class2interacting_pairs'][c])
         if genes:
-            interaction_ids = deconvoluted_df[deconvoluted_df['gene_name'].isin(genes)]['id_cp_interaction'].tolist()
-            interacting_pairs_from_genes = [result_dict['interaction_id2interacting_pair'][i] for i in interaction_ids]
+            # N.B. Gene families (e.g. WNT*) are expanded to all the genes they include
+            interacting_pairs_from_genes = \
+                get_gene_interacting_pairs(result_dict['gene_index']['deconvoluted_result'], genes)
             if not interacting_pairs:
                 interacting_pairs = []
             interacting_pairs += interacting_pairs_from_genes
@@ -680,6 +1398,7 @@ def filter_interactions_for_cci_search(result_dict,
     if sort_interacting_pairs_alphabetically:
         # Sort selected interacting_pairs alphabetically
         interacting_pairs.sort(key=str.lower)
+    timer.lap('select_interacting_pairs')
 
     result_dict['selected_genes'] = sorted(list(set(genes)))
     result_dict['selected_interacting_pairs'] = interacting_pairs
@@ -713,143 +1432,359 @@ def filter_interactions_for_cci_search(result_dict,
 
         interactions.update(means_df[means_df['interacting_pair'].isin(interacting_pairs)]['id_cp_interaction'].tolist())
     if interactions:
-        result_means_df = means_df[means_df['id_cp_interaction'].isin(interactions)]
-        # Filter out cell_type_pairs/columns in cols_filter for which no interaction in interactions set is significant
-        # TODO: means_cols_filter = means_cols_filter[result_means_df[means_cols_filter].notna().any(axis=0)]
-        # Filter out interactions which are not significant in any cell_type_pair/column in cols_filter
-        # TODO: result_means_df = result_means_df[result_means_df[means_cols_filter].notna().any(axis=1)]
-        # Sort rows by the order of interacting_pairs
-        result_means_df.set_index('interacting_pair', inplace=True)
         # N.B. reversed() call below means that the first element of interacting_pairs is shown at the top of cci_search plot
-        result_means_df = result_means_df.reindex(reversed(interacting_pairs))
-        result_means_df.reset_index(drop=False, inplace=True)
-        result_dict['interacting_pairs_means'] = result_means_df['interacting_pair'].values.tolist()
-        result_means_df = result_means_df[means_cols_filter.tolist()]
-        # Sort columns according to the order in selected_cell_type_pairs (see sort_cell_type_pairs() call above)
-        result_means_df = result_means_df.reindex(selected_cell_type_pairs, axis=1)
-        result_dict['cell_type_pairs_means'] = result_means_df.columns.tolist()
-        # Replace nan with 0's in result_means_df.values
-        means_np_arr = np.nan_to_num(result_means_df.values, copy=False, nan=0.0)
+        result_dict['interacting_pairs_means'] = list(reversed(interacting_pairs))
+        # The columns are in the order of selected_cell_type_pairs (see sort_cell_type_pairs() call above)
+        result_dict['cell_type_pairs_means'] = selected_cell_type_pairs
+    return dict([(key, result_dict[key]) for key in CCI_SEARCH_SELECTION_KEYS if key in result_dict])
+
+def get_means_df(means_df: pd.DataFrame, interacting_pairs: list, cell_type_pairs: list,
+                 compact_values_table: dict) -> pd.DataFrame:
+    # Returns the means of interacting_pairs (rows) in cell_type_pairs (columns), in that order - nan where not available
+    means_cols_filter = means_df.columns[means_df.columns.isin(cell_type_pairs)]
+    result_means_df = restore_dtypes(means_df[means_df['interacting_pair'].isin(interacting_pairs)],
+                                     compact_values_table)
+    # Filter out cell_type_pairs/columns in cols_filter for which no interaction in interactions set is significant
+    # TODO: means_cols_filter = means_cols_filter[result_means_df[means_cols_filter].notna().any(axis=0)]
+    # Filter out interactions which are not significant in any cell_type_pair/column in cols_filter
+    # TODO: result_means_df = result_means_df[result_means_df[means_cols_filter].notna().any(axis=1)]
+    # Sort rows by the order of interacting_pairs
+    result_means_df.set_index('interacting_pair', inplace=True)
+    result_means_df = result_means_df.reindex(interacting_pairs)
+    result_means_df = result_means_df[means_cols_filter.tolist()]
+    # Sort columns by the order of cell_type_pairs
+    return result_means_df.reindex(cell_type_pairs, axis=1)
+
+def get_cci_search_values(means_df: pd.DataFrame, interacting_pairs: list, cell_type_pairs: list,
+                          values_to_show: str, compact_values_table: dict) -> np.ndarray:
+    # Returns the means - or their z-scores (across each row) if values_to_show is 'zscores' - of interacting_pairs in
+    # cell_type_pairs
+    result_means_df = get_means_df(means_df, interacting_pairs, cell_type_pairs, compact_values_table)
+    # Replace nan with 0's in result_means_df.values
+    means_np_arr = np.nan_to_num(result_means_df.values, copy=False, nan=0.0)
+    if values_to_show == 'zscores':
         # Calculate z-scores
         zscores_df = stats.zscore(result_means_df, axis=1)
         zscores_arr = np.nan_to_num(zscores_df.values, copy=False, nan=0.0)
-        zscores_arr = np.round(zscores_arr, 3)
-        if values_to_show == 'scores':
-            if 'interaction_scores' in result_dict:
-                filtered_interaction_scores_arr = means_np_arr.copy().tolist()
-                for i, row in enumerate(filtered_interaction_scores_arr):
-                    for j, _ in enumerate(row):
-                        cell_type = selected_cell_type_pairs[j]
-                        interacting_pair = result_dict['interacting_pairs_means'][i]
-                        if cell_type in result_dict['interaction_scores'] and interacting_pair in \
-                                result_dict['interaction_scores'][cell_type]:
-                            filtered_interaction_scores_arr[i][j] = \
-                            result_dict['interaction_scores'][cell_type][interacting_pair]
-                        else:
-                            # interaction_scores = 0.0 have been filtered out to reduce API output
-                            filtered_interaction_scores_arr[i][j] = 0
-            result_dict['values'] = filtered_interaction_scores_arr
-            result_dict['min_value'] = 0
-            result_dict['max_value'] = 100
-        elif values_to_show == 'zscores':
-            result_dict['values'] = zscores_arr.tolist()
-            if zscores_arr.size > 0:
-                # Some significant interactions were found
-                result_dict['min_value'] = zscores_arr.min(axis=None)
-                result_dict['max_value'] = zscores_arr.max(axis=None)
+        return np.round(zscores_arr, 3)
+    return means_np_arr
+
+def populate_cci_search_values(result_dict, means_df, values_to_show, show_scores, tile, timer):
+    # Populates result_dict with the values of cci_search matrices for the selected interacting pairs and cell type pairs
+    # (c.f. select_interactions_for_cci_search()) - or, if tile is set, for that window of them only
+    (rows, cols) = get_tile_slices(tile)
+    all_cell_type_pairs = result_dict['cell_type_pairs_means']
+    if tile is not None:
+        # Only the tile is returned (min_value and max_value are calculated across the whole matrix - c.f.
+        # filter_interactions_for_cci_search()); the ordering of the matrix's rows and columns is the same for all
+        # tiles of the same selection. N.B. The selections of the whole matrix are not returned with each tile -
+        # except for the tile's interacting pairs' classes and modalities, and its cell type pairs' microenvironments
+        result_dict['num_interacting_pairs_means'] = len(result_dict['interacting_pairs_means'])
+        result_dict['num_cell_type_pairs_means'] = len(result_dict['cell_type_pairs_means'])
+        result_dict['interacting_pairs_means'] = result_dict['interacting_pairs_means'][rows]
+        result_dict['cell_type_pairs_means'] = result_dict['cell_type_pairs_means'][cols]
+        result_dict.pop('selected_interacting_pairs', None)
+        result_dict.pop('selected_cell_type_pairs', None)
+        for (key, labels) in [('selected_interacting_pair2class', result_dict['interacting_pairs_means']),
+                              ('selected_interacting_pair2modality', result_dict['interacting_pairs_means']),
+                              ('selected_cell_type_pairs2microenvironment', result_dict['cell_type_pairs_means'])]:
+            if key in result_dict:
+                result_dict[key] = dict([(label, result_dict[key][label]) for label in labels if label in result_dict[key]])
+    interacting_pairs = result_dict['interacting_pairs_means']
+    cell_type_pairs = result_dict['cell_type_pairs_means']
+    # N.B. If the project has no interaction scores, means are shown instead
+    if show_scores:
+        # interaction_scores = 0.0 are not stored
+        result_dict['values'] = get_sparse_block(result_dict['interaction_scores'], result_dict,
+            interacting_pairs, cell_type_pairs, 0).tolist()
+        result_dict['min_value'] = 0
+        result_dict['max_value'] = 100
+    else:
+        if values_to_show == 'zscores':
+            # z-scores are calculated across each whole row of the matrix (rather than across the tile's columns only)
+            values = get_cci_search_values(means_df, interacting_pairs, all_cell_type_pairs, values_to_show,
+                                           result_dict.get('compact_values_table'))[:, cols]
         else:
             # show means (by default)
-            result_dict['values'] = means_np_arr.tolist()
-            if means_np_arr.size > 0:
-                # Some significant interactions were found
-                result_dict['min_value'] = means_np_arr.min(axis=None)
-                result_dict['max_value'] = means_np_arr.max(axis=None)
-
-        if 'relevant_interactions' in result_dict:
-            result_dict['filtered_relevant_interactions'] = means_np_arr.copy().tolist()
-            for i, row in enumerate(result_dict['filtered_relevant_interactions']):
-                for j, _ in enumerate(row):
-                    cell_type = selected_cell_type_pairs[j]
-                    interacting_pair = result_dict['interacting_pairs_means'][i]
-                    if cell_type in result_dict['relevant_interactions'] and interacting_pair in result_dict['relevant_interactions'][cell_type]:
-                        result_dict['filtered_relevant_interactions'][i][j] = result_dict['relevant_interactions'][cell_type][interacting_pair]
-                    else:
-                        # relevant interactions values = 0 have been filtered out to reduce API output
-                        result_dict['filtered_relevant_interactions'][i][j] = 0
-
-        if 'pvalues' in result_dict:
-            result_dict['filtered_pvalues'] = means_np_arr.copy().tolist()
-            for i, row in enumerate(result_dict['filtered_pvalues']):
-                for j, _ in enumerate(row):
-                    cell_type = selected_cell_type_pairs[j]
-                    interacting_pair = result_dict['interacting_pairs_means'][i]
-                    if cell_type in result_dict['pvalues'] and interacting_pair in result_dict['pvalues'][cell_type]:
-                        result_dict['filtered_pvalues'][i][j] = result_dict['pvalues'][cell_type][interacting_pair]
-                    else:
-                        # pvalues = 1.0 have been filtered out to reduce API output
-                        result_dict['filtered_pvalues'][i][j] = 1
-        if 'cellphonedb' in result_dict:
-            result_dict['interacting_pair2properties_html'] = get_properties_html_for_interacting_pairs(result_dict)
+            values = get_cci_search_values(means_df, interacting_pairs, cell_type_pairs, values_to_show,
+                                           result_dict.get('compact_values_table'))
+        result_dict['values'] = values.tolist()
+        if tile is None and values.size > 0:
+            # Some significant interactions were found
+            result_dict['min_value'] = values.min(axis=None)
+            result_dict['max_value'] = values.max(axis=None)
+    # E.g. 'zscores'
+    timer.lap(values_to_show if values_to_show in ['scores', 'zscores'] else 'values')
+
+    if 'relevant_interactions' in result_dict:
+        # relevant interactions values = 0 are not stored
+        result_dict['filtered_relevant_interactions'] = get_sparse_block(result_dict['relevant_interactions'],
+            result_dict, interacting_pairs, cell_type_pairs, 0).tolist()
+        timer.lap('relevant_interactions')
+
+    if 'pvalues' in result_dict:
+        # pvalues = 1.0 are not stored
+        result_dict['filtered_pvalues'] = get_sparse_block(result_dict['pvalues'],
+            result_dict, interacting_pairs, cell_type_pairs, 1).tolist()
+        timer.lap('pvalues')
+    if 'cellphonedb' in result_dict:
+        # The sidenav html for each interacting pair is retrieved by the front end on demand - c.f. get_properties_html()
+        result_dict['interacting_pair_sidenavs'] = True
+
+def get_tile_slices(tile: tuple) -> (slice, slice):
+    # Returns the slices of rows and columns in tile: (row_offset, num_rows, col_offset, num_cols), where num_rows
+    # (num_cols) of None means all the rows (columns) from row_offset (col_offset) onwards
+    if tile is None:
+        return (slice(None), slice(None))
+    (row_offset, num_rows, col_offset, num_cols) = tile
+    (row_offset, col_offset) = (max(row_offset, 0), max(col_offset, 0))
+    rows = slice(row_offset, None if num_rows is None else row_offset + max(num_rows, 0))
+    cols = slice(col_offset, None if num_cols is None else col_offset + max(num_cols, 0))
+    return (rows, cols)
+
+def populate_cci_summary_index(result_dict, file_name2df, config):
+    # N.B. This is called once all the project's files have been loaded - so that the indexes of interacting pairs
+    # and cell type pairs used below are complete
+    dict_cci_summary = result_dict['cell_cell_interaction_summary']
+    if 'relevant_interactions' in file_name2df:
+        index = get_cci_summary_index(result_dict, file_name2df['relevant_interactions'], config['separator'])
+        dict_cci_summary['cci_summary_index'] = index
+        if config.get('precompute_cci_summary_score_counts') and 'interaction_scores' in dict_cci_summary:
+            score_counts = get_score_counts(index, dict_cci_summary['interaction_scores'])
+            if score_counts is None:
+                print("\n{}Not pre-computing cci_summary score counts - some interacting pairs belong to multiple "
+                      "classes or modalities".format(INDENT), flush=True, end="")
+            else:
+                index['score_counts'] = score_counts
+                print("\n{}Pre-computed cci_summary score counts: {:.1f} MB".format(INDENT, \
+                    (score_counts['counts'].nbytes + score_counts['all_counts'].nbytes) / 1024 / 1024), flush=True, end="")
+
+def get_cci_summary_index(result_dict, df, separator) -> dict:
+    """
+    Pre-computes from df (relevant_interactions or analysis_means file) the data that filter_interactions_for_cci_summary()
+    needs to count the interactions in all cell type pairs at once.
+    """
+    dict_cci_summary = result_dict['cell_cell_interaction_summary']
+    dict_cci_search = result_dict['cell_cell_interaction_search']
+    ip2index = dict_cci_search['interacting_pair2index']
+    ctp2index = dict_cci_search['cell_type_pair2index']
+    ct2indx = dict_cci_summary['ct2indx']
+    ct_sortedbyme2indx = dict_cci_summary['ct_sortedbyme2indx']
+    num_ips = len(dict_cci_search['index2interacting_pair'])
+    cell_type_pairs = get_cell_type_pairs(df, separator)
+    cell_types = [ctp.split(separator) for ctp in cell_type_pairs]
+    index = {}
+    # Sparse (df rows x cell type pairs) matrix of interactions with a value > 0 (N.B. nan > 0 is False). N.B.
+    # cell_type_pairs are df's last columns - selecting them by position does not copy them.
+    index['interactions'] = sparse.csc_matrix(df.iloc[:, len(df.columns) - len(cell_type_pairs):].values > 0,
+                                              dtype=np.uint8)
+    index['row2interacting_pair_index'] = np.array([ip2index[ip] for ip in df['interacting_pair'].values], dtype=np.int64)
+    # Positions of each cell type pair in num_ints and num_ints_cts_sortedbyme (-1 if a cell type is not found)
+    for key, ct2idx in [('num_ints', ct2indx), ('num_ints_cts_sortedbyme', ct_sortedbyme2indx)]:
+        index[key] = (np.array([ct2idx.get(ct1, -1) for (ct1, ct2) in cell_types], dtype=np.int64),
+                      np.array([ct2idx.get(ct2, -1) for (ct1, ct2) in cell_types], dtype=np.int64))
+    # Column of each cell type pair in interaction_scores sparse matrix (-1 if not found)
+    index['interaction_scores_cols'] = np.array([ctp2index.get(ctp, -1) for ctp in cell_type_pairs], dtype=np.int64)
+    # Masks (over interacting pairs in interacting_pair2index) of interacting pairs in each class and each modality
+    for key in ['class2interacting_pairs', 'modality2interacting_pairs']:
+        if key in dict_cci_summary:
+            index[key] = {}
+            for name, ips in dict_cci_summary[key].items():
+                mask = np.zeros(num_ips, dtype=bool)
+                mask[[ip2index[ip] for ip in ips]] = True
+                index[key][name] = mask
+    return index
+
+def get_score_counts(index, scores) -> dict:
+    """
+    Pre-computes, for each integer min_score between 0 and MAX_INTERACTION_SCORE, the number of interaction scores >= min_score
+    in each cell type pair (column of scores), separately for interacting pairs in each (class, modality) combination.
+    This allows filter_interactions_for_cci_summary() to count interactions for any min_score, classes and modalities
+    by summing a few rows of counts. Returns None if an interacting pair belongs to more than one class or modality
+    (the counts for the selected classes/modalities could then no longer be summed).
+    """
+    keys = ['class2interacting_pairs', 'modality2interacting_pairs']
+    num_ips = scores.shape[0]
+    # The class and modality (-1 if none) of each interacting pair
+    ip2class_and_modality = np.full((num_ips, len(keys)), -1, dtype=np.int64)
+    names = []
+    for j, key in enumerate(keys):
+        names.append(list(index.get(key, {}).keys()))
+        for i, name in enumerate(names[j]):
+            mask = index[key][name][0:num_ips]
+            if (ip2class_and_modality[mask, j] >= 0).any():
+                return None
+            ip2class_and_modality[mask, j] = i
+    (groups, ip2group) = np.unique(ip2class_and_modality, axis=0, return_inverse=True)
+    ip2group = ip2group.reshape(-1)
+    num_thresholds = MAX_INTERACTION_SCORE + 1
+    num_cols = scores.shape[1]
+    # For integer min_score, score >= min_score <=> floor(score) >= min_score
+    scores_group = ip2group[scores.indices]
+    scores_floor = np.clip(np.floor(scores.data), 0, MAX_INTERACTION_SCORE).astype(np.int64)
+    scores_col = np.repeat(np.arange(num_cols), np.diff(scores.indptr))
+    dtype = np.uint16 if scores.nnz <= np.iinfo(np.uint16).max else np.uint32
+    counts = np.zeros((len(groups), num_thresholds, num_cols), dtype=dtype)
+    for g in range(len(groups)):
+        in_group = scores_group == g
+        histogram = np.bincount(scores_floor[in_group] * num_cols + scores_col[in_group],
+                                minlength=num_thresholds * num_cols).reshape(num_thresholds, num_cols)
+        # Cumulative sums from the highest score down
+        counts[g] = np.cumsum(histogram[::-1], axis=0)[::-1]
+    return {'counts': counts,
+            'all_counts': counts.sum(axis=0, dtype=np.int64).astype(dtype),
+            'groups': groups,
+            'class2indx': dict([(name, i) for i, name in enumerate(names[0])]),
+            'modality2indx': dict([(name, i) for i, name in enumerate(names[1])])}
+
+def count_interactions_by_score(score_counts, classes, modalities, min_score) -> np.ndarray:
+    # Returns the number of interaction scores >= min_score in each column of interaction_scores sparse matrix,
+    # for interacting pairs belonging to classes and modalities - c.f. get_score_counts()
+    groups = score_counts['groups']
+    is_selected = np.ones(len(groups), dtype=bool)
+    if classes:
+        is_selected &= np.isin(groups[:, 0], [score_counts['class2indx'][c] for c in classes])
+    if modalities:
+        is_selected &= np.isin(groups[:, 1], [score_counts['modality2indx'][m] for m in modalities])
+    if (not classes and not modalities) or not is_selected.any():
+        # N.B. If the selected classes and modalities don't overlap, all interacting pairs are counted
+        return score_counts['all_counts'][min_score]
+    return score_counts['counts'][is_selected, min_score].sum(axis=0, dtype=np.int64)
+
+def get_interacting_pairs_mask(index, key, names):
+    # Returns the mask of interacting pairs belonging to any of names (classes or modalities); None if names is empty
+    mask = None
+    for name in names:
+        if mask is None:
+            mask = index[key][name].copy()
+        else:
+            mask |= index[key][name]
+    return mask
 
 def filter_interactions_for_cci_summary(result_dict, file_name2df, classes, modalities,
                                         min_score, significant_interactions_only):
+    timer = metrics.StageTimer()
     separator = result_dict['separator']
     if significant_interactions_only:
-        means_df = file_name2df['relevant_interactions']
+        index = result_dict['cci_summary_index']
     else:
-        means_df = file_name2df['analysis_means']
+        index = get_cci_summary_index(result_dict, file_name2df['analysis_means'], separator)
+
+    # Mask of interacting pairs belonging to a class in classes and/or a modality in modalities
+    # Note that query is for classes and modalities is a logical AND one
+    ips_mask = get_interacting_pairs_mask(index, 'class2interacting_pairs', classes)
+    m_ips_mask = get_interacting_pairs_mask(index, 'modality2interacting_pairs', modalities)
+    if m_ips_mask is not None:
+        ips_mask = m_ips_mask if ips_mask is None else ips_mask & m_ips_mask
 
-    # Filter means_df by interacting pairs belonging to a class in classes
-    interacting_pairs = None
-    c_ips = []
-    if classes:
-        for c in classes:
-            c_ips.extend(result_dict['class2interacting_pairs'][c])
-    if modalities:
-        # Note that query is for classes and modalities is a logical AND one
-        m_ips = []
-        for m in modalities:
-            m_ips.extend(result_dict['modality2interacting_pairs'][m])
-        if len(c_ips) > 0:
-            interacting_pairs = list(set(c_ips).intersection(m_ips))
-        elif len(m_ips) > 0:
-            interacting_pairs = list(set(m_ips))
-    elif len(c_ips) > 0:
-        interacting_pairs = list(set(c_ips))
-
-    if interacting_pairs is not None:
-        # interacting_pairs could be not None and yet be an empty list if the sets of interacting pairs for the
-        # selected classes and modalities don't overlap
-        means_df = copy.deepcopy(means_df[means_df['interacting_pair'].isin(interacting_pairs)])
     size = len(result_dict['all_cell_types'])
-    ct2indx = result_dict['ct2indx']
-    ct_sortedbyme2indx = result_dict['ct_sortedbyme2indx']
-    all_cell_types_combinations = get_cell_type_pairs(means_df, separator)
-    num_ints = np.zeros((size, size),dtype=np.uint32)
-    num_ints_cts_sortedbyme = np.zeros((size, size), dtype=np.uint32)
-    for ct_pair in all_cell_types_combinations:
-         if min_score == 0 or 'interaction_scores' not in result_dict:
-            s = means_df[ct_pair].dropna()
-            num_ints4ctp = len(s[s>0])
-         else:
-            interaction_scores_for_ct_pair = result_dict['interaction_scores'][ct_pair].copy()
-            if interacting_pairs:
-                # if classes were selected, retain the interacting pairs that belong to those classes only
-                interaction_scores_for_ct_pair = {ip: interaction_scores_for_ct_pair[ip] for ip in interacting_pairs if ip in interaction_scores_for_ct_pair}
-            s = interaction_scores_for_ct_pair.values()
-
-            num_ints4ctp = len([i for i in s if i >= min_score])
-         ct1 = ct_pair.split(separator)[0]
-         ct2 = ct_pair.split(separator)[1]
-         num_ints[ct2indx[ct1], ct2indx[ct2]] = num_ints4ctp
-         num_ints_cts_sortedbyme[ct_sortedbyme2indx[ct1], ct_sortedbyme2indx[ct2]] = num_ints4ctp
+    if min_score == 0 or 'interaction_scores' not in result_dict:
+        interactions = index['interactions']
+        if ips_mask is None:
+            num_ints4ctps = np.diff(interactions.indptr)
+        else:
+            # ips_mask could be not None and yet be all False if the sets of interacting pairs for the
+            # selected classes and modalities don't overlap
+            num_ints4ctps = interactions.T.dot(ips_mask[index['row2interacting_pair_index']].astype(np.int64))
+    elif 'score_counts' in index and min_score in range(0, MAX_INTERACTION_SCORE + 1):
+        # Counts for integer min_score values are pre-computed
+        cols = index['interaction_scores_cols']
+        num_ints4scores_cols = count_interactions_by_score(index['score_counts'], classes, modalities, int(min_score))
+        num_ints4ctps = np.where(cols >= 0, num_ints4scores_cols[cols], 0)
+    else:
+        scores = result_dict['interaction_scores']
+        is_counted = scores.data >= min_score
+        if ips_mask is not None and ips_mask.any():
+            # if classes were selected, retain the interacting pairs that belong to those classes only
+            is_counted &= ips_mask[scores.indices]
+        cumulative_counts = np.concatenate(([0], np.cumsum(is_counted)))
+        num_ints4scores_cols = cumulative_counts[scores.indptr[1:]] - cumulative_counts[scores.indptr[:-1]]
+        cols = index['interaction_scores_cols']
+        num_ints4ctps = np.where(cols >= 0, num_ints4scores_cols[cols], 0)
+    timer.lap('count_interactions')
+    key2num_ints = {}
+    for key in ['num_ints', 'num_ints_cts_sortedbyme']:
+        (rows, cols) = index[key]
+        is_found = (rows >= 0) & (cols >= 0)
+        key2num_ints[key] = np.zeros((size, size), dtype=np.uint32)
+        key2num_ints[key][rows[is_found], cols[is_found]] = num_ints4ctps[is_found]
+    num_ints = key2num_ints['num_ints']
     result_dict['num_ints'] = num_ints.tolist()
     # The matrix below is used to plot 'all celltypes' cci_summary plots - if microenvironments were provided in config
     # result_dict['num_ints_cts_sortedbyme'] reflects cell types grouped by microenvironment, whereas
     # result_dict['num_ints'] reflects microenvironments sorted alphabetically.
-    result_dict['num_ints_cts_sortedbyme'] = num_ints_cts_sortedbyme.tolist()
+    result_dict['num_ints_cts_sortedbyme'] = key2num_ints['num_ints_cts_sortedbyme'].tolist()
     result_dict['min_num_ints'] = str(np.min(num_ints))
     result_dict['max_num_ints'] = str(np.max(num_ints))
+    timer.lap('num_ints')
+
+def populate_autocomplete_index(result_dict):
+    dict_cci_search = result_dict['cell_cell_interaction_search']
+    autocomplete_index = {}
+    for (field, key) in AUTOCOMPLETE_FIELD2KEY.items():
+        if key in dict_cci_search:
+            autocomplete_index[field] = get_autocomplete_index(dict_cci_search[key])
+    dict_cci_search['autocomplete_index'] = autocomplete_index
+
+def get_autocomplete_index(vocabulary: list) -> dict:
+    # Returns the sorted, lower-cased suffixes of vocabulary values starting at each word of each value, and the position
+    # of each suffix's value in vocabulary - so that the values with a word starting with a query can be found via
+    # binary search (c.f. autocomplete())
+    suffix2position = []
+    for (position, value) in enumerate(vocabulary):
+        value = value.lower()
+        starts = [0] + [m.end() for m in AUTOCOMPLETE_WORD_SEPARATOR.finditer(value)]
+        suffix2position += [(value[start:], position) for start in starts]
+    suffix2position.sort()
+    return {'vocabulary': vocabulary,
+            'suffixes': [suffix for (suffix, _) in suffix2position],
+            'positions': np.array([position for (_, position) in suffix2position], dtype=np.int64)}
+
+def autocomplete(project_data: dict, field: str, query: str, limit: int = AUTOCOMPLETE_LIMIT) -> list:
+    # Returns (up to limit, and no more than AUTOCOMPLETE_MAX_LIMIT) values of field's vocabulary with a word starting with
+    # query (case-insensitive) - in the order of the vocabulary, e.g. interacting pairs by the highest aggregated mean.
+    # N.B. The genes of a gene family are retrieved via get_gene_family() instead
+    autocomplete_index = project_data['cell_cell_interaction_search'].get('autocomplete_index', {})
+    if field not in autocomplete_index:
+        return []
+    index = autocomplete_index[field]
+    vocabulary = index['vocabulary']
+    query = query.lower()
+    ret = []
+    if field == 'genes':
+        # Simplified regular expression terms for gene families (e.g. WNT*) are suggested before the genes - they are
+        # derived from the genes matching query (without the trailing *, if any) rather than kept in the vocabulary
+        gene_positions = get_autocomplete_positions(index, query[0:-1] if query.endswith("*") else query)
+        ret = [family for family in get_gene_families(vocabulary, gene_positions.tolist()) \
+               if has_word_starting_with(family, query)]
+    positions = get_autocomplete_positions(index, query)
+    limit = min(max(limit, 0), AUTOCOMPLETE_MAX_LIMIT)
+    ret = ret[0:limit]
+    positions = positions[0:limit - len(ret)]
+    return ret + [vocabulary[position] for position in positions.tolist()]
+
+def get_autocomplete_positions(index: dict, query: str) -> np.ndarray:
+    # Returns the sorted positions of the values in index's vocabulary with a word starting with query (lower-cased)
+    if not query:
+        return np.arange(len(index['vocabulary']))
+    suffixes = index['suffixes']
+    # The first string greater than all strings starting with query
+    query_end = query[0:-1] + chr(ord(query[-1]) + 1)
+    return np.unique(index['positions'][bisect_left(suffixes, query):bisect_left(suffixes, query_end)])
+
+def has_word_starting_with(value: str, query: str) -> bool:
+    value = value.lower()
+    starts = [0] + [m.end() for m in AUTOCOMPLETE_WORD_SEPARATOR.finditer(value)]
+    return any([value.startswith(query, start) for start in starts])
+
+def remove_server_side_data(result_dict):
+    # Remove from result_dict (a shallow copy of a cci_search or cci_summary dict) the data that is used for
+    # filtering only - it is not needed by the front end
+    for key in SERVER_SIDE_ONLY_KEYS:
+        result_dict.pop(key, None)
+    if 'interaction_scores' in result_dict:
+        # The front end needs to know only whether interaction scores were provided
+        result_dict['interaction_scores'] = True
 
 def generate_random_hash():
     # See: https://docs.python.org/3/library/secrets.html (16 = bytes ~ 16 * 1.3 chars)